@@ -13,6 +13,9 @@ from src.common.logger_manager import get_logger
 # from src.common.logger import LogConfig, CONFIRM_STYLE_CONFIG
 from src.common.crash_logger import install_crash_handler
 from src.main import MainSystem
+from src.plugins.models.session_pool import session_pool
+from src.plugins.models.usage_recorder import usage_recorder
+from src.plugins.memory_system.Hippocampus import HippocampusManager
 
 
 logger = get_logger("main")
@@ -120,6 +123,15 @@ async def graceful_shutdown():
             task.cancel()
         await asyncio.gather(*tasks, return_exceptions=True)
 
+        # 写入缓冲中的token使用记录
+        await usage_recorder.close()
+
+        # 同步尚未写入的记忆并保存记忆图快照
+        await HippocampusManager.get_instance().close()
+
+        # 关闭模型请求共享的连接池
+        await session_pool.close()
+
     except Exception as e:
         logger.error(f"麦麦关闭失败: {e}")
 
@@ -0,0 +1,166 @@
+"""LLMRequest 服务商限流基准测试
+
+在进程内启动带每秒请求数上限的模拟服务(scripts/mock_openai_server.py)，模拟多个群聊同时发起请求，
+比较两种处理 429 的方式：
+- independent_backoff：旧行为，每个协程收到 429 后各自按 base_wait * 2^重试次数 休眠
+- shared_scheduler：所有请求经过服务商调度器排队，429 后整个服务商统一暂停并降低并发
+- shared_scheduler_rpm：同上，并按服务商的限制配置了 rpm(provider_rate_limits)
+
+输出完成/失败的请求数、服务端返回的 429 次数、总耗时以及单次调用延迟的 p50/p99。
+旧行为的 base_wait 默认 10 秒，这里默认缩短为 1 秒(--base-wait)，避免测试时间过长。
+数据库使用进程内的 mongomock 代替(记录 token 用量)，需要先 pip install mongomock。
+
+用法: python scripts/benchmark_llm_rate_limit.py [--requests 200] [--concurrency 50] [--rps 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT_PATH, ".env"))
+os.environ.setdefault("HOST", "127.0.0.1")
+os.environ.setdefault("PORT", "8000")
+
+try:
+    import mongomock
+except ImportError:
+    print("需要安装 mongomock 作为进程内数据库: pip install mongomock")
+    sys.exit(1)
+
+import numpy as np  # noqa: E402
+from loguru import logger  # noqa: E402
+
+import src.common.database as database  # noqa: E402
+
+database._client = mongomock.MongoClient()
+database._db = database._client["MaiBotBenchmark"]
+
+import src.plugins.models.utils_model as utils_model  # noqa: E402
+from src.config.config import global_config  # noqa: E402
+from src.plugins.models.provider_scheduler import SchedulerPool, SlotOutcome  # noqa: E402
+from src.plugins.models.session_pool import session_pool  # noqa: E402
+from src.plugins.models.utils_model import LLMRequest  # noqa: E402
+
+from mock_openai_server import get_stats, reset_stats, start_mock_server  # noqa: E402
+
+
+class IndependentBackoffScheduler:
+    """旧行为：不排队，收到 429 的协程自己按指数退避休眠"""
+
+    def __init__(self, base_wait: float):
+        self.base_wait = base_wait
+        self.attempts = {}
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0, tokens: int = 0, model: str = ""):
+        outcome = SlotOutcome()
+        try:
+            yield outcome
+        finally:
+            # 按协程记录连续收到 429 的次数，相当于旧代码中每个请求自己的重试计数
+            task = asyncio.current_task()
+            if outcome.limited:
+                attempt = self.attempts.get(task, 0)
+                self.attempts[task] = attempt + 1
+                await asyncio.sleep(self.base_wait * (2**attempt))
+            else:
+                self.attempts.pop(task, None)
+
+    def consume_tokens(self, amount: int):
+        pass
+
+
+class IndependentBackoffPool:
+    def __init__(self, base_wait: float):
+        self.scheduler = IndependentBackoffScheduler(base_wait)
+
+    def get(self, base_url: str, provider: str):
+        return self.scheduler
+
+
+async def run_case(llm: LLMRequest, requests: int, concurrency: int) -> dict:
+    latencies = []
+    failed = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(f"群聊{i % concurrency}的第{i}条消息")
+
+    async def chat():
+        nonlocal failed
+        while not queue.empty():
+            prompt = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await llm.generate_response_async(prompt)
+                latencies.append(time.perf_counter() - start)
+            except RuntimeError:
+                failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    values = np.array(latencies or [0.0]) * 1000
+    return {
+        "requests": requests,
+        "succeeded": len(latencies),
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+    }
+
+
+async def run(args):
+    runner, base_url = await start_mock_server(latency=args.latency, rps=args.rps)
+    os.environ["MOCK_KEY"] = "sk-mock"
+    os.environ["MOCK_BASE_URL"] = base_url
+    llm = LLMRequest({"name": "mock-model", "key": "MOCK_KEY", "base_url": "MOCK_BASE_URL"}, request_type="benchmark")
+
+    report = {"rps_limit": args.rps, "concurrency": args.concurrency}
+    for name, pool, rate_limits in (
+        ("independent_backoff", IndependentBackoffPool(args.base_wait), {}),
+        ("shared_scheduler", SchedulerPool(), {}),
+        ("shared_scheduler_rpm", SchedulerPool(), {"MOCK": {"rpm": args.rps * 60}}),
+    ):
+        global_config.llm_provider_rate_limits = rate_limits
+        utils_model.scheduler_pool = pool
+        await asyncio.sleep(1.1)  # 等待上一轮的限流窗口过去
+        reset_stats(runner)
+        result = await run_case(llm, args.requests, args.concurrency)
+        server = get_stats(runner)
+        result["server_requests"] = server["requests"]
+        result["server_429"] = server["rate_limited"]
+        if isinstance(pool, SchedulerPool):
+            result["scheduler"] = pool.get(base_url, "MOCK").get_stats()
+        report[name] = result
+
+    await session_pool.close()
+    await runner.cleanup()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLMRequest 服务商限流基准测试")
+    parser.add_argument("--requests", type=int, default=200, help="每种情况的请求总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="同时发起请求的群聊数")
+    parser.add_argument("--rps", type=int, default=20, help="模拟服务每秒允许的请求数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务每个请求的延迟(秒)")
+    parser.add_argument("--base-wait", type=float, default=1.0, help="旧行为收到 429 后的基础等待时间(秒)")
+    parser.add_argument("--verbose", action="store_true", help="输出 LLMRequest 的日志")
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.disable("src")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
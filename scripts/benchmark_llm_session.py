@@ -0,0 +1,122 @@
+"""LLMRequest 连接池基准测试
+
+在进程内启动模拟的 OpenAI 兼容服务(scripts/mock_openai_server.py)，分别以
+“每次请求新建 ClientSession”(旧行为)和“服务商共享长连接会话”两种方式调用 LLMRequest，
+输出单次请求延迟的 p50/p99、吞吐量以及服务端看到的 TCP 连接数。
+
+模拟服务使用本地明文 HTTP，没有 DNS 解析和 TLS 握手，实际服务商的差距会比这里更大。
+数据库使用进程内的 mongomock 代替(记录 token 用量)，需要先 pip install mongomock。
+
+用法: python scripts/benchmark_llm_session.py [--requests 500] [--concurrency 16] [--latency 0.0]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT_PATH, ".env"))
+os.environ.setdefault("HOST", "127.0.0.1")
+os.environ.setdefault("PORT", "8000")
+
+try:
+    import mongomock
+except ImportError:
+    print("需要安装 mongomock 作为进程内数据库: pip install mongomock")
+    sys.exit(1)
+
+import aiohttp  # noqa: E402
+import numpy as np  # noqa: E402
+
+import src.common.database as database  # noqa: E402
+
+database._client = mongomock.MongoClient()
+database._db = database._client["MaiBotBenchmark"]
+
+import src.plugins.models.utils_model as utils_model  # noqa: E402
+from src.plugins.models.session_pool import session_pool  # noqa: E402
+from src.plugins.models.utils_model import LLMRequest  # noqa: E402
+
+from mock_openai_server import get_stats, reset_stats, start_mock_server  # noqa: E402
+
+
+class PerRequestSessionPool:
+    """旧行为：每次请求都新建并关闭一个 ClientSession"""
+
+    @asynccontextmanager
+    async def session(self, provider: str):
+        async with aiohttp.ClientSession() as session:
+            yield session
+
+    async def close(self):
+        pass
+
+
+async def run_case(llm: LLMRequest, requests: int, concurrency: int) -> dict:
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(f"第{i}条测试消息")
+
+    async def worker():
+        while not queue.empty():
+            prompt = queue.get_nowait()
+            start = time.perf_counter()
+            await llm.generate_response_async(prompt)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    values = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_sec": round(requests / elapsed, 1),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+async def run(args):
+    runner, base_url = await start_mock_server(latency=args.latency)
+    os.environ["MOCK_KEY"] = "sk-mock"
+    os.environ["MOCK_BASE_URL"] = base_url
+    llm = LLMRequest({"name": "mock-model", "key": "MOCK_KEY", "base_url": "MOCK_BASE_URL"}, request_type="benchmark")
+
+    # 预热(导入、首个连接)
+    await llm.generate_response_async("预热")
+
+    report = {}
+    for name, pool in (("per_request_session", PerRequestSessionPool()), ("pooled_session", session_pool)):
+        utils_model.session_pool = pool
+        for concurrency in (1, args.concurrency):
+            reset_stats(runner)
+            result = await run_case(llm, args.requests, concurrency)
+            result["server_connections"] = get_stats(runner)["connections"]
+            report[f"{name}_c{concurrency}"] = result
+
+    await session_pool.close()
+    await runner.cleanup()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLMRequest 连接池基准测试")
+    parser.add_argument("--requests", type=int, default=500, help="每种情况的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发情况下的并发数")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟服务每个请求的延迟(秒)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
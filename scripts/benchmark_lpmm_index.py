@@ -0,0 +1,213 @@
+"""LPMM 向量索引基准测试
+
+在嵌入库已存储的向量(或生成的聚类数据)上构建各类型的 Faiss 索引(见 faiss_index)，
+以 flat 精确搜索的结果为基准，输出每种索引及查询参数下的 recall@k、批量查询和逐条查询的 QPS，
+以及构建(含训练)耗时和索引大小。
+
+查询向量从库中随机抽取后加入少量噪声(--noise)，模拟与库中内容相近但不完全相同的问题。
+导入 src 下的模块时会访问数据库，这里使用进程内的 mongomock 代替，需要先 pip install mongomock。
+
+用法:
+    python scripts/benchmark_lpmm_index.py [--namespace entity] [--path data/embedding/entity]
+    python scripts/benchmark_lpmm_index.py --synthetic 200000 --dim 1024
+    可选 --types flat,ivf_flat,ivf_pq,hnsw --nprobe 4,16,64 --ef-search 32,128,512 --k 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT_PATH, ".env"))
+os.environ.setdefault("HOST", "127.0.0.1")
+os.environ.setdefault("PORT", "8000")
+
+try:
+    import mongomock
+except ImportError:
+    print("需要安装 mongomock 作为进程内数据库: pip install mongomock")
+    sys.exit(1)
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+
+import src.common.database as database  # noqa: E402
+
+# 导入 src.plugins 时会访问数据库，使用进程内的 mongomock 代替
+database._client = mongomock.MongoClient()
+database._db = database._client["MaiBotBenchmark"]
+
+from src.plugins.knowledge.src import faiss_index  # noqa: E402
+from src.plugins.knowledge.src.embedding_store import EmbeddingTable  # noqa: E402
+from src.plugins.knowledge.src.lpmmconfig import global_config  # noqa: E402
+
+SINGLE_QUERY_LIMIT = 200  # 逐条查询 QPS 只测前若干条查询
+
+
+def load_vectors(args) -> np.ndarray:
+    """已归一化的向量矩阵"""
+    rng = np.random.default_rng(args.seed)
+    if args.synthetic:
+        # 高斯混合，比均匀随机向量更接近真实嵌入的聚类结构
+        centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+        vectors = np.empty((args.synthetic, args.dim), dtype=np.float32)
+        for begin in range(0, args.synthetic, 100000):
+            size = min(100000, args.synthetic - begin)
+            noise = rng.standard_normal((size, args.dim), dtype=np.float32)
+            vectors[begin : begin + size] = centers[rng.integers(0, args.clusters, size)] + 0.5 * noise
+    else:
+        path = args.path or os.path.join(global_config["persistence"]["embedding_data_dir"], args.namespace)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            print(f"嵌入库{path}不存在，请先导入知识或使用 --synthetic")
+            sys.exit(1)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            table = EmbeddingTable(path, json.load(f)["dimension"])
+        table.load()
+        count = min(len(table), args.limit) if args.limit else len(table)
+        vectors = np.array(table.rows(0, count), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, args) -> np.ndarray:
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)].copy()
+    queries += args.noise / np.sqrt(vectors.shape[1]) * rng.standard_normal(queries.shape, dtype=np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def build(index_config: dict, vectors: np.ndarray, seed: int):
+    count, dimension = vectors.shape
+    factory = faiss_index.factory_string(index_config, dimension, count)
+    start = time.perf_counter()
+    train_size = faiss_index.train_size(index_config, count) if factory != "Flat" else 0
+    train_data = None
+    if train_size:
+        rows = np.sort(np.random.default_rng(seed).choice(count, train_size, replace=False))
+        train_data = vectors[rows]
+    index = faiss_index.create_index(factory, dimension, index_config, train_data)
+    index.add(vectors)
+    return index, factory, time.perf_counter() - start
+
+
+def index_size_mb(index) -> float:
+    return round(len(faiss.serialize_index(index)) / (1024 * 1024), 1)
+
+
+def measure(index, index_config: dict, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    """与 EmbeddingStore.batch_search_top_k 相同的搜索方式(IVF-PQ 按 rerank 配置重排)"""
+
+    def take_vectors(ids):
+        return vectors[ids]
+
+    start = time.perf_counter()
+    _, ids = faiss_index.search(index, queries, k, index_config, take_vectors)
+    batch_s = time.perf_counter() - start
+
+    single = queries[:SINGLE_QUERY_LIMIT]
+    start = time.perf_counter()
+    for query in single:
+        faiss_index.search(index, query.reshape(1, -1), k, index_config, take_vectors)
+    single_s = time.perf_counter() - start
+
+    hits = sum(len(np.intersect1d(row, truth_row)) for row, truth_row in zip(ids, truth, strict=True))
+    return {
+        f"recall@{k}": round(hits / truth.size, 4),
+        "batch_qps": round(len(queries) / batch_s, 1),
+        "single_qps": round(len(single) / single_s, 1),
+        "single_ms": round(single_s / len(single) * 1000, 3),
+    }
+
+
+def _int_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LPMM 向量索引基准测试")
+    parser.add_argument("--namespace", default="entity", help="嵌入库命名空间(paragraph / entity / relation)")
+    parser.add_argument("--path", help="EmbeddingTable 目录，默认为 embedding_data_dir/<namespace>")
+    parser.add_argument("--limit", type=int, default=0, help="只使用嵌入库的前若干项，0 表示全部")
+    parser.add_argument("--synthetic", type=int, default=0, help="不读取嵌入库，生成指定数量的聚类向量")
+    parser.add_argument("--dim", type=int, default=1024, help="生成向量的维度")
+    parser.add_argument("--clusters", type=int, default=1000, help="生成向量的聚类数")
+    parser.add_argument("--queries", type=int, default=1000, help="查询数")
+    parser.add_argument("--noise", type=float, default=0.3, help="查询向量相对于库中向量的噪声大小")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--types", default="flat,ivf_flat,ivf_pq,hnsw", help="要测试的索引类型")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="IVF 索引测试的 nprobe 取值")
+    parser.add_argument("--ef-search", default="16,64,256", help="HNSW 索引测试的 ef_search 取值")
+    parser.add_argument("--rerank", default="0,4", help="IVF-PQ 索引测试的 rerank 取值")
+    parser.add_argument("--nlist", type=int, help="IVF 聚类中心数，默认使用配置中的值")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ 子向量数，默认使用配置中的值")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW 邻居数，默认使用配置中的值")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    from loguru import logger
+
+    logger.disable("src")
+
+    vectors = load_vectors(args)
+    queries = make_queries(vectors, args)
+    print(f"向量 {vectors.shape[0]} x {vectors.shape[1]}，查询 {len(queries)} 条", file=sys.stderr)
+
+    base_config = {
+        **faiss_index.DEFAULT_INDEX_CONFIG,
+        **global_config.get("index", {}).get(args.namespace, {}),
+    }
+    for key, value in (("nlist", args.nlist), ("pq_m", args.pq_m), ("hnsw_m", args.hnsw_m)):
+        if value is not None:
+            base_config[key] = value
+
+    flat, _, flat_build_s = build({**base_config, "type": "flat"}, vectors, args.seed)
+    _, truth = flat.search(queries, args.k)
+
+    results = []
+    for index_type in args.types.split(","):
+        index_config = {**base_config, "type": index_type}
+        if index_type == "flat":
+            index, factory, build_s = flat, "Flat", flat_build_s
+        else:
+            print(f"构建 {index_type} ...", file=sys.stderr)
+            index, factory, build_s = build(index_config, vectors, args.seed)
+        # 要测试的查询参数组合
+        if factory.startswith("IVF"):
+            param_sets = [{"nprobe": nprobe} for nprobe in _int_list(args.nprobe)]
+            if ",PQ" in factory:
+                param_sets = [
+                    {**params, "rerank": rerank} for params in param_sets for rerank in _int_list(args.rerank)
+                ]
+        elif factory.startswith("HNSW"):
+            param_sets = [{"ef_search": ef_search} for ef_search in _int_list(args.ef_search)]
+        else:
+            param_sets = [{}]
+        for params in param_sets:
+            search_config = {**index_config, **params}
+            faiss_index.apply_search_params(index, search_config)
+            result = {"type": index_type, "factory": factory, **params}
+            result.update(measure(index, search_config, vectors, queries, truth, args.k))
+            result["build_s"] = round(build_s, 2)
+            result["size_mb"] = index_size_mb(index)
+            results.append(result)
+
+    output = {
+        "count": vectors.shape[0],
+        "dim": vectors.shape[1],
+        "queries": len(queries),
+        "k": args.k,
+        "threads": faiss.omp_get_max_threads(),
+        "results": results,
+    }
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""LPMM 嵌入库加载基准测试
+
+生成指定规模的随机嵌入库，分别以旧格式(parquet，加载时为每行创建 EmbeddingStoreItem)和
+EmbeddingTable 格式(内存映射)保存，在独立的子进程中加载，输出加载耗时、加载后的常驻内存(RSS)，
+以及随机查询若干项(hash查找 + 读取字符串和向量)后的 RSS 和单次查询耗时。
+映射的文件页也计入 RSS(内核可能按大页映射整段页缓存)，因此另外输出不含文件页的匿名内存(anon)。
+
+旧格式加载时每个向量都会变成独立的 Python/NumPy 对象，1M x 1024 的库需要数十 GB 内存，
+可以用 --legacy-count 只为旧格式生成较小的库；--legacy-count 0 跳过旧格式。
+导入 src 下的模块时会访问数据库，这里使用进程内的 mongomock 代替，需要先 pip install mongomock。
+
+用法: python scripts/benchmark_lpmm_store.py [--count 1000000] [--dim 1024] [--legacy-count 100000] [--dir /tmp/lpmm]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT_PATH, ".env"))
+os.environ.setdefault("HOST", "127.0.0.1")
+os.environ.setdefault("PORT", "8000")
+
+try:
+    import mongomock
+except ImportError:
+    print("需要安装 mongomock 作为进程内数据库: pip install mongomock")
+    sys.exit(1)
+
+import numpy as np  # noqa: E402
+
+import src.common.database as database  # noqa: E402
+
+# 导入 src.plugins 时会访问数据库，使用进程内的 mongomock 代替
+database._client = mongomock.MongoClient()
+database._db = database._client["MaiBotBenchmark"]
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
+
+CHUNK = 100000
+
+
+def _proc_status_mb(field: str) -> float | None:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb() -> float | None:
+    """当前常驻内存，Linux 下读取 /proc，其他系统退回到峰值 RSS"""
+    rss = _proc_status_mb("VmRSS")
+    if rss is not None or resource is None:
+        return rss
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def anon_rss_mb() -> float | None:
+    """常驻内存中的匿名内存(不含映射的文件页，后者属于可回收的页缓存)，仅 Linux"""
+    return _proc_status_mb("RssAnon")
+
+
+def item_hash(i: int) -> str:
+    from src.plugins.knowledge.src.utils.hash import get_sha256
+
+    return "entity-" + get_sha256(f"实体{i}")
+
+
+def generate_table(path: str, count: int, dim: int, seed: int):
+    from src.plugins.knowledge.src.embedding_store import EmbeddingTable
+
+    rng = np.random.default_rng(seed)
+    table = EmbeddingTable(path, dim)
+    for start in range(0, count, CHUNK):
+        vectors = rng.standard_normal((min(CHUNK, count - start), dim), dtype=np.float32)
+        for offset, vector in enumerate(vectors):
+            table.add(item_hash(start + offset), f"实体{start + offset}", vector)
+        # 分块保存，同时测试追加写入
+        table.save()
+
+
+def generate_parquet(path: str, count: int, dim: int, seed: int):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rng = np.random.default_rng(seed)
+    writer = None
+    for start in range(0, count, CHUNK):
+        size = min(CHUNK, count - start)
+        vectors = rng.standard_normal((size, dim), dtype=np.float32).astype(np.float64)
+        embedding = pa.ListArray.from_arrays(np.arange(0, (size + 1) * dim, dim, dtype=np.int32), vectors.ravel())
+        batch = pa.table(
+            {
+                "hash": [item_hash(i) for i in range(start, start + size)],
+                "embedding": embedding,
+                "str": [f"实体{i}" for i in range(start, start + size)],
+            }
+        )
+        if writer is None:
+            writer = pq.ParquetWriter(path, batch.schema)
+        writer.write_table(batch)
+    writer.close()
+
+
+def measure(kind: str, path: str, count: int, dim: int, lookups: int, seed: int) -> dict:
+    """在子进程中执行：加载并随机查询"""
+    import pandas as pd
+
+    from src.plugins.knowledge.src.embedding_store import EmbeddingStoreItem, EmbeddingTable
+
+    # 模块导入完成后再开始计量
+    result = {"kind": kind, "count": count, "dim": dim, "rss_before_mb": rss_mb(), "anon_before_mb": anon_rss_mb()}
+    start = time.perf_counter()
+    if kind == "legacy":
+        # 旧版本 EmbeddingStore.load_from_file 的加载方式
+        store = dict()
+        data_frame = pd.read_parquet(path, engine="pyarrow")
+        for _, row in data_frame.iterrows():
+            store[row["hash"]] = EmbeddingStoreItem(row["hash"], row["embedding"], row["str"])
+        del data_frame
+    else:
+        store = EmbeddingTable(path, dim)
+        store.load()
+    result["load_s"] = round(time.perf_counter() - start, 3)
+    result["rss_after_load_mb"] = rss_mb()
+    result["anon_after_load_mb"] = anon_rss_mb()
+
+    rng = np.random.default_rng(seed)
+    keys = [item_hash(int(i)) for i in rng.integers(0, count, lookups)]
+    start = time.perf_counter()
+    checksum = 0.0
+    for key in keys:
+        item = store[key]
+        checksum += float(item.embedding[0]) + len(item.str)
+    result["lookup_us"] = round((time.perf_counter() - start) / lookups * 1e6, 2)
+    result["rss_after_lookups_mb"] = rss_mb()
+    result["anon_after_lookups_mb"] = anon_rss_mb()
+    return result
+
+
+def run_child(kind: str, path: str, args) -> dict:
+    command = [sys.executable, __file__, "--measure", kind, "--path", path]
+    command += ["--count", str(args.legacy_count if kind == "legacy" else args.count), "--dim", str(args.dim)]
+    command += ["--lookups", str(args.lookups), "--seed", str(args.seed)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LPMM 嵌入库加载基准测试")
+    parser.add_argument("--count", type=int, default=1000000, help="EmbeddingTable 格式的向量数")
+    parser.add_argument("--legacy-count", type=int, default=100000, help="旧格式(parquet)的向量数，0 表示跳过")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度")
+    parser.add_argument("--lookups", type=int, default=1000, help="加载后随机查询的次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--dir", help="生成数据的目录(默认为临时目录)；已有数据时直接使用")
+    parser.add_argument("--measure", choices=("legacy", "table"), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        from loguru import logger
+
+        logger.disable("src")
+        print(json.dumps(measure(args.measure, args.path, args.count, args.dim, args.lookups, args.seed)))
+        return
+
+    data_dir = args.dir or tempfile.mkdtemp(prefix="lpmm_store_bench_")
+    table_path = os.path.join(data_dir, f"table_{args.count}_{args.dim}")
+    parquet_path = os.path.join(data_dir, f"legacy_{args.legacy_count}_{args.dim}.parquet")
+    results = []
+    if args.legacy_count > 0:
+        if not os.path.exists(parquet_path):
+            print(f"生成旧格式嵌入库 {args.legacy_count} x {args.dim} ...", file=sys.stderr)
+            generate_parquet(parquet_path, args.legacy_count, args.dim, args.seed)
+        results.append(run_child("legacy", parquet_path, args))
+    if not os.path.exists(os.path.join(table_path, "meta.json")):
+        print(f"生成 EmbeddingTable {args.count} x {args.dim} ...", file=sys.stderr)
+        generate_table(table_path, args.count, args.dim, args.seed)
+    results.append(run_child("table", table_path, args))
+    print(json.dumps({"data_dir": data_dir, "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""记忆系统基准测试套件
+
+生成指定规模和平均度数的中文合成记忆图，使用模拟 LLM 和进程内 mongomock 数据库，
+逐项计时 HippocampusManager 的公开操作(检索、激活、构建、遗忘、整合)，
+以 JSON 输出每项操作的 ops/sec、p50/p99 延迟和峰值内存(RSS)。
+另外以固定速率(默认 200 条/秒)模拟消息突发，对比检索在事件循环内执行和在检索线程中执行时的事件循环延迟。
+
+相同参数和随机种子下生成的图与调用序列完全相同，输出中附带当前 git 提交，便于在不同提交之间对比。
+数据库使用进程内的 mongomock 代替，不会读写真实数据库，需要先 pip install mongomock。
+
+用法: python scripts/benchmark_memory.py [--nodes 2000] [--degree 6] [--iterations 200] [--output result.json]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT_PATH, ".env"))
+os.environ.setdefault("HOST", "127.0.0.1")
+os.environ.setdefault("PORT", "8000")
+
+try:
+    import mongomock
+except ImportError:
+    print("需要安装 mongomock 作为进程内数据库: pip install mongomock")
+    sys.exit(1)
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
+
+import numpy as np  # noqa: E402
+from loguru import logger  # noqa: E402
+
+import src.common.database as database  # noqa: E402
+
+database._client = mongomock.MongoClient()
+database._db = database._client["MaiBotBenchmark"]
+
+from src.plugins.memory_system.Hippocampus import (  # noqa: E402
+    EntorhinalCortex,
+    Hippocampus,
+    HippocampusManager,
+    ParahippocampalGyrus,
+)
+from src.plugins.memory_system.memory_config import MemoryConfig  # noqa: E402
+
+# 用于拼出合成词语的常用汉字
+CHARACTERS = (
+    "天地人山水火风云雨雪花草树木日月星光春夏秋冬东南西北前后左右上下大小多少高低长短"
+    "猫狗鱼鸟马牛羊虎龙书画歌舞茶酒饭菜学习工作游戏音乐电影旅行考试编程咖啡周末朋友家乡"
+)
+
+
+class SyntheticVocabulary:
+    """合成的中文词表，以及从文本中找出词表中词语的方法(供模拟 LLM 提取话题)"""
+
+    def __init__(self, size: int, rng: random.Random):
+        words = set()
+        while len(words) < size:
+            words.add("".join(rng.choice(CHARACTERS) for _ in range(rng.choice((2, 2, 3, 4)))))
+        self.words = sorted(words)
+        self.rng = rng
+        # 长词优先匹配
+        self._pattern = re.compile("|".join(sorted(map(re.escape, self.words), key=len, reverse=True)))
+
+    def sentence(self, word_count: int, rng: random.Random = None) -> str:
+        rng = rng or self.rng
+        return "，".join(rng.choice(self.words) for _ in range(word_count)) + "。"
+
+    def find(self, text: str, limit: int) -> list:
+        found = []
+        for match in self._pattern.finditer(text):
+            word = match.group(0)
+            if word not in found:
+                found.append(word)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+class MockLLM:
+    """模拟 LLMRequest：固定延迟，输出只由提示词决定"""
+
+    def __init__(self, vocabulary: SyntheticVocabulary, latency: float):
+        self.vocabulary = vocabulary
+        self.latency = latency
+        self.calls = 0
+
+    @staticmethod
+    def _digest(prompt: str) -> int:
+        return int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16)
+
+    async def _wait(self):
+        self.calls += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    async def generate_response(self, prompt: str):
+        """话题提取：返回提示词中出现的词表词语"""
+        await self._wait()
+        topics = self.vocabulary.find(prompt, 5)
+        return ",".join(f"<{topic}>" for topic in topics) or "<none>", "", "mock-model"
+
+    async def generate_response_async(self, prompt: str):
+        """话题总结：返回由提示词确定的合成句子"""
+        await self._wait()
+        return self.vocabulary.sentence(6, random.Random(self._digest(prompt))), "", "mock-model"
+
+
+def populate_database(args, vocabulary: SyntheticVocabulary, rng: random.Random):
+    """向 mongomock 写入合成记忆图和聊天消息"""
+    db = database._db
+    now = time.time()
+    for name in ("nodes", "edges", "meta"):
+        db.graph_data[name].delete_many({})
+    db.messages.delete_many({})
+
+    concepts = vocabulary.words[: args.nodes]
+    node_docs = []
+    for concept in concepts:
+        # 让部分记忆项彼此相似，使整合操作有事可做
+        base = vocabulary.sentence(8)
+        items = [
+            base if rng.random() < 0.3 else vocabulary.sentence(8) for _ in range(rng.randint(1, 2 * args.items - 1))
+        ]
+        created = now - rng.uniform(0, 30 * 24 * 3600)
+        node_docs.append(
+            {
+                "concept": concept,
+                "memory_items": items,
+                "created_time": created,
+                "last_modified": rng.uniform(created, now),
+            }
+        )
+    db.graph_data.nodes.insert_many(node_docs)
+
+    edge_keys = set()
+    target_edges = min(args.nodes * args.degree // 2, args.nodes * (args.nodes - 1) // 2)
+    while len(edge_keys) < target_edges:
+        source, target = rng.sample(concepts, 2)
+        edge_keys.add((min(source, target), max(source, target)))
+    edge_docs = []
+    for source, target in sorted(edge_keys):
+        created = now - rng.uniform(0, 30 * 24 * 3600)
+        edge_docs.append(
+            {
+                "source": source,
+                "target": target,
+                "strength": rng.randint(1, 10),
+                "created_time": created,
+                "last_modified": rng.uniform(created, now),
+            }
+        )
+    if edge_docs:
+        db.graph_data.edges.insert_many(edge_docs)
+
+    message_docs = []
+    message_time = now - args.message_hours * 3600
+    while message_time < now:
+        user_id = rng.randint(1, 20)
+        message_docs.append(
+            {
+                "chat_id": f"chat{user_id % 3}",
+                "time": message_time,
+                "user_info": {"platform": "qq", "user_id": user_id, "user_nickname": f"用户{user_id}"},
+                "processed_plain_text": vocabulary.sentence(3),
+                "memorized_times": 0,
+            }
+        )
+        message_time += rng.uniform(10, 2 * args.message_interval - 10)
+    db.messages.insert_many(message_docs)
+    return len(node_docs), len(edge_docs), len(message_docs)
+
+
+def create_manager(vocabulary: SyntheticVocabulary, latency: float) -> HippocampusManager:
+    """按 HippocampusManager.initialize 的流程组装，只把 LLMRequest 换成模拟对象"""
+    hippocampus = Hippocampus()
+    hippocampus.config = MemoryConfig.from_global_config(object())
+    hippocampus.entorhinal_cortex = EntorhinalCortex(hippocampus)
+    hippocampus.parahippocampal_gyrus = ParahippocampalGyrus(hippocampus)
+    hippocampus.entorhinal_cortex.sync_memory_from_db()
+    hippocampus.llm_topic_judge = MockLLM(vocabulary, latency)
+    hippocampus.llm_summary = MockLLM(vocabulary, latency)
+
+    manager = HippocampusManager()
+    manager._hippocampus = hippocampus
+    manager._initialized = True
+    return manager
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 下单位为 KB，macOS 下为字节
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def summarize(latencies: list) -> dict:
+    values = np.array(latencies) * 1000
+    total = float(values.sum()) / 1000
+    return {
+        "count": len(latencies),
+        "total_s": round(total, 4),
+        "ops_per_sec": round(len(latencies) / total, 2) if total > 0 else None,
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def measure(call, inputs: list) -> dict:
+    latencies = []
+    for value in inputs:
+        start = time.perf_counter()
+        result = call(value)
+        if asyncio.iscoroutine(result):
+            await result
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+async def measure_loop_lag(manager: HippocampusManager, texts: list, rate: float, duration: float) -> dict:
+    """以固定速率模拟消息突发，每条消息调用一次快速激活，同时测量事件循环延迟
+
+    一个探测协程每隔 1ms 醒来一次，实际醒来时间与预期的差值即事件循环延迟。
+    """
+    interval = 0.001
+    lags = []
+    message_latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    async def handle(text: str):
+        start = time.perf_counter()
+        await manager.get_activate_from_text(text, fast_retrieval=True)
+        message_latencies.append(time.perf_counter() - start)
+
+    probe_task = asyncio.create_task(probe())
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * duration)):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(handle(texts[i % len(texts)])))
+    await asyncio.gather(*tasks)
+    done.set()
+    await probe_task
+
+    lag_ms = np.array(lags) * 1000
+    return {
+        "messages": len(message_latencies),
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "loop_lag_p50_ms": round(float(np.percentile(lag_ms, 50)), 3),
+        "loop_lag_p99_ms": round(float(np.percentile(lag_ms, 99)), 3),
+        "loop_lag_max_ms": round(float(lag_ms.max()), 3),
+        "message": summarize(message_latencies),
+    }
+
+
+async def measure_loop_lag_inline(manager: HippocampusManager, texts: list, rate: float, duration: float) -> dict:
+    """同 measure_loop_lag，但检索直接在事件循环中执行(不使用检索线程)，作为对比"""
+
+    async def run_inline(func, *args):
+        return func(*args)
+
+    hippocampus = manager._hippocampus
+    hippocampus._run_retrieval = run_inline
+    try:
+        return await measure_loop_lag(manager, texts, rate, duration)
+    finally:
+        del hippocampus._run_retrieval
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_PATH, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # 记忆系统内部的采样同样固定
+    vocabulary = SyntheticVocabulary(args.nodes + args.nodes // 2, rng)
+    node_count, edge_count, message_count = populate_database(args, vocabulary, rng)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        EntorhinalCortex.SNAPSHOT_PATH = os.path.join(snapshot_dir, "memory_graph.snapshot")
+
+        # 启动加载：第一次从数据库加载并写入快照，第二次从快照加载
+        results["initialize_from_db"] = await measure(lambda _: create_manager(vocabulary, args.latency), [None])
+        results["initialize_from_snapshot"] = await measure(lambda _: create_manager(vocabulary, args.latency), [None])
+        manager = create_manager(vocabulary, args.latency)
+
+        # 检索输入中同时包含图中存在和不存在的词语
+        texts = [vocabulary.sentence(rng.randint(3, 12)) for _ in range(args.iterations)]
+        keyword_lists = [rng.sample(vocabulary.words, rng.randint(1, 4)) for _ in range(args.iterations)]
+        keywords = [rng.choice(vocabulary.words) for _ in range(args.iterations)]
+
+        results["get_memory_from_keyword"] = await measure(manager.get_memory_from_keyword, keywords)
+        results["get_memory_from_topic"] = await measure(manager.get_memory_from_topic, keyword_lists)
+        results["get_memory_from_text"] = await measure(manager.get_memory_from_text, texts)
+        results["get_memory_from_text_fast"] = await measure(
+            lambda text: manager.get_memory_from_text(text, fast_retrieval=True), texts
+        )
+        results["get_activate_from_text"] = await measure(manager.get_activate_from_text, texts)
+        results["get_activate_from_text_fast"] = await measure(
+            lambda text: manager.get_activate_from_text(text, fast_retrieval=True), texts
+        )
+
+        # 消息突发下的事件循环延迟：检索在事件循环中执行 vs 在检索线程中执行
+        results["loop_lag_inline"] = await measure_loop_lag_inline(manager, texts, args.burst_rate, args.burst_seconds)
+        results["loop_lag_offloaded"] = await measure_loop_lag(manager, texts, args.burst_rate, args.burst_seconds)
+
+        # 修改记忆图的操作放在最后，每轮都会同步数据库和快照
+        results["build_memory"] = await measure(lambda _: manager.build_memory(), range(args.rounds))
+        results["forget_memory"] = await measure(
+            lambda _: manager.forget_memory(args.forget_percentage), range(args.rounds)
+        )
+        results["consolidate_memory"] = await measure(lambda _: manager.consolidate_memory(), range(args.rounds))
+
+        graph = manager._hippocampus.memory_graph.G
+        return {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "nodes": args.nodes,
+                "degree": args.degree,
+                "items": args.items,
+                "iterations": args.iterations,
+                "rounds": args.rounds,
+                "latency": args.latency,
+                "burst_rate": args.burst_rate,
+                "burst_seconds": args.burst_seconds,
+                "seed": args.seed,
+            },
+            "dataset": {"nodes": node_count, "edges": edge_count, "messages": message_count},
+            "final_graph": {"nodes": graph.number_of_nodes(), "edges": graph.number_of_edges()},
+            "operations": results,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="记忆系统基准测试套件(合成记忆图 + 模拟LLM + mongomock)")
+    parser.add_argument("--nodes", type=int, default=2000, help="记忆图节点数")
+    parser.add_argument("--degree", type=int, default=6, help="节点平均度数")
+    parser.add_argument("--items", type=int, default=3, help="每个节点平均记忆项数量")
+    parser.add_argument("--iterations", type=int, default=200, help="每项检索操作的调用次数")
+    parser.add_argument("--rounds", type=int, default=3, help="构建、遗忘、整合操作各执行的轮数")
+    parser.add_argument("--forget-percentage", type=float, default=0.01, help="遗忘操作检查的比例")
+    parser.add_argument("--message-hours", type=float, default=24 * 14, help="合成聊天记录覆盖的小时数")
+    parser.add_argument("--message-interval", type=float, default=60, help="合成聊天消息的平均间隔(秒)")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟LLM每次调用的延迟(秒)，默认0只测本地开销")
+    parser.add_argument("--burst-rate", type=float, default=200, help="测量事件循环延迟时每秒模拟的消息数")
+    parser.add_argument("--burst-seconds", type=float, default=5, help="消息突发持续的秒数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将 JSON 结果写入文件")
+    parser.add_argument("--verbose", action="store_true", help="保留记忆系统的日志输出")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # 日志输出到终端的开销会淹没被测操作本身
+        logger.disable("src")
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
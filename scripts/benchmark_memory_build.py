@@ -0,0 +1,150 @@
+"""记忆构建流水线基准测试(模拟LLM)
+
+用带固定延迟、输出确定的模拟 LLM 分别以串行(并发数1)和并发方式构建同一批样本的记忆，
+输出各阶段耗时与加速比，并校验两种方式得到的记忆图完全一致。
+
+数据库使用进程内的 mongomock 代替，不会读写真实数据库，需要先 pip install mongomock。
+需要存在 config/bot_config.toml(首次运行麦麦时自动生成)。
+
+用法: python scripts/benchmark_memory_build.py [--samples 16] [--concurrency 4] [--latency 0.2]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT_PATH, ".env"))
+os.environ.setdefault("HOST", "127.0.0.1")
+os.environ.setdefault("PORT", "8000")
+
+try:
+    import mongomock
+except ImportError:
+    print("需要安装 mongomock 作为进程内数据库: pip install mongomock")
+    sys.exit(1)
+
+import src.common.database as database  # noqa: E402
+
+database._client = mongomock.MongoClient()
+database._db = database._client["MaiBotBenchmark"]
+
+from src.plugins.memory_system.Hippocampus import (  # noqa: E402
+    EntorhinalCortex,
+    Hippocampus,
+    ParahippocampalGyrus,
+)
+from src.plugins.memory_system.memory_config import MemoryConfig  # noqa: E402
+
+VOCABULARY = ["猫猫", "编程", "游戏", "考试", "火锅", "音乐", "旅行", "天气", "电影", "学习", "咖啡", "周末"]
+
+
+class MockLLM:
+    """模拟 LLMRequest：固定延迟，输出只由提示词决定"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    @staticmethod
+    def _digest(prompt: str) -> int:
+        return int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16)
+
+    async def generate_response(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        digest = self._digest(prompt)
+        topics = [VOCABULARY[(digest >> (i * 8)) % len(VOCABULARY)] for i in range(3)]
+        return ",".join(f"<{topic}>" for topic in topics), "", "mock-model"
+
+    async def generate_response_async(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return f"记忆摘要-{self._digest(prompt) % 100000}", "", "mock-model"
+
+
+def make_samples(sample_num: int, sample_length: int, seed: int) -> list:
+    rng = random.Random(seed)
+    base_time = time.time() - 3600 * 24
+    samples = []
+    for i in range(sample_num):
+        messages = []
+        for j in range(sample_length):
+            user_id = rng.randint(1, 8)
+            messages.append(
+                {
+                    "time": base_time + i * 600 + j * 10,
+                    "user_info": {"platform": "qq", "user_id": user_id, "user_nickname": f"用户{user_id}"},
+                    "processed_plain_text": f"我们聊聊{rng.choice(VOCABULARY)}和{rng.choice(VOCABULARY)}吧",
+                }
+            )
+        samples.append(messages)
+    return samples
+
+
+def make_hippocampus(concurrency: int, latency: float, samples: list) -> Hippocampus:
+    config = MemoryConfig.from_global_config(object())
+    config.build_memory_concurrency = concurrency
+
+    hippocampus = Hippocampus()
+    hippocampus.config = config
+    hippocampus.entorhinal_cortex = EntorhinalCortex(hippocampus)
+    hippocampus.parahippocampal_gyrus = ParahippocampalGyrus(hippocampus)
+    hippocampus.llm_topic_judge = MockLLM(latency)
+    hippocampus.llm_summary = MockLLM(latency)
+    # 固定样本，跳过按时间分布从数据库采样
+    hippocampus.entorhinal_cortex.get_memory_sample = lambda: samples
+
+    # 预置一些已有节点，使相似话题连接也参与比较
+    for word in VOCABULARY[:4]:
+        hippocampus.memory_graph.add_dot(f"{word}爱好", f"关于{word}的旧记忆")
+    return hippocampus
+
+
+def graph_signature(hippocampus: Hippocampus) -> tuple:
+    G = hippocampus.memory_graph.G
+    nodes = [(node, tuple(data.get("memory_items", []))) for node, data in G.nodes(data=True)]
+    edges = sorted((*sorted((u, v)), data.get("strength", 1)) for u, v, data in G.edges(data=True))
+    return nodes, edges
+
+
+async def run(args):
+    samples = make_samples(args.samples, args.length, args.seed)
+
+    results = {}
+    for concurrency in (1, args.concurrency):
+        database._db.graph_data.nodes.delete_many({})
+        database._db.graph_data.edges.delete_many({})
+        hippocampus = make_hippocampus(concurrency, args.latency, samples)
+        timings = await hippocampus.parahippocampal_gyrus.operation_build_memory()
+        results[concurrency] = (timings, graph_signature(hippocampus))
+        print(
+            f"并发 {concurrency:>2} | 总耗时 {timings['total']:7.2f}s | 压缩 {timings['compress']:7.2f}s | "
+            f"合并 {timings['merge']:.4f}s | 同步 {timings['sync']:.4f}s"
+        )
+
+    serial, concurrent = results[1], results[args.concurrency]
+    print(f"加速比: {serial[0]['total'] / concurrent[0]['total']:.2f}x")
+    print(f"记忆图是否一致: {serial[1] == concurrent[1]} (节点数 {len(serial[1][0])}, 边数 {len(serial[1][1])})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="记忆构建流水线基准测试(模拟LLM)")
+    parser.add_argument("--samples", type=int, default=16, help="样本数量")
+    parser.add_argument("--length", type=int, default=20, help="每个样本的消息数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发压缩的样本数")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟LLM每次调用的延迟(秒)")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
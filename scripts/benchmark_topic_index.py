@@ -0,0 +1,101 @@
+"""记忆图话题检索基准测试
+
+对比旧的全量扫描(对每个节点重新 jieba 分词)与倒排索引检索在不同图规模下的耗时，
+并校验两者返回结果一致。
+
+用法: python scripts/benchmark_topic_index.py [--sizes 1000 10000 100000] [--queries 5]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import time
+
+import jieba
+import numpy as np
+
+# 直接按路径加载索引模块，避免导入 src.plugins 时初始化整个机器人(数据库、配置等)
+_spec = importlib.util.spec_from_file_location(
+    "topic_index",
+    os.path.join(os.path.dirname(__file__), "..", "src", "plugins", "memory_system", "topic_index.py"),
+)
+_topic_index = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_topic_index)
+TopicTokenIndex = _topic_index.TopicTokenIndex
+
+
+def legacy_search(nodes: list, keyword: str, threshold: float) -> list:
+    """原 get_memory_from_keyword 中的全量扫描实现"""
+    keyword_words = set(jieba.cut(keyword))
+    results = []
+    for node in nodes:
+        node_words = set(jieba.cut(node))
+        all_words = keyword_words | node_words
+        v1 = [1 if word in keyword_words else 0 for word in all_words]
+        v2 = [1 if word in node_words else 0 for word in all_words]
+        dot_product = np.dot(v1, v2)
+        norm1 = np.linalg.norm(v1)
+        norm2 = np.linalg.norm(v2)
+        similarity = 0 if norm1 == 0 or norm2 == 0 else dot_product / (norm1 * norm2)
+        if similarity >= threshold:
+            results.append((node, similarity))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results
+
+
+def make_topics(n: int, rng: random.Random) -> list:
+    """使用 jieba 词典中的常用词随机拼接生成话题名"""
+    jieba.dt.check_initialized()
+    words = [w for w, f in jieba.dt.FREQ.items() if f > 50 and 2 <= len(w) <= 4]
+    topics = set()
+    while len(topics) < n:
+        topics.add("".join(rng.sample(words, rng.choice((1, 1, 2, 2, 3)))))
+    return list(topics)
+
+
+def run(size: int, queries: int, threshold: float, seed: int):
+    rng = random.Random(seed)
+    topics = make_topics(size, rng)
+    query_texts = [rng.choice(topics) for _ in range(queries)]
+
+    build_start = time.perf_counter()
+    index = TopicTokenIndex()
+    index.rebuild(topics)
+    build_time = time.perf_counter() - build_start
+
+    legacy_start = time.perf_counter()
+    legacy_results = [legacy_search(topics, q, threshold) for q in query_texts]
+    legacy_time = (time.perf_counter() - legacy_start) / queries
+
+    index_start = time.perf_counter()
+    index_results = [index.search(q, threshold) for q in query_texts]
+    index_time = (time.perf_counter() - index_start) / queries
+
+    mismatches = sum(
+        1
+        for old, new in zip(legacy_results, index_results, strict=True)
+        if [(t, round(float(s), 9)) for t, s in old] != [(t, round(s, 9)) for t, s in new]
+    )
+    print(
+        f"节点数 {size:>7} | 建索引 {build_time:8.3f}s | 全量扫描 {legacy_time * 1000:10.2f}ms/次 | "
+        f"倒排索引 {index_time * 1000:8.3f}ms/次 | 加速 {legacy_time / max(index_time, 1e-9):8.1f}x | "
+        f"结果不一致 {mismatches}/{queries}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="记忆图话题检索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=5, help="每种规模的查询次数")
+    parser.add_argument("--threshold", type=float, default=0.3, help="相似度阈值")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    jieba.setLogLevel(60)
+    for size in args.sizes:
+        run(size, args.queries, args.threshold, args.seed)
+
+
+if __name__ == "__main__":
+    main()
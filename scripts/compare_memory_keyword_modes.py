@@ -0,0 +1,113 @@
+"""比较记忆检索的两种关键词来源(LLM 提取 / 节点名匹配)
+
+从数据库中取最近的聊天消息作为真实流量，对每条消息分别用 LLM(memory_keyword_mode = "llm")和
+节点名自动机(memory_keyword_mode = "match")得到记忆图中存在的关键词，以 LLM 的结果为参照统计：
+- 关键词的精确率、召回率、Jaccard 相似度以及完全一致的比例
+- 用两组关键词检索出的记忆是否一致
+- 两种方式提取关键词的耗时
+
+使用 config/bot_config.toml 中配置的数据库和 llm_topic_judge 模型，会真实调用 LLM。
+
+用法: python scripts/compare_memory_keyword_modes.py [--limit 200] [--details details.jsonl]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+import numpy as np  # noqa: E402
+
+from src.common.message_repository import find_messages  # noqa: E402
+from src.config.config import global_config  # noqa: E402
+from src.plugins.memory_system.Hippocampus import HippocampusManager  # noqa: E402
+
+
+def ratio(numerator: int, denominator: int) -> float:
+    # 两边都为空视为完全一致
+    return numerator / denominator if denominator else 1.0
+
+
+def percentile_ms(values: list, q: float) -> float:
+    return round(float(np.percentile(np.array(values) * 1000, q)), 3) if values else 0.0
+
+
+async def compare(args):
+    hippocampus = HippocampusManager.get_instance().initialize(global_config)
+    messages = find_messages(
+        {"processed_plain_text": {"$exists": True, "$ne": ""}}, limit=args.limit, limit_mode="latest"
+    )
+    texts = [message["processed_plain_text"] for message in messages if message.get("processed_plain_text")]
+    print(f"共 {len(texts)} 条消息，记忆图节点数 {hippocampus.memory_graph.G.number_of_nodes()}")
+    hippocampus.memory_graph.node_matcher.compile()  # 编译耗时不计入单条消息的匹配耗时
+
+    precisions, recalls, jaccards, memory_jaccards = [], [], [], []
+    exact = memory_exact = 0
+    llm_times, match_times = [], []
+    details = []
+    for i, text in enumerate(texts, 1):
+        start = time.perf_counter()
+        llm_keywords = await hippocampus._extract_keywords_llm(text)
+        llm_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        match_keywords = hippocampus.memory_graph.node_matcher.compile().find_all(text)
+        match_times.append(time.perf_counter() - start)
+
+        snapshot = hippocampus.memory_graph.get_snapshot()
+        llm_valid = [keyword for keyword in dict.fromkeys(llm_keywords) if keyword in snapshot]
+        match_valid = [keyword for keyword in match_keywords if keyword in snapshot]
+        llm_set, match_set = set(llm_valid), set(match_valid)
+        common = len(llm_set & match_set)
+        precisions.append(ratio(common, len(match_set)))
+        recalls.append(ratio(common, len(llm_set)))
+        jaccards.append(ratio(common, len(llm_set | match_set)))
+        exact += llm_set == match_set
+
+        # 用两组关键词分别检索，比较最终选中的记忆
+        llm_memories = set(hippocampus._memory_from_text(snapshot, text, llm_valid, 3, 2, 3))
+        match_memories = set(hippocampus._memory_from_text(snapshot, text, match_valid, 3, 2, 3))
+        memory_jaccards.append(ratio(len(llm_memories & match_memories), len(llm_memories | match_memories)))
+        memory_exact += llm_memories == match_memories
+
+        details.append({"text": text, "llm": llm_valid, "match": match_valid})
+        if i % 20 == 0:
+            print(f"已处理 {i}/{len(texts)}")
+
+    count = max(1, len(texts))
+    report = {
+        "messages": len(texts),
+        "nodes": hippocampus.memory_graph.G.number_of_nodes(),
+        "keyword_precision": round(float(np.mean(precisions)), 4) if precisions else None,
+        "keyword_recall": round(float(np.mean(recalls)), 4) if recalls else None,
+        "keyword_jaccard": round(float(np.mean(jaccards)), 4) if jaccards else None,
+        "keyword_exact_match": round(exact / count, 4),
+        "memory_jaccard": round(float(np.mean(memory_jaccards)), 4) if memory_jaccards else None,
+        "memory_exact_match": round(memory_exact / count, 4),
+        "llm_p50_ms": percentile_ms(llm_times, 50),
+        "llm_p99_ms": percentile_ms(llm_times, 99),
+        "match_p50_ms": percentile_ms(match_times, 50),
+        "match_p99_ms": percentile_ms(match_times, 99),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.details:
+        with open(args.details, "w", encoding="utf-8") as f:
+            for detail in details:
+                f.write(json.dumps(detail, ensure_ascii=False) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较记忆检索的 LLM 关键词提取与节点名匹配")
+    parser.add_argument("--limit", type=int, default=200, help="取最近多少条消息")
+    parser.add_argument("--details", help="将每条消息两种方式的关键词写入 jsonl 文件")
+    asyncio.run(compare(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
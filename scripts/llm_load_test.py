@@ -0,0 +1,257 @@
+"""LLM 请求压测工具
+
+以指定并发数通过 LLMRequest 或 LPMM 的 LLMClient 发起请求，输出吞吐量、延迟百分位数和重试次数。
+默认在进程内启动模拟服务(scripts/mock_openai_server.py)，可以设置延迟分布、流式输出速度和错误注入，
+不产生真实的 API 费用；也可以用 --base-url 指向已经运行的模拟服务。
+
+压测目标(--target)：
+- chat：LLMRequest.generate_response_async
+- stream：LLMRequest.generate_response_stream，额外统计首段文本的延迟
+- tool：LLMRequest.generate_response_tool_async
+- embedding：LLMRequest.get_embedding(压测期间不使用 embedding 缓存)
+- lpmm-chat / lpmm-embedding：LPMM 的 LLMClient(同步接口，在线程中并发调用)
+
+重试次数 = 服务端收到的请求数 - 发起的请求数，需要服务端提供 /stats(即模拟服务)。
+LLMRequest 的重试基础等待时间默认 10 秒，这里默认缩短为 0.2 秒(--base-wait)。
+数据库使用进程内的 mongomock 代替(记录 token 用量)，需要先 pip install mongomock。
+
+用法:
+    python scripts/llm_load_test.py --target chat --requests 500 --concurrency 32 \\
+        --latency 0.2 --latency-dist lognormal --error 429:0.05 --error 500:0.02
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_PATH)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT_PATH, ".env"))
+os.environ.setdefault("HOST", "127.0.0.1")
+os.environ.setdefault("PORT", "8000")
+
+try:
+    import mongomock
+except ImportError:
+    print("需要安装 mongomock 作为进程内数据库: pip install mongomock")
+    sys.exit(1)
+
+import aiohttp  # noqa: E402
+import numpy as np  # noqa: E402
+from loguru import logger  # noqa: E402
+
+import src.common.database as database  # noqa: E402
+
+database._client = mongomock.MongoClient()
+database._db = database._client["MaiBotLoadTest"]
+
+import src.plugins.models.utils_model as utils_model  # noqa: E402
+from src.config.config import global_config  # noqa: E402
+from src.plugins.models.session_pool import session_pool  # noqa: E402
+from src.plugins.models.usage_recorder import usage_recorder  # noqa: E402
+from src.plugins.models.utils_model import LLMRequest  # noqa: E402
+
+from mock_openai_server import add_server_arguments, server_options, start_mock_server  # noqa: E402
+
+TARGETS = ("chat", "stream", "tool", "embedding", "lpmm-chat", "lpmm-embedding")
+
+MOCK_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_weather",
+            "description": "查询天气",
+            "parameters": {"type": "object", "properties": {"city": {"type": "string"}}},
+        },
+    }
+]
+
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    ms = np.array(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p90_ms": round(float(np.percentile(ms, 90)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "max_ms": round(float(ms.max()), 1),
+    }
+
+
+async def _fetch_server_stats(base_url: str):
+    """读取模拟服务的 /stats，其他服务返回 None"""
+    stats_url = base_url.rstrip("/").removesuffix("/v1") + "/stats"
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(stats_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status == 200:
+                    return await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        pass
+    return None
+
+
+def _build_call(target: str, base_url: str, model: str):
+    """返回 call(prompt) -> 首段文本延迟或 None 的协程函数"""
+    if target.startswith("lpmm-"):
+        from src.plugins.knowledge.src.llm_client import LLMClient
+        from src.plugins.knowledge.src.lpmmconfig import global_config as lpmm_config
+
+        # embedding 缓存写到临时目录，压测数据不进入真实的缓存
+        lpmm_config["persistence"]["data_root_path"] = tempfile.mkdtemp(prefix="maibot_load_test_")
+        client = LLMClient(base_url, "sk-mock")
+
+        if target == "lpmm-chat":
+
+            async def call(prompt: str):
+                await asyncio.to_thread(client.send_chat_request, model, [{"role": "user", "content": prompt}])
+
+        else:
+
+            async def call(prompt: str):
+                await asyncio.to_thread(client.send_embedding_request, model, prompt)
+
+        return call
+
+    os.environ["LOAD_TEST_KEY"] = "sk-mock"
+    os.environ["LOAD_TEST_BASE_URL"] = base_url
+    llm = LLMRequest(
+        {"name": model, "key": "LOAD_TEST_KEY", "base_url": "LOAD_TEST_BASE_URL"}, request_type="load_test"
+    )
+
+    if target == "chat":
+
+        async def call(prompt: str):
+            await llm.generate_response_async(prompt)
+
+    elif target == "stream":
+
+        async def call(prompt: str):
+            start = time.perf_counter()
+            first = None
+
+            async def on_delta(delta: str):
+                nonlocal first
+                if first is None:
+                    first = time.perf_counter() - start
+
+            await llm.generate_response_stream(prompt, on_delta)
+            return first
+
+    elif target == "tool":
+
+        async def call(prompt: str):
+            await llm.generate_response_tool_async(prompt, MOCK_TOOLS)
+
+    else:
+        # 压测期间不使用 embedding 缓存，每个请求都发到服务端
+        global_config.embedding_cache_memory_size = 0
+        global_config.embedding_cache_disk_size = 0
+
+        async def call(prompt: str):
+            if await llm.get_embedding(prompt) is None:
+                raise RuntimeError("embedding 请求失败")
+
+    return call
+
+
+async def run_load(call, requests: int, concurrency: int) -> dict:
+    latencies = []
+    first_chunk_latencies = []
+    errors = {}
+    queue = asyncio.Queue()
+    run_id = time.time_ns()
+    for i in range(requests):
+        # 每个请求的内容都不同，避免命中缓存
+        queue.put_nowait(f"压测请求 {run_id}-{i}：今天天气怎么样？")
+
+    async def worker():
+        while not queue.empty():
+            prompt = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                first = await call(prompt)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if first is not None:
+                first_chunk_latencies.append(first)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = {
+        "requests": requests,
+        "succeeded": len(latencies),
+        "failed": sum(errors.values()),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency": _percentiles(latencies),
+    }
+    if first_chunk_latencies:
+        result["first_chunk_latency"] = _percentiles(first_chunk_latencies)
+    return result
+
+
+async def run(args):
+    runner = None
+    base_url = args.base_url
+    if base_url is None:
+        runner, base_url = await start_mock_server(**server_options(args))
+    LLMRequest.DEFAULT_RETRY_POLICY = {**LLMRequest.DEFAULT_RETRY_POLICY, "base_wait": args.base_wait}
+
+    call = _build_call(args.target, base_url, args.model)
+    before = await _fetch_server_stats(base_url)
+    result = await run_load(call, args.requests, args.concurrency)
+    after = await _fetch_server_stats(base_url)
+
+    report = {"target": args.target, "concurrency": args.concurrency, **result}
+    if before is not None and after is not None:
+        server_requests = after["requests"] - before["requests"]
+        report["server_requests"] = server_requests
+        report["retries"] = server_requests - args.requests
+        report["server_rate_limited"] = after["rate_limited"] - before["rate_limited"]
+        report["server_injected_errors"] = {
+            status: count - before["injected_errors"].get(status, 0)
+            for status, count in after["injected_errors"].items()
+        }
+    if not args.target.startswith("lpmm-"):
+        report["scheduler"] = utils_model.scheduler_pool.get_stats()
+
+    await usage_recorder.close()
+    await session_pool.close()
+    if runner is not None:
+        await runner.cleanup()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 请求压测工具")
+    parser.add_argument("--target", choices=TARGETS, default="chat", help="压测的调用方式")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发数")
+    parser.add_argument("--model", default="mock-model", help="请求中使用的模型名")
+    parser.add_argument(
+        "--base-url", help="已运行的服务地址(如 http://127.0.0.1:8765/v1)，不指定则在进程内启动模拟服务"
+    )
+    parser.add_argument("--base-wait", type=float, default=0.2, help="LLMRequest 重试的基础等待时间(秒)")
+    parser.add_argument("--verbose", action="store_true", help="输出 LLMRequest 的日志")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.disable("src")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""本地模拟的 OpenAI 兼容接口服务，用于基准测试和压测
+
+支持 /v1/chat/completions(含 stream 流式输出和工具调用)和 /v1/embeddings(含 base64 编码)，响应内容由请求确定：
+- 回复内容：hash(默认，按 prompt 生成固定的短回复)、echo(原样返回 prompt)，或用 --canned 指定的回复列表中按 prompt 选一条
+- 请求带有 tools 时(且 tool_choice 不为 none)返回对第一个工具的调用
+- 延迟：固定(fixed)、均匀分布(uniform，0 到 2 倍均值)、指数分布(exponential)或对数正态分布(lognormal)，
+  均值由 --latency 指定；流式输出时每段之间还可以加 --token-latency 的延迟
+- 错误注入：--error 状态码:概率，如 --error 429:0.05 --error 500:0.01，可注入 429/413/500/503 等
+- 每秒请求数上限：超出时像真实服务商一样返回 429 和 Retry-After
+指定 --seed 后延迟和错误注入的随机序列固定，便于重复测试。
+服务会统计收到的请求数、被限流的请求数、注入的错误数和建立的 TCP 连接数，可通过 GET /stats 查看。
+
+既可以在其他脚本中通过 start_mock_server 在进程内启动，也可以单独运行：
+用法: python scripts/mock_openai_server.py [--host 127.0.0.1] [--port 8765] [--latency 0.05] [--rps 20]
+然后在 .env 中设置 XXX_BASE_URL=http://127.0.0.1:8765/v1
+"""
+
+import argparse
+import array
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16)
+
+
+def _prompt_of(body: dict) -> str:
+    messages = body.get("messages") or []
+    if not messages:
+        return ""
+    content = messages[-1].get("content", "")
+    if isinstance(content, list):  # 图片请求的 content 是分段列表
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    prompt_tokens = max(1, len(prompt) // 2)
+    completion_tokens = max(1, len(completion) // 2)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _new_stats() -> dict:
+    return {"requests": 0, "rate_limited": 0, "injected_errors": {}, "connections": set()}
+
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+_ERROR_MESSAGES = {
+    413: "Request Entity Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+def parse_errors(specs: List[str]) -> Dict[int, float]:
+    """解析 "状态码:概率" 形式的错误注入配置"""
+    errors = {}
+    for spec in specs or []:
+        status, _, probability = spec.partition(":")
+        errors[int(status)] = float(probability)
+    if sum(errors.values()) > 1:
+        raise ValueError("错误注入的概率之和不能超过 1")
+    return errors
+
+
+def load_canned(path: str) -> List[str]:
+    """读取预设回复，每行一条，忽略空行"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def create_app(
+    latency: float = 0.0,
+    embedding_dim: int = 1024,
+    rps: int = 0,
+    latency_dist: str = "fixed",
+    latency_sigma: float = 0.5,
+    token_latency: float = 0.0,
+    errors: Optional[Dict[int, float]] = None,
+    reply_mode: str = "hash",
+    canned: Optional[List[str]] = None,
+    seed: Optional[int] = None,
+) -> web.Application:
+    """
+    Args:
+        latency: 每个请求的平均延迟(秒)
+        rps: 每秒允许的请求数(按整秒窗口计)，0 为不限制
+        latency_dist: 延迟分布，见 LATENCY_DISTRIBUTIONS
+        latency_sigma: 对数正态分布的 sigma
+        token_latency: 流式输出每段之间的延迟(秒)
+        errors: {状态码: 概率}，按概率返回对应的错误
+        reply_mode: hash 或 echo，设置了 canned 时忽略
+        canned: 预设回复列表，按 prompt 的哈希选择
+        seed: 延迟和错误注入的随机种子
+    """
+    if latency_dist not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"未知的延迟分布: {latency_dist}")
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["latency"] = latency
+    app["latency_dist"] = latency_dist
+    app["latency_sigma"] = latency_sigma
+    app["token_latency"] = token_latency
+    app["errors"] = errors or {}
+    app["reply_mode"] = reply_mode
+    app["canned"] = canned or []
+    app["random"] = random.Random(seed)
+    app["embedding_dim"] = embedding_dim
+    app["rps"] = rps
+    app["window"] = [0, 0]  # 当前秒, 当前秒内已接受的请求数
+    app["stats"] = _new_stats()
+
+    def sample_latency() -> float:
+        mean = app["latency"]
+        if mean <= 0:
+            return 0.0
+        rng = app["random"]
+        dist = app["latency_dist"]
+        if dist == "uniform":
+            return rng.uniform(0, 2 * mean)
+        if dist == "exponential":
+            return rng.expovariate(1 / mean)
+        if dist == "lognormal":
+            sigma = app["latency_sigma"]
+            return rng.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+        return mean
+
+    def injected_error() -> Optional[web.Response]:
+        """按配置的概率返回一个错误响应"""
+        if not app["errors"]:
+            return None
+        roll = app["random"].random()
+        for status, probability in app["errors"].items():
+            if roll < probability:
+                counts = app["stats"]["injected_errors"]
+                counts[status] = counts.get(status, 0) + 1
+                message = _ERROR_MESSAGES.get(status, "Injected Error")
+                headers = {"Retry-After": "1"} if status == 429 else None
+                return web.json_response(
+                    {"error": {"code": status, "message": message, "status": "injected"}},
+                    status=status,
+                    headers=headers,
+                )
+            roll -= probability
+        return None
+
+    def completion_of(prompt: str) -> str:
+        if app["canned"]:
+            return app["canned"][_digest(prompt) % len(app["canned"])]
+        if app["reply_mode"] == "echo":
+            return prompt
+        return f"模拟回复-{_digest(prompt) % 1000000}"
+
+    def record(request: web.Request) -> bool:
+        """记录请求，超过速率限制时返回 False"""
+        stats = request.app["stats"]
+        stats["requests"] += 1
+        stats["connections"].add(id(request.transport))
+        if request.app["rps"] <= 0:
+            return True
+        window = request.app["window"]
+        second = int(time.monotonic())
+        if window[0] != second:
+            window[0], window[1] = second, 0
+        if window[1] >= request.app["rps"]:
+            stats["rate_limited"] += 1
+            return False
+        window[1] += 1
+        return True
+
+    def rate_limited_response() -> web.Response:
+        return web.json_response(
+            {"error": {"code": 429, "message": "Too Many Requests", "status": "rate_limited"}},
+            status=429,
+            headers={"Retry-After": "1"},
+        )
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        if not record(request):
+            return rate_limited_response()
+        body = await request.json()
+        delay = sample_latency()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        error = injected_error()
+        if error is not None:
+            return error
+
+        prompt = _prompt_of(body)
+        model = body.get("model", "mock-model")
+        created = int(time.time())
+        tool_calls = None
+        if body.get("tools") and body.get("tool_choice") != "none":
+            # 调用第一个工具，参数为空
+            tool = body["tools"][0].get("function", {})
+            tool_calls = [
+                {
+                    "id": f"call_{_digest(prompt) % 1000000}",
+                    "type": "function",
+                    "function": {"name": tool.get("name", ""), "arguments": "{}"},
+                }
+            ]
+            completion = ""
+        else:
+            completion = completion_of(prompt)
+        finish_reason = "tool_calls" if tool_calls else "stop"
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": completion}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return web.json_response(
+                {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                    "usage": _usage(prompt, completion),
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        if tool_calls:
+            deltas = [{"tool_calls": [{"index": 0, **call} for call in tool_calls]}]
+        else:
+            deltas = [{"content": completion[i : i + 4]} for i in range(0, len(completion), 4)] or [{"content": ""}]
+        for i, delta in enumerate(deltas):
+            if i > 0 and app["token_latency"] > 0:
+                await asyncio.sleep(app["token_latency"])
+            last = i == len(deltas) - 1
+            data = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason if last else None}],
+            }
+            if last:
+                data["usage"] = _usage(prompt, completion)
+            await response.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(request: web.Request) -> web.Response:
+        if not record(request):
+            return rate_limited_response()
+        body = await request.json()
+        delay = sample_latency()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        error = injected_error()
+        if error is not None:
+            return error
+
+        inputs = body.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = request.app["embedding_dim"]
+        data = []
+        for index, text in enumerate(inputs):
+            rng = random.Random(_digest(text))
+            embedding = [rng.uniform(-1, 1) for _ in range(dim)]
+            if body.get("encoding_format") == "base64":
+                # 与 OpenAI 相同，base64 编码的 float32 小端序数组
+                embedding = base64.b64encode(array.array("f", embedding).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        prompt_tokens = sum(max(1, len(text) // 2) for text in inputs)
+        return web.json_response(
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "mock-embedding"),
+                "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+            }
+        )
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(_snapshot(request.app["stats"]))
+
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/embeddings", embeddings)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+async def start_mock_server(host: str = "127.0.0.1", port: int = 0, **kwargs) -> tuple[web.AppRunner, str]:
+    """在当前事件循环中启动模拟服务
+
+    Returns:
+        (runner, base_url)，base_url 形如 http://127.0.0.1:端口/v1，结束时调用 runner.cleanup()
+    """
+    runner = web.AppRunner(create_app(**kwargs), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}/v1"
+
+
+def _snapshot(stats: dict) -> dict:
+    return {
+        "requests": stats["requests"],
+        "rate_limited": stats["rate_limited"],
+        "injected_errors": dict(stats["injected_errors"]),
+        "connections": len(stats["connections"]),
+    }
+
+
+def reset_stats(runner: web.AppRunner):
+    runner.app["stats"] = _new_stats()
+
+
+def get_stats(runner: web.AppRunner) -> dict:
+    return _snapshot(runner.app["stats"])
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """添加模拟服务的行为参数，压测脚本也使用这些参数"""
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的平均延迟(秒)")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed", help="延迟分布")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="对数正态分布的 sigma")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="流式输出每段之间的延迟(秒)")
+    parser.add_argument("--rps", type=int, default=0, help="每秒允许的请求数，超出返回 429，0 为不限制")
+    parser.add_argument(
+        "--error", action="append", default=[], metavar="STATUS:PROB", help="按概率返回错误，如 429:0.05，可重复"
+    )
+    parser.add_argument("--reply-mode", choices=("hash", "echo"), default="hash", help="回复内容的生成方式")
+    parser.add_argument("--canned", help="预设回复文件，每行一条，按 prompt 选择")
+    parser.add_argument("--seed", type=int, help="延迟和错误注入的随机种子")
+
+
+def server_options(args: argparse.Namespace) -> dict:
+    """将 add_server_arguments 添加的参数转换为 create_app 的参数"""
+    return {
+        "latency": args.latency,
+        "latency_dist": args.latency_dist,
+        "latency_sigma": args.latency_sigma,
+        "token_latency": args.token_latency,
+        "rps": args.rps,
+        "errors": parse_errors(args.error),
+        "reply_mode": args.reply_mode,
+        "canned": load_canned(args.canned) if args.canned else None,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容接口服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embedding-dim", type=int, default=1024, help="嵌入向量维度")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    print(f"模拟服务地址: http://{args.host}:{args.port}/v1")
+    web.run_app(
+        create_app(embedding_dim=args.embedding_dim, **server_options(args)),
+        host=args.host,
+        port=args.port,
+        access_log=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
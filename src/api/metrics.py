@@ -0,0 +1,149 @@
+"""以 Prometheus 文本格式输出运行指标
+
+GET /metrics 返回 LLM 请求的延迟、token、费用直方图和重试、错误计数(见 llm_metrics)，
+以及模型路由器、服务商调度器、用量记录缓冲区、embedding 缓存和图片执行器的当前状态。
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..common.embedding_cache import get_all_cache_stats
+from ..common.image_executor import image_executor
+from ..plugins.models.llm_metrics import llm_metrics
+from ..plugins.models.provider_scheduler import scheduler_pool
+from ..plugins.models.usage_recorder import usage_recorder
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # 在事件循环中执行，scheduler_pool 只返回当前事件循环中的调度器
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    snapshot = llm_metrics.snapshot()
+    llm_labels = ("model", "request_type")
+    _histograms(lines, "maibot_llm_request_duration_seconds", "LLM请求耗时(包括重试)", llm_labels, snapshot["latency"])
+    _histograms(lines, "maibot_llm_request_tokens", "单次LLM请求的token数", llm_labels, snapshot["tokens"])
+    _histograms(lines, "maibot_llm_request_cost", "单次LLM请求的费用(元)", llm_labels, snapshot["cost"])
+    _counters(
+        lines, "maibot_llm_requests_total", "LLM请求数", ("model", "request_type", "status"), snapshot["requests"]
+    )
+    _counters(
+        lines, "maibot_llm_tokens_total", "LLM token用量", ("model", "request_type", "kind"), snapshot["token_totals"]
+    )
+    _counters(
+        lines,
+        "maibot_llm_errors_total",
+        "LLM请求失败的尝试次数",
+        ("model", "request_type", "error"),
+        snapshot["errors"],
+    )
+    _counters(lines, "maibot_llm_retries_total", "LLM请求重试次数", llm_labels, snapshot["retries"])
+
+    # 每个 LLMRequest 实例有各自的路由器，补发次数已在 llm_metrics 中按 (模型, request_type) 累计；
+    # 端点统计按 (base_url, 模型) 共享，同一组标签只输出一次
+    model_routers = llm_metrics.routers()
+    router_keys = {(model_router.endpoints[0].model_name, model_router.request_type) for model_router in model_routers}
+    router_rows = [
+        (
+            {"request_type": request_type, "model": model},
+            {
+                "hedged_total": snapshot["hedged"].get((model, request_type), 0),
+                "hedge_wins_total": snapshot["hedge_wins"].get((model, request_type), 0),
+            },
+        )
+        for model, request_type in sorted(router_keys | snapshot["hedged"].keys() | snapshot["hedge_wins"].keys())
+    ]
+    endpoint_stats: Dict[tuple, dict] = {}
+    for model_router in model_routers:
+        for stats in model_router.get_stats():
+            key = (model_router.request_type, stats["model"], stats["provider"])
+            if key not in endpoint_stats:
+                endpoint_stats[key] = {
+                    "p50_seconds": stats["p50"],
+                    "p95_seconds": stats["p95"],
+                    "error_rate": stats["error_rate"],
+                    "healthy": stats["healthy"],
+                }
+    endpoint_rows = [
+        ({"request_type": request_type, "model": model, "provider": provider}, stats)
+        for (request_type, model, provider), stats in sorted(endpoint_stats.items())
+    ]
+    _stats(lines, "maibot_llm_router", router_rows)
+    _stats(lines, "maibot_llm_endpoint", endpoint_rows)
+    _stats(
+        lines,
+        "maibot_llm_scheduler",
+        [({"provider": name}, stats) for name, stats in scheduler_pool.get_stats().items()],
+    )
+    _stats(lines, "maibot_llm_usage", [({}, usage_recorder.get_metrics())])
+    _stats(
+        lines,
+        "maibot_embedding_cache",
+        [({"cache_dir": cache_dir}, stats) for cache_dir, stats in get_all_cache_stats().items()],
+    )
+    _stats(lines, "maibot_image_executor", [({}, image_executor.get_stats())])
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+def _histograms(lines: List[str], name: str, help_text: str, label_names: Tuple[str, ...], histograms: dict):
+    if not histograms:
+        return
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in sorted(histograms.items()):
+        labels = dict(zip(label_names, key, strict=True))
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(histogram.sum))}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+
+def _counters(lines: List[str], name: str, help_text: str, label_names: Tuple[str, ...], counters: dict):
+    if not counters:
+        return
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for key, value in sorted(counters.items()):
+        lines.append(f"{name}{_format_labels(dict(zip(label_names, key, strict=True)))} {value}")
+
+
+def _stats(lines: List[str], prefix: str, rows: Iterable[Tuple[Dict[str, object], dict]]):
+    """将 get_stats() 形式的字典输出为指标，以 _total 结尾的字段为计数器，其余为仪表盘，值为 None 的字段跳过
+
+    只增不减的统计字段必须以 _total 结尾，否则会被当作仪表盘输出，rate()/increase() 无法正确处理重启后的归零。
+    """
+    samples: Dict[str, List[str]] = {}
+    for labels, stats in rows:
+        for field, value in stats.items():
+            if value is None or not isinstance(value, (int, float)):
+                continue
+            samples.setdefault(field, []).append(f"{prefix}_{field}{_format_labels(labels)} {_format_value(value)}")
+    for field, field_lines in samples.items():
+        metric_type = "counter" if field.endswith("_total") else "gauge"
+        lines.append(f"# TYPE {prefix}_{field} {metric_type}")
+        lines.extend(field_lines)
@@ -0,0 +1,337 @@
+"""按内容寻址的 embedding 缓存
+
+键为 (模型名, 文本的 sha256)，分两级：
+- 内存 LRU：保存最近使用的向量(float32)
+- 磁盘：每个模型一个追加写入的记录文件，记录为 32 字节摘要 + float32 向量，可直接 np.memmap 读取。
+  超过条数上限时按最近使用时间压缩，只保留较新的一部分
+
+同一目录在进程内只应有一个实例，请通过 get_embedding_cache 获取。磁盘写入由每个实例的后台线程完成，
+进程退出时等待写完。磁盘文件按单进程写入设计，多个进程同时写同一目录时新写入的记录互相不可见
+(每批记录一次 write 写入，不会互相截断)。
+"""
+
+import atexit
+import hashlib
+import os
+import queue
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.common.logger import get_module_logger
+
+logger = get_module_logger("embedding_cache")
+
+_HEADER = struct.Struct("<4sHHI4x")  # 魔数, 格式版本, 保留, 向量维度
+_MAGIC = b"MMEC"
+_FORMAT_VERSION = 1
+_DIGEST_SIZE = 32
+_COMPACT_CHUNK = 1024  # 压缩时每次复制的记录数
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class _DiskTier:
+    """单个模型的磁盘缓存文件
+
+    只有后台写入线程调用 append / compact，查询(get)可以在任意线程并发进行。
+    _lock 只保护内存中的索引，文件读写和压缩时的数据复制都在锁外进行。
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.dim: Optional[int] = None
+        self.rows: Dict[bytes, int] = {}
+        self.last_used: List[int] = []  # 每行最近一次使用的序号，只在内存中维护，用于压缩时淘汰
+        self._records: Optional[np.memmap] = None
+        self._clock = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _dtype(self, dim: int) -> np.dtype:
+        # 摘要用 uint8 数组保存，"S32" 类型读取时会去掉末尾的 0 字节
+        return np.dtype([("key", "u1", (_DIGEST_SIZE,)), ("vec", "<f4", (dim,))])
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                magic, version, _, dim = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or version != _FORMAT_VERSION or dim <= 0:
+                raise ValueError("文件格式不匹配")
+        except (OSError, struct.error, ValueError) as e:
+            logger.warning(f"embedding缓存文件 {self.path} 无法读取，将重新建立: {e}")
+            os.remove(self.path)
+            return
+
+        self.dim = dim
+        record_size = self._dtype(dim).itemsize
+        size = os.path.getsize(self.path)
+        count = (size - _HEADER.size) // record_size
+        if _HEADER.size + count * record_size != size:
+            # 上次写入被中断，截掉不完整的记录
+            with open(self.path, "r+b") as f:
+                f.truncate(_HEADER.size + count * record_size)
+        if count:
+            keys = self._map()["key"]
+            # 同一摘要出现多次时以最后一条为准
+            self.rows = {key.tobytes(): row for row, key in enumerate(keys)}
+        self.last_used = list(range(count))
+        self._clock = count
+
+    def _map(self) -> np.memmap:
+        if self._records is None or len(self._records) < len(self.last_used):
+            self._records = np.memmap(self.path, dtype=self._dtype(self.dim), mode="r", offset=_HEADER.size)
+        return self._records
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self.rows.get(digest)
+            if row is None:
+                return None
+            self._clock += 1
+            self.last_used[row] = self._clock
+            return np.array(self._map()[row]["vec"], dtype=np.float32)
+
+    def append(self, digests: List[bytes], vectors: List[np.ndarray]) -> int:
+        """追加一批记录(已存在或维度不符的跳过)，返回因压缩淘汰的条数"""
+        if self.dim is None:
+            self.dim = len(vectors[0])
+            with open(self.path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, 0, self.dim))
+
+        new_rows = {}
+        for digest, vector in zip(digests, vectors, strict=True):
+            if len(vector) != self.dim:
+                logger.warning(f"embedding维度变化({self.dim} -> {len(vector)})，不写入磁盘缓存")
+            elif digest not in self.rows and digest not in new_rows:
+                new_rows[digest] = vector
+        if not new_rows:
+            return 0
+
+        records = np.zeros(len(new_rows), dtype=self._dtype(self.dim))
+        records["key"] = np.frombuffer(b"".join(new_rows), dtype=np.uint8).reshape(-1, _DIGEST_SIZE)
+        records["vec"] = np.stack(list(new_rows.values()))
+        with open(self.path, "ab") as f:
+            f.write(records.tobytes())
+        with self._lock:
+            for digest in new_rows:
+                self.rows[digest] = len(self.last_used)
+                self._clock += 1
+                self.last_used.append(self._clock)
+
+        if len(self.last_used) > self.max_entries:
+            return self._compact()
+        return 0
+
+    def _compact(self) -> int:
+        """只保留最近使用的 80% 条目，重写文件
+
+        复制和写入临时文件时不持有锁，期间的查询继续读取旧文件；只在替换文件时短暂持有锁。
+        """
+        keep_count = int(self.max_entries * 0.8)
+        with self._lock:
+            live_rows = sorted(self.rows.values(), key=lambda row: self.last_used[row], reverse=True)[:keep_count]
+            records = self._map()
+        live_rows.sort()
+        evicted = len(self.rows) - len(live_rows)
+
+        # 分块复制，避免长时间占用 GIL 和一次复制整个文件的内存
+        tmp_path = self.path + ".tmp"
+        keys = []
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, 0, self.dim))
+            for begin in range(0, len(live_rows), _COMPACT_CHUNK):
+                chunk = records[live_rows[begin : begin + _COMPACT_CHUNK]]
+                f.write(chunk.tobytes())
+                keys.extend(key.tobytes() for key in chunk["key"])
+        del records
+        rows = {key: row for row, key in enumerate(keys)}
+        with self._lock:
+            self._records = None  # Windows 下需要先释放映射才能替换文件
+            os.replace(tmp_path, self.path)
+            self.last_used = [self.last_used[row] for row in live_rows]
+            self.rows = rows
+        return evicted
+
+
+class EmbeddingCache:
+    """两级 embedding 缓存，线程安全
+
+    内存缓存在调用线程中同步读写；磁盘写入(追加和压缩)交给后台线程，put 不会等待磁盘，
+    因此可以直接在事件循环中调用。尚未写入磁盘的向量仍在内存缓存中可以命中。
+    """
+
+    def __init__(self, cache_dir: str, memory_size: int = 2048, disk_size: int = 100000):
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory: OrderedDict = OrderedDict()
+        self._disk: Dict[str, _DiskTier] = {}
+        self._lock = threading.Lock()
+        self._pending: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """查询缓存，未命中返回 None"""
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        results = []
+        for text in texts:
+            vector = self._lookup(model, _digest(text))
+            results.append(vector.tolist() if vector is not None else None)
+        return results
+
+    def put(self, model: str, text: str, embedding: Sequence[float]):
+        """写入缓存，空向量会被忽略；磁盘写入在后台线程中进行"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.ndim != 1 or len(vector) == 0:
+            return
+        digest = _digest(text)
+        with self._lock:
+            self.writes += 1
+            self._remember(model, digest, vector)
+            if self.disk_size > 0:
+                self._pending.put((model, digest, vector))
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True)
+                    self._writer.start()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前提交的磁盘写入完成，超时返回 False"""
+        with self._lock:
+            if self._writer is None:
+                return True
+            done = threading.Event()
+            self._pending.put(done)
+        return done.wait(timeout)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": sum(len(tier) for tier in self._disk.values()),
+                "memory_hits_total": self.memory_hits,
+                "disk_hits_total": self.disk_hits,
+                "misses_total": self.misses,
+                "writes_total": self.writes,
+                "memory_evictions_total": self.memory_evictions,
+                "disk_evictions_total": self.disk_evictions,
+            }
+
+    def _lookup(self, model: str, digest: bytes) -> Optional[np.ndarray]:
+        key = (model, digest)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            tier = self._disk_tier(model) if self.disk_size > 0 else None
+        # 磁盘读取不持有缓存锁
+        vector = tier.get(digest) if tier is not None else None
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(model, digest, vector)
+        return vector
+
+    def _remember(self, model: str, digest: bytes, vector: np.ndarray):
+        if self.memory_size <= 0:
+            return
+        key = (model, digest)
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def _disk_tier(self, model: str) -> _DiskTier:
+        tier = self._disk.get(model)
+        if tier is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            file_name = hashlib.sha256(model.encode("utf-8")).hexdigest()[:16] + ".emb"
+            tier = _DiskTier(os.path.join(self.cache_dir, file_name), self.disk_size)
+            self._disk[model] = tier
+        return tier
+
+    def _write_loop(self):
+        """后台写入线程：每次取出队列中已有的全部记录，按模型分批追加"""
+        while True:
+            batch = [self._pending.get()]
+            while not self._pending.empty():
+                batch.append(self._pending.get())
+            by_model: Dict[str, tuple] = {}
+            flushed = []
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    flushed.append(item)
+                    continue
+                model, digest, vector = item
+                digests, vectors = by_model.setdefault(model, ([], []))
+                digests.append(digest)
+                vectors.append(vector)
+            for model, (digests, vectors) in by_model.items():
+                with self._lock:
+                    tier = self._disk_tier(model)
+                try:
+                    evicted = tier.append(digests, vectors)
+                except OSError as e:
+                    logger.warning(f"写入embedding磁盘缓存失败: {e}")
+                    continue
+                if evicted:
+                    with self._lock:
+                        self.disk_evictions += evicted
+            for done in flushed:
+                done.set()
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(cache_dir: str, memory_size: int = 2048, disk_size: int = 100000) -> EmbeddingCache:
+    """获取目录对应的缓存实例，同一目录共用一个实例(首次获取时的大小设置生效)"""
+    key = os.path.abspath(cache_dir)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(cache_dir, memory_size, disk_size)
+            _caches[key] = cache
+        return cache
+
+
+def get_all_cache_stats() -> Dict[str, dict]:
+    """所有缓存实例的统计，以缓存目录为键"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {cache_dir: cache.get_stats() for cache_dir, cache in caches.items()}
+
+
+@atexit.register
+def flush_all_caches(timeout: float = 10.0):
+    """等待所有缓存实例的磁盘写入完成，进程退出时自动调用"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.flush(timeout)
@@ -0,0 +1,120 @@
+"""图片处理的后台执行器
+
+图片的解码、缩放和重新编码(PIL / NumPy)是 CPU 密集的同步操作，直接在协程中执行会阻塞所有聊天。
+这里用一个有界线程池统一执行这些操作，并按 (操作, 图片内容的哈希, 参数) 缓存结果，
+同一张图片重复出现或请求重试时直接返回上次的结果；同一张图片正在处理时，后来的调用等待同一个结果。
+
+PIL 和 NumPy 的解码、缩放和编码在 C 层会释放 GIL，线程池就能与事件循环并行。没有使用进程池：
+子进程需要重新导入 src 下的模块(导入时会连接数据库)，而且每次都要在进程间复制数 MB 的图片数据。
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+def _digest(image_base64: str) -> str:
+    return hashlib.md5(image_base64.encode("ascii", errors="replace")).hexdigest()
+
+
+def _result_size(result: Any) -> int:
+    return len(result) if isinstance(result, (str, bytes)) else 0
+
+
+class ImageExecutor:
+    """有界线程池 + 按图片哈希的结果缓存，线程安全"""
+
+    INLINE_HASH_LIMIT = 256 * 1024  # 超过该长度的base64在线程中计算哈希
+
+    def __init__(self, max_workers: int = 2, cache_bytes: int = 64 * 1024 * 1024):
+        self.max_workers = max_workers
+        self.cache_bytes = cache_bytes
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image")
+        self._cache: OrderedDict = OrderedDict()
+        self._cached_bytes = 0
+        self._inflight: Dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.tasks_total = 0
+        self.task_seconds_total = 0.0
+
+    async def run(self, func: Callable, image_base64: str, *args, cache: bool = True) -> Any:
+        """在线程池中执行 func(image_base64, *args)
+
+        cache 为 True 时按 (func, 图片哈希, args) 缓存结果，func 必须只依赖这些参数；
+        结果为 None 也会缓存(如无法处理的图片)，抛出的异常不缓存。
+        """
+        if not cache:
+            return await asyncio.wrap_future(self._submit(func, image_base64, *args))
+
+        if len(image_base64) > self.INLINE_HASH_LIMIT:
+            # 大图片的哈希也会阻塞事件循环，hashlib 计算时会释放 GIL
+            digest = await asyncio.to_thread(_digest, image_base64)
+        else:
+            digest = _digest(image_base64)
+        key = (func.__qualname__, digest, args)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            self.cache_misses += 1
+            future = self._inflight.get(key)
+            submitted = future is None
+            if submitted:
+                future = self._submit(func, image_base64, *args)
+                self._inflight[key] = future
+        if submitted:
+            # 任务已完成时回调会立即在当前线程执行，因此在锁外注册
+            future.add_done_callback(lambda done: self._on_done(key, done))
+        # 调用方被取消时不取消共享的任务，其他等待者仍需要结果
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "inflight": len(self._inflight),
+                "cache_entries": len(self._cache),
+                "cache_bytes": self._cached_bytes,
+                "cache_hits_total": self.cache_hits,
+                "cache_misses_total": self.cache_misses,
+                "tasks_total": self.tasks_total,
+                "task_seconds_total": round(self.task_seconds_total, 3),
+            }
+
+    def _submit(self, func: Callable, *args) -> concurrent.futures.Future:
+        return self._pool.submit(self._timed, func, *args)
+
+    def _timed(self, func: Callable, *args) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.tasks_total += 1
+                self.task_seconds_total += time.perf_counter() - start
+
+    def _on_done(self, key: tuple, future: concurrent.futures.Future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            result = future.result()
+            size = _result_size(result)
+            if size > self.cache_bytes:
+                return
+            self._cache[key] = result
+            self._cached_bytes += size
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= _result_size(evicted)
+
+
+image_executor = ImageExecutor()
@@ -1,3 +1,7 @@
+from collections import defaultdict
+
+from pymongo import UpdateMany
+
 from src.common.database import db
 from src.common.logger import get_module_logger
 import traceback
@@ -72,4 +76,32 @@ def count_messages(filter: Dict[str, Any]) -> int:
         return 0
 
 
+def increment_memorized_times(increments: Dict[Any, int]) -> int:
+    """
+    批量增加消息的记忆次数。相同增量的消息合并为一个 UpdateMany，所有更新在一次 bulk_write 中完成。
+
+    Args:
+        increments: {消息 _id: 增加的次数}
+
+    Returns:
+        被修改的消息数量，如果出错则返回 0。
+    """
+    if not increments:
+        return 0
+    try:
+        ids_by_increment = defaultdict(list)
+        for message_id, increment in increments.items():
+            ids_by_increment[increment].append(message_id)
+        operations = [
+            UpdateMany({"_id": {"$in": message_ids}}, {"$inc": {"memorized_times": increment}})
+            for increment, message_ids in ids_by_increment.items()
+        ]
+        result = db.messages.bulk_write(operations, ordered=False)
+        return result.modified_count
+    except Exception as e:
+        log_message = f"批量更新记忆次数失败 (数量={len(increments)}): {e}\n" + traceback.format_exc()
+        logger.error(log_message)
+        return 0
+
+
 # 你可以在这里添加更多与 messages 集合相关的数据库操作函数，例如 find_one_message, insert_message 等。
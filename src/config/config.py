@@ -226,6 +226,7 @@ class BotConfig:
     build_memory_sample_num: int = 10  # 记忆构建采样数量
     build_memory_sample_length: int = 20  # 记忆构建采样长度
     memory_compress_rate: float = 0.1  # 记忆压缩率
+    build_memory_concurrency: int = 4  # 记忆构建时同时压缩的样本数量上限
 
     forget_memory_interval: int = 600  # 记忆遗忘间隔（秒）
     memory_forget_time: int = 24  # 记忆遗忘时间（小时）
@@ -234,6 +235,9 @@ class BotConfig:
     consolidate_memory_interval: int = 1000  # 记忆整合间隔（秒）
     consolidation_similarity_threshold: float = 0.7  # 相似度阈值
     consolidate_memory_percentage: float = 0.01  # 检查节点比例
+    consolidate_memory_mode: str = "sample"  # 整合范围: "sample" 按比例抽查节点, "all" 检查全部节点
+
+    memory_keyword_mode: str = "llm"  # 检索记忆的关键词来源: "llm" 由LLM提取, "match" 匹配文本中出现的节点名
 
     memory_ban_words: list = field(
         default_factory=lambda: ["表情包", "图片", "回复", "聊天记录"]
@@ -259,6 +263,7 @@ class BotConfig:
     enable_response_splitter = True  # 是否启用回复分割器
     response_max_length = 100  # 回复允许的最大长度
     response_max_sentence_num = 3  # 回复允许的最大句子数
+    stream_reply = False  # 是否流式生成回复，每分出一句就先发送一句
 
     model_max_output_length: int = 800  # 最大回复长度
 
@@ -270,6 +275,24 @@ class BotConfig:
     # enable_think_flow: bool = False  # 是否启用思考流程
     enable_pfc_chatting: bool = False  # 是否启用PFC聊天
 
+    # llm_request
+    llm_connection_limit: int = 100  # 所有服务商合计的连接数上限(共用一个连接池)
+    llm_connection_limit_per_host: int = 16  # 每个服务商的连接数上限，由服务商调度器的并发数保证
+    llm_keepalive_timeout: float = 30  # 空闲连接保持时间（秒）
+    llm_provider_connection_limits: Dict[str, int] = field(default_factory=lambda: {})  # 按服务商单独设置的连接数上限
+    llm_usage_flush_size: int = 50  # token使用记录缓冲达到该条数时批量写入数据库
+    llm_usage_flush_interval: float = 5  # token使用记录最长缓冲时间（秒）
+    embedding_batch_size: int = 32  # 批量获取embedding时每个请求最多包含的文本条数
+    embedding_batch_max_chars: int = 16000  # 批量获取embedding时每个请求的文本总字符数上限
+    embedding_cache_memory_size: int = 2048  # embedding内存缓存条数，0 为不使用
+    embedding_cache_disk_size: int = 100000  # embedding磁盘缓存条数，0 为不使用
+    # 按服务商设置的速率限制，可包含 rpm、tpm、concurrency
+    llm_provider_rate_limits: Dict[str, Dict[str, int]] = field(default_factory=lambda: {})
+    llm_latency_backoff_factor: float = 3.0  # 短期平均延迟超过长期平均的倍数时降低并发，0 为不按延迟调整
+    # 配置了 alternatives 时，这些请求类型在主请求变慢时向另一个模型补发请求
+    llm_hedge_request_types: List[str] = field(default_factory=lambda: ["action_planning", "response_heartflow"])
+    llm_hedge_percentile: float = 95  # 主请求超过该模型延迟的这一百分位仍未返回时补发请求
+
     # 模型配置
     llm_reasoning: Dict[str, str] = field(default_factory=lambda: {})
     # llm_reasoning_minor: Dict[str, str] = field(default_factory=lambda: {})
@@ -463,6 +486,23 @@ class BotConfig:
                 "consecutive_no_reply_threshold", config.consecutive_no_reply_threshold
             )
 
+        def model_alternative(item: str, alternative: dict) -> dict:
+            for key in ("name", "provider"):
+                if key not in alternative:
+                    logger.error(f"{item} 的 alternatives 中缺少必要字段 {key}，请检查")
+                    raise KeyError(f"{item} 的 alternatives 中缺少必要字段 {key}，请检查")
+            cfg_target = {
+                "name": alternative["name"],
+                "base_url": f"{alternative['provider']}_BASE_URL",
+                "key": f"{alternative['provider']}_KEY",
+                "stream": alternative.get("stream", False),
+                "pri_in": alternative.get("pri_in", 0),
+                "pri_out": alternative.get("pri_out", 0),
+            }
+            if "temp" in alternative:
+                cfg_target["temp"] = alternative["temp"]
+            return cfg_target
+
         def model(parent: dict):
             # 加载模型配置
             model_config: dict = parent["model"]
@@ -545,6 +585,12 @@ class BotConfig:
                         cfg_target["base_url"] = f"{provider}_BASE_URL"
                         cfg_target["key"] = f"{provider}_KEY"
 
+                        # 可替换的等价模型，请求时按延迟和错误率选择
+                        if config.INNER_VERSION in SpecifierSet(">=1.6.9") and cfg_item.get("alternatives"):
+                            cfg_target["alternatives"] = [
+                                model_alternative(item, alternative) for alternative in cfg_item["alternatives"]
+                            ]
+
                     # 如果 列表中的项目在 model_config 中，利用反射来设置对应项目
                     setattr(config, item, cfg_target)
                 else:
@@ -581,6 +627,16 @@ class BotConfig:
                 config.consolidate_memory_percentage = memory_config.get(
                     "consolidate_memory_percentage", config.consolidate_memory_percentage
                 )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.1"):
+                config.build_memory_concurrency = memory_config.get(
+                    "build_memory_concurrency", config.build_memory_concurrency
+                )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.2"):
+                config.consolidate_memory_mode = memory_config.get(
+                    "consolidate_memory_mode", config.consolidate_memory_mode
+                )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.3"):
+                config.memory_keyword_mode = memory_config.get("memory_keyword_mode", config.memory_keyword_mode)
 
         def remote(parent: dict):
             remote_config = parent["remote"]
@@ -629,6 +685,8 @@ class BotConfig:
                 config.model_max_output_length = response_splitter_config.get(
                     "model_max_output_length", config.model_max_output_length
                 )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.10"):
+                config.stream_reply = response_splitter_config.get("stream_reply", config.stream_reply)
 
         def groups(parent: dict):
             groups_config = parent["groups"]
@@ -654,6 +712,48 @@ class BotConfig:
             if config.INNER_VERSION in SpecifierSet(">=1.1.0"):
                 config.enable_pfc_chatting = experimental_config.get("pfc_chatting", config.enable_pfc_chatting)
 
+        def llm_request(parent: dict):
+            llm_request_config = parent["llm_request"]
+            config.llm_connection_limit = llm_request_config.get("connection_limit", config.llm_connection_limit)
+            config.llm_connection_limit_per_host = llm_request_config.get(
+                "connection_limit_per_host", config.llm_connection_limit_per_host
+            )
+            config.llm_keepalive_timeout = llm_request_config.get("keepalive_timeout", config.llm_keepalive_timeout)
+            config.llm_provider_connection_limits = llm_request_config.get(
+                "provider_connection_limits", config.llm_provider_connection_limits
+            )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.5"):
+                config.llm_usage_flush_size = llm_request_config.get("usage_flush_size", config.llm_usage_flush_size)
+                config.llm_usage_flush_interval = llm_request_config.get(
+                    "usage_flush_interval", config.llm_usage_flush_interval
+                )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.6"):
+                config.embedding_batch_size = llm_request_config.get(
+                    "embedding_batch_size", config.embedding_batch_size
+                )
+                config.embedding_batch_max_chars = llm_request_config.get(
+                    "embedding_batch_max_chars", config.embedding_batch_max_chars
+                )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.7"):
+                config.embedding_cache_memory_size = llm_request_config.get(
+                    "embedding_cache_memory_size", config.embedding_cache_memory_size
+                )
+                config.embedding_cache_disk_size = llm_request_config.get(
+                    "embedding_cache_disk_size", config.embedding_cache_disk_size
+                )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.8"):
+                config.llm_provider_rate_limits = llm_request_config.get(
+                    "provider_rate_limits", config.llm_provider_rate_limits
+                )
+                config.llm_latency_backoff_factor = llm_request_config.get(
+                    "latency_backoff_factor", config.llm_latency_backoff_factor
+                )
+            if config.INNER_VERSION in SpecifierSet(">=1.6.9"):
+                config.llm_hedge_request_types = llm_request_config.get(
+                    "hedge_request_types", config.llm_hedge_request_types
+                )
+                config.llm_hedge_percentile = llm_request_config.get("hedge_percentile", config.llm_hedge_percentile)
+
         # 版本表达式：>=1.0.0,<2.0.0
         # 允许字段：func: method, support: str, notice: str, necessary: bool
         # 如果使用 notice 字段，在该组配置加载时，会展示该字段对用户的警示
@@ -687,6 +787,7 @@ class BotConfig:
             "chat": {"func": chat, "support": ">=1.6.0", "necessary": False},
             "normal_chat": {"func": normal_chat, "support": ">=1.6.0", "necessary": False},
             "focus_chat": {"func": focus_chat, "support": ">=1.6.0", "necessary": False},
+            "llm_request": {"func": llm_request, "support": ">=1.6.4", "necessary": False},
         }
 
         # 原地修改，将 字符串版本表达式 转换成 版本对象
@@ -41,7 +41,7 @@ class SearchKnowledgeFromLPMMTool(BaseTool):
             # 调用知识库搜索
             embedding = await get_embedding(query, request_type="info_retrieval")
             if embedding:
-                knowledge_info = qa_manager.get_knowledge(query)
+                knowledge_info = await qa_manager.get_knowledge_async(query)
                 logger.debug(f"知识库查询结果: {knowledge_info}")
                 if knowledge_info:
                     content = f"你知道这些知识: {knowledge_info}"
@@ -17,6 +17,7 @@ from .common.logger_manager import get_logger
 from .plugins.remote import heartbeat_thread  # noqa: F401
 from .individuality.individuality import Individuality
 from .common.server import global_server
+from .api.metrics import router as metrics_router
 
 logger = get_logger("main")
 
@@ -34,6 +35,8 @@ class MainSystem:
 
         self.app = global_api
         self.server = global_server
+        # Prometheus 指标，GET /metrics
+        self.server.register_router(metrics_router)
 
     async def initialize(self):
         """初始化系统组件"""
@@ -20,6 +20,9 @@ from ...common.database import db
 
 logger = get_module_logger("chat_utils")
 
+# 被 () 或 [] 包裹且包含中文的内容，回复中会被去除
+BRACKET_CONTENT_PATTERN = re.compile(r"[\(\[\（](?=.*[\u4e00-\u9fff]).*?[\)\]\）]")
+
 
 def is_english_letter(char: str) -> bool:
     """检查字符是否为英文字母（忽略大小写）"""
@@ -108,6 +111,17 @@ async def get_embedding(text, request_type="embedding"):
     return embedding
 
 
+async def get_embeddings(texts: list, request_type="embedding") -> list:
+    """批量获取文本的embedding向量，返回与输入顺序一致的列表，失败的位置为 None"""
+    llm = LLMRequest(model=global_config.embedding, request_type=request_type)
+    try:
+        embeddings = await llm.get_embeddings(texts)
+    except Exception as e:
+        logger.error(f"批量获取embedding失败: {str(e)}")
+        embeddings = [None] * len(texts)
+    return embeddings
+
+
 async def get_recent_group_messages(chat_id: str, limit: int = 12) -> list:
     """从数据库获取群组最近的消息记录
 
@@ -370,6 +384,23 @@ def random_remove_punctuation(text: str) -> str:
     return result
 
 
+_typo_generator: Optional[ChineseTypoGenerator] = None
+
+
+def get_typo_generator() -> ChineseTypoGenerator:
+    """获取共用的错别字生成器，构建拼音字典耗时较长，只在第一次使用或配置变化时创建"""
+    global _typo_generator
+    params = {
+        "error_rate": global_config.chinese_typo_error_rate,
+        "min_freq": global_config.chinese_typo_min_freq,
+        "tone_error_rate": global_config.chinese_typo_tone_error_rate,
+        "word_replace_rate": global_config.chinese_typo_word_replace_rate,
+    }
+    if _typo_generator is None or any(getattr(_typo_generator, key) != value for key, value in params.items()):
+        _typo_generator = ChineseTypoGenerator(**params)
+    return _typo_generator
+
+
 def process_llm_response(text: str) -> List[str]:
     # 先保护颜文字
     if global_config.enable_kaomoji_protection:
@@ -379,7 +410,7 @@ def process_llm_response(text: str) -> List[str]:
         protected_text = text
         kaomoji_mapping = {}
     # 提取被 () 或 [] 包裹且包含中文的内容
-    pattern = re.compile(r"[\(\[\（](?=.*[\u4e00-\u9fff]).*?[\)\]\）]")
+    pattern = BRACKET_CONTENT_PATTERN
     # _extracted_contents = pattern.findall(text)
     _extracted_contents = pattern.findall(protected_text)  # 在保护后的文本上查找
     # 去除 () 和 [] 及其包裹的内容
@@ -399,12 +430,7 @@ def process_llm_response(text: str) -> List[str]:
             logger.warning(f"回复过长 ({len(cleaned_text)} 字符)，返回默认回复")
             return ["懒得说"]
 
-    typo_generator = ChineseTypoGenerator(
-        error_rate=global_config.chinese_typo_error_rate,
-        min_freq=global_config.chinese_typo_min_freq,
-        tone_error_rate=global_config.chinese_typo_tone_error_rate,
-        word_replace_rate=global_config.chinese_typo_word_replace_rate,
-    )
+    typo_generator = get_typo_generator()
 
     if global_config.enable_response_splitter:
         split_sentences = split_into_sentences_w_remove_punctuation(cleaned_text)
@@ -436,6 +462,177 @@ def process_llm_response(text: str) -> List[str]:
     return sentences
 
 
+class StreamingResponseSplitter:
+    """流式回复的增量分句，每凑够一句就输出一句，处理方式与 process_llm_response 相同
+
+    - 分隔符和英文单词内不分割的规则与 split_into_sentences_w_remove_punctuation 一致，换行也作为分隔符；
+      相邻两段的合并概率按已生成的文本长度估计
+    - 括号(包括带括号的颜文字)未闭合时不分句，括号内容的去除和颜文字保护只作用在完整的句子上
+    - <think> 标签内的内容不输出
+    - 已输出的句子无法撤回，超过长度或句数上限时只是停止输出后续的句子；
+      还没有输出任何句子时，与 process_llm_response 一样改为默认回复
+
+    用法: 生成过程中对每段文本调用 feed，生成结束后调用 finish，二者都返回新完成的句子列表
+    """
+
+    SEPARATORS = {"，", ",", " ", "。", ";", "\n"}
+    OPEN_BRACKETS = "([（【"
+    CLOSE_BRACKETS = ")]）】"
+    THINK_START = "<think>"
+    THINK_END = "</think>"
+
+    def __init__(self):
+        self.typo_generator = get_typo_generator()
+        self.max_length = global_config.response_max_length * 2
+        self.max_sentence_num = global_config.response_max_sentence_num
+
+        self.stopped = False  # 超过上限后不再输出
+        self._raw = ""  # 尚未去除思考内容的原始文本
+        self._buffer = ""  # 尚未分句的文本
+        self._scanned = 0  # _buffer 中已经检查过的位置
+        self._depth = 0  # 未闭合的括号层数
+        self._held = None  # 等待与下一段合并的 (内容, 分隔符)
+        self._seen_length = 0  # 已生成的文本长度，用于估计合并概率
+        self._cleaned_text = ""  # 已分出的句子去除括号内容后的文本，用于长度检查
+        self._sentence_count = 0
+
+    def feed(self, delta: str) -> List[str]:
+        """加入新生成的文本，返回新完成的句子"""
+        if self.stopped:
+            return []
+        self._raw += delta
+        return self._process_segments(self._take_visible(final=False), final=False)
+
+    def finish(self) -> List[str]:
+        """生成结束，返回剩余的句子"""
+        if self.stopped:
+            return []
+        sentences = self._process_segments(self._take_visible(final=True), final=True)
+        if self._held is not None:
+            sentences += self._emit(self._held[0])
+            self._held = None
+        if not self.stopped and self._sentence_count == 0:
+            sentences.append("呃呃")
+        self.stopped = True
+        return sentences
+
+    def _take_visible(self, final: bool) -> str:
+        """从原始文本中取出可以分句的部分，去掉 <think> 标签内的内容"""
+        visible = []
+        raw = self._raw
+        while True:
+            start = raw.find(self.THINK_START)
+            if start < 0:
+                # 末尾可能是尚未生成完的 "<think>"
+                keep = 0
+                if not final:
+                    for n in range(min(len(self.THINK_START) - 1, len(raw)), 0, -1):
+                        if self.THINK_START.startswith(raw[-n:]):
+                            keep = n
+                            break
+                visible.append(raw[: len(raw) - keep])
+                raw = raw[len(raw) - keep :]
+                break
+            visible.append(raw[:start])
+            end = raw.find(self.THINK_END, start)
+            if end < 0:
+                raw = "" if final else raw[start:]
+                break
+            raw = raw[end + len(self.THINK_END) :]
+        self._raw = raw
+        return "".join(visible)
+
+    def _process_segments(self, text: str, final: bool) -> List[str]:
+        self._seen_length += len(text)
+        self._buffer += text
+        sentences = []
+        for content, separator in self._split(final):
+            if self.stopped:
+                break
+            sentences += self._merge(content, separator)
+        return sentences
+
+    def _split(self, final: bool) -> List[tuple]:
+        """从缓冲区切出完整的段落 (内容, 分隔符)，未结束时保留最后一段"""
+        segments = []
+        buffer = self._buffer
+        i = self._scanned
+        while i < len(buffer):
+            char = buffer[i]
+            if char in self.OPEN_BRACKETS:
+                self._depth += 1
+            elif char in self.CLOSE_BRACKETS:
+                self._depth = max(0, self._depth - 1)
+            elif char in self.SEPARATORS and self._depth == 0:
+                if i == len(buffer) - 1 and not final:
+                    break  # 需要下一个字符判断是否位于英文单词之间
+                next_char = buffer[i + 1] if i + 1 < len(buffer) else ""
+                if not (i > 0 and is_english_letter(buffer[i - 1]) and next_char and is_english_letter(next_char)):
+                    if buffer[:i].strip():
+                        segments.append((buffer[:i], char))
+                    buffer = buffer[i + 1 :]
+                    i = 0
+                    continue
+            i += 1
+        if final:
+            if buffer.strip():
+                segments.append((buffer, ""))
+            buffer, i = "", 0
+        self._buffer = buffer
+        self._scanned = i
+        return segments
+
+    def _merge(self, content: str, separator: str) -> List[str]:
+        """按概率与下一段合并，规则与 split_into_sentences_w_remove_punctuation 相同"""
+        if self._held is not None:
+            held_content, held_separator = self._held
+            self._held = None
+            return self._emit(held_content + held_separator + content)
+        if self._seen_length < 12:
+            merge_probability = 0.8
+        elif self._seen_length < 32:
+            merge_probability = 0.4
+        else:
+            merge_probability = 0.3
+        if random.random() < merge_probability:
+            self._held = (content, separator)
+            return []
+        return self._emit(content)
+
+    def _emit(self, sentence: str) -> List[str]:
+        """对一句话去除括号内容、加入错别字并检查上限"""
+        if global_config.enable_kaomoji_protection:
+            sentence, kaomoji_mapping = protect_kaomoji(sentence)
+        else:
+            kaomoji_mapping = {}
+        sentence = BRACKET_CONTENT_PATTERN.sub("", sentence)
+        if not sentence.strip():
+            return []
+
+        self._cleaned_text += sentence
+        if get_western_ratio(self._cleaned_text) < 0.1 and len(self._cleaned_text) > self.max_length:
+            logger.warning(f"回复过长 ({len(self._cleaned_text)} 字符)，停止发送后续内容")
+            self.stopped = True
+            return [] if self._sentence_count else ["懒得说"]
+
+        sentences = [sentence]
+        if global_config.chinese_typo_enable:
+            typoed_text, typo_corrections = self.typo_generator.create_typo_sentence(sentence)
+            sentences = [typoed_text, typo_corrections] if typo_corrections else [typoed_text]
+
+        if self._sentence_count + len(sentences) > self.max_sentence_num:
+            logger.warning(f"分割后消息数量超过 {self.max_sentence_num} 条，停止发送后续内容")
+            self.stopped = True
+            sentences = sentences[: self.max_sentence_num - self._sentence_count]
+            if not sentences and not self._sentence_count:
+                return [f"{global_config.BOT_NICKNAME}不知道哦"]
+
+        self._sentence_count += len(sentences)
+        if kaomoji_mapping:
+            sentences = recover_kaomoji(sentences, kaomoji_mapping)
+        return sentences
+
+
 def calculate_typing_time(
     input_string: str,
     thinking_start_time: float,
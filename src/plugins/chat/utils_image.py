@@ -2,13 +2,14 @@ import base64
 import os
 import time
 import hashlib
-from typing import Optional
+from typing import Optional, Tuple
 from PIL import Image
 import io
 import numpy as np
 
 
 from ...common.database import db
+from ...common.image_executor import image_executor
 from ...config.config import global_config
 from ..models.utils_model import LLMRequest
 
@@ -102,13 +103,23 @@ class ImageManager:
         except Exception as e:
             logger.error(f"保存描述到数据库失败: {str(e)}")
 
+    @staticmethod
+    def _decode_image(image_base64: str) -> Tuple[bytes, str, str]:
+        """解码base64图片，返回 (图片数据, md5哈希, 格式)"""
+        image_bytes = base64.b64decode(image_base64)
+        image_hash = hashlib.md5(image_bytes).hexdigest()
+        image_format = Image.open(io.BytesIO(image_bytes)).format.lower()
+        return image_bytes, image_hash, image_format
+
+    async def decode_image(self, image_base64: str) -> Tuple[bytes, str, str]:
+        """在图片线程池中解码base64图片，返回 (图片数据, md5哈希, 格式)"""
+        return await image_executor.run(self._decode_image, image_base64, cache=False)
+
     async def get_emoji_description(self, image_base64: str) -> str:
         """获取表情包描述，带查重和保存功能"""
         try:
             # 计算图片哈希
-            image_bytes = base64.b64decode(image_base64)
-            image_hash = hashlib.md5(image_bytes).hexdigest()
-            image_format = Image.open(io.BytesIO(image_bytes)).format.lower()
+            image_bytes, image_hash, image_format = await self.decode_image(image_base64)
 
             # 查询缓存的描述
             cached_description = self._get_description_from_db(image_hash, "emoji")
@@ -118,7 +129,7 @@ class ImageManager:
 
             # 调用AI获取描述
             if image_format == "gif" or image_format == "GIF":
-                image_base64 = self.transform_gif(image_base64)
+                image_base64 = await self.transform_gif_async(image_base64)
                 prompt = "这是一个动态图表情包，每一张图代表了动态图的某一帧，黑色背景代表透明，使用1-2个词描述一下表情包表达的情感和内容，简短一些"
                 description, _ = await self._llm.generate_response_for_image(prompt, image_base64, "jpg")
             else:
@@ -169,9 +180,7 @@ class ImageManager:
         """获取普通图片描述，带查重和保存功能"""
         try:
             # 计算图片哈希
-            image_bytes = base64.b64decode(image_base64)
-            image_hash = hashlib.md5(image_bytes).hexdigest()
-            image_format = Image.open(io.BytesIO(image_bytes)).format.lower()
+            image_bytes, image_hash, image_format = await self.decode_image(image_base64)
 
             # 查询缓存的描述
             cached_description = self._get_description_from_db(image_hash, "image")
@@ -231,6 +240,10 @@ class ImageManager:
             logger.error(f"获取图片描述失败: {str(e)}")
             return "[图片]"
 
+    async def transform_gif_async(self, gif_base64: str) -> Optional[str]:
+        """在图片线程池中执行 transform_gif，同一张GIF的转换结果会被缓存"""
+        return await image_executor.run(self.transform_gif, gif_base64)
+
     @staticmethod
     def transform_gif(gif_base64: str, similarity_threshold: float = 1000.0, max_frames: int = 15) -> Optional[str]:
         """将GIF转换为水平拼接的静态图像, 跳过相似的帧
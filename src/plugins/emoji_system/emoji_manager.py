@@ -829,12 +829,11 @@ class EmojiManager:
         """
         try:
             # 解码图片并获取格式
-            image_bytes = base64.b64decode(image_base64)
-            image_format = Image.open(io.BytesIO(image_bytes)).format.lower()
+            _, _, image_format = await image_manager.decode_image(image_base64)
 
             # 调用AI获取描述
             if image_format == "gif" or image_format == "GIF":
-                image_base64 = image_manager.transform_gif(image_base64)
+                image_base64 = await image_manager.transform_gif_async(image_base64)
                 prompt = "这是一个动态图表情包，每一张图代表了动态图的某一帧，黑色背景代表透明，描述一下表情包表达的情感和内容，描述细节，从互联网梗,meme的角度去分析"
                 description, _ = await self.vlm.generate_response_for_image(prompt, image_base64, "jpg")
             else:
@@ -3,7 +3,7 @@ import time
 import traceback
 import random  # <--- 添加导入
 import json  # <--- 确保导入 json
-from typing import List, Optional, Dict, Any, Deque, Callable, Coroutine
+from typing import List, Optional, Dict, Any, Deque, Callable, Coroutine, AsyncIterator
 from collections import deque
 from src.plugins.chat.message import MessageRecv, BaseMessageInfo, MessageThinking, MessageSending
 from src.plugins.chat.message import Seg  # Local import needed after move
@@ -23,7 +23,7 @@ import contextlib
 from src.plugins.utils.chat_message_builder import num_new_messages_since
 from src.plugins.heartFC_chat.heartFC_Cycleinfo import CycleInfo
 from .heartFC_sender import HeartFCSender
-from src.plugins.chat.utils import process_llm_response
+from src.plugins.chat.utils import process_llm_response, StreamingResponseSplitter
 from src.plugins.respon_info_catcher.info_catcher import info_catcher_manager
 from src.plugins.moods.moods import MoodManager
 from src.individuality.individuality import Individuality
@@ -533,6 +533,21 @@ class HeartFChatting:
             raise PlannerError("无法创建思考消息")
 
         try:
+            if global_config.stream_reply and global_config.enable_response_splitter:
+                # 边生成边发送，第一句生成后立即发出
+                with Timer("生成并发送回复", cycle_timers):
+                    reply, first_bot_msg = await self._stream_reply(
+                        anchor_message=anchor_message,
+                        thinking_id=thinking_id,
+                        reason=reasoning,
+                    )
+                if not reply:
+                    raise ReplierError("回复生成失败")
+                if first_bot_msg and emoji_query:
+                    logger.info(f"{self.log_prefix}正在发送关联表情: '{emoji_query}'")
+                    await self._handle_emoji(first_bot_msg, reply, emoji_query)
+                return True, thinking_id
+
             # 生成回复
             with Timer("生成回复", cycle_timers):
                 reply = await self._replier_work(
@@ -1233,27 +1248,13 @@ class HeartFChatting:
         (已整合原 HeartFCGenerator 的功能)
         """
         try:
-            # 1. 获取情绪影响因子并调整模型温度
-            arousal_multiplier = MoodManager.get_instance().get_arousal_multiplier()
-            current_temp = global_config.llm_normal["temp"] * arousal_multiplier
-            self.model_normal.temperature = current_temp  # 动态调整温度
-
-            # 2. 获取信息捕捉器
+            # 1. 获取信息捕捉器
             info_catcher = info_catcher_manager.get_info_catcher(thinking_id)
 
-            # 3. 构建 Prompt
-            with Timer("构建Prompt", {}):  # 内部计时器，可选保留
-                prompt = await prompt_builder.build_prompt(
-                    build_mode="focus",
-                    reason=reason,
-                    current_mind_info=self.sub_mind.current_mind,
-                    structured_info=self.sub_mind.structured_info,
-                    message_txt="",  # 似乎是固定的空字符串
-                    sender_name="",  # 似乎是固定的空字符串
-                    chat_stream=anchor_message.chat_stream,
-                )
+            # 2. 调整模型温度并构建 Prompt
+            prompt = await self._build_replier_prompt(reason, anchor_message)
 
-            # 4. 调用 LLM 生成回复
+            # 3. 调用 LLM 生成回复
             content = None
             reasoning_content = None
             model_name = "unknown_model"
@@ -1271,7 +1272,7 @@ class HeartFChatting:
                 logger.error(f"{self.log_prefix}[Replier-{thinking_id}] LLM 生成失败: {llm_e}")
                 return None  # LLM 调用失败则无法生成回复
 
-            # 5. 处理 LLM 响应
+            # 4. 处理 LLM 响应
             if not content:
                 logger.warning(f"{self.log_prefix}[Replier-{thinking_id}] LLM 生成了空内容。")
                 return None
@@ -1291,6 +1292,81 @@ class HeartFChatting:
             # logger.error(traceback.format_exc()) # 可以取消注释这行以在调试时查看完整堆栈
             return None
 
+    async def _build_replier_prompt(self, reason: str, anchor_message: MessageRecv) -> str:
+        """根据情绪调整回复模型的温度，并构建回复 Prompt"""
+        arousal_multiplier = MoodManager.get_instance().get_arousal_multiplier()
+        current_temp = global_config.llm_normal["temp"] * arousal_multiplier
+        self.model_normal.temperature = current_temp  # 动态调整温度
+
+        with Timer("构建Prompt", {}):  # 内部计时器，可选保留
+            return await prompt_builder.build_prompt(
+                build_mode="focus",
+                reason=reason,
+                current_mind_info=self.sub_mind.current_mind,
+                structured_info=self.sub_mind.structured_info,
+                message_txt="",  # 似乎是固定的空字符串
+                sender_name="",  # 似乎是固定的空字符串
+                chat_stream=anchor_message.chat_stream,
+            )
+
+    async def _stream_reply(
+        self, reason: str, anchor_message: MessageRecv, thinking_id: str
+    ) -> tuple[Optional[List[str]], Optional[MessageSending]]:
+        """
+        流式回复: 回复器在模型生成过程中分句，发送器同时逐句发送。
+        返回 (已发送的句子, 第一条消息)，没有生成任何句子时返回 (None, None)。
+        """
+        sentence_queue: asyncio.Queue = asyncio.Queue()
+
+        async def sentences() -> AsyncIterator[str]:
+            while (sentence := await sentence_queue.get()) is not None:
+                yield sentence
+
+        replier = asyncio.create_task(self._replier_work_stream(reason, anchor_message, thinking_id, sentence_queue))
+        try:
+            first_bot_msg, response_set = await self._send_response_stream(anchor_message, sentences(), thinking_id)
+        finally:
+            # 发送中止时(如思考状态已结束)不再继续生成
+            if not replier.done():
+                replier.cancel()
+            await asyncio.gather(replier, return_exceptions=True)
+        return response_set or None, first_bot_msg
+
+    async def _replier_work_stream(
+        self, reason: str, anchor_message: MessageRecv, thinking_id: str, sentence_queue: asyncio.Queue
+    ):
+        """
+        流式回复器: 与 _replier_work 相同地生成回复，每分出一句就放入 sentence_queue，结束时放入 None。
+        """
+        try:
+            info_catcher = info_catcher_manager.get_info_catcher(thinking_id)
+            prompt = await self._build_replier_prompt(reason, anchor_message)
+            splitter = StreamingResponseSplitter()
+
+            async def on_delta(delta: str):
+                for sentence in splitter.feed(delta):
+                    sentence_queue.put_nowait(sentence)
+
+            with Timer("LLM生成", {}):
+                # 模型返回工具调用时结果多一个 tool_calls，这里不使用
+                content, reasoning_content, model_name, *_ = await self.model_normal.generate_response_stream(
+                    prompt, on_delta
+                )
+            info_catcher.catch_after_llm_generated(
+                prompt=prompt, response=content, reasoning_content=reasoning_content, model_name=model_name
+            )
+            if not content:
+                logger.warning(f"{self.log_prefix}[Replier-{thinking_id}] LLM 生成了空内容。")
+                return
+            for sentence in splitter.finish():
+                sentence_queue.put_nowait(sentence)
+
+        except Exception as e:
+            # 已经发出的句子无法撤回，只停止后续发送
+            logger.error(f"{self.log_prefix}[Replier-{thinking_id}] 流式回复生成失败: {e}")
+        finally:
+            sentence_queue.put_nowait(None)
+
     # --- Methods moved from HeartFCController start ---
     async def _create_thinking_message(self, anchor_message: Optional[MessageRecv]) -> Optional[str]:
         """创建思考消息 (尝试锚定到 anchor_message)"""
@@ -1323,9 +1399,21 @@ class HeartFChatting:
         self, anchor_message: Optional[MessageRecv], response_set: List[str], thinking_id: str
     ) -> Optional[MessageSending]:
         """发送回复消息 (尝试锚定到 anchor_message)，使用 HeartFCSender"""
+
+        async def parts() -> AsyncIterator[str]:
+            for msg_text in response_set:
+                yield msg_text
+
+        first_bot_msg, _ = await self._send_response_stream(anchor_message, parts(), thinking_id)
+        return first_bot_msg
+
+    async def _send_response_stream(
+        self, anchor_message: Optional[MessageRecv], response_parts: AsyncIterator[str], thinking_id: str
+    ) -> tuple[Optional[MessageSending], List[str]]:
+        """依次发送 response_parts 中的回复片段，片段可以边生成边发送。返回 (第一条消息, 已处理的片段)"""
         if not anchor_message or not anchor_message.chat_stream:
             logger.error(f"{self.log_prefix} 无法发送回复，缺少有效的锚点消息或聊天流。")
-            return None
+            return None, []
 
         chat = anchor_message.chat_stream
         chat_id = chat.stream_id
@@ -1336,9 +1424,10 @@ class HeartFChatting:
 
         if thinking_start_time is None:
             logger.warning(f"[{stream_name}] {thinking_id} 思考过程未找到或已结束，无法发送回复。")
-            return None
+            return None, []
 
-        # 记录锚点消息ID和回复文本（在发送前记录）
+        # 记录锚点消息ID和回复文本（在发送前记录，流式发送时随发送进度更新）
+        response_set: List[str] = []
         self._current_cycle.set_response_info(
             response_text=response_set, anchor_message_id=anchor_message.message_info.message_id
         )
@@ -1352,7 +1441,9 @@ class HeartFChatting:
             platform=anchor_message.message_info.platform,
         )
 
-        for i, msg_text in enumerate(response_set):
+        async for msg_text in response_parts:
+            i = len(response_set)
+            response_set.append(msg_text)
             # 为每个消息片段生成唯一ID
             part_message_id = f"{thinking_id}_{i}"
             message_segment = Seg(type="text", data=msg_text)
@@ -1395,7 +1486,7 @@ class HeartFChatting:
             reply_message_ids=reply_message_ids,  # 添加实际发送的ID列表
         )
 
-        return first_bot_msg  # 返回第一个成功发送的消息对象
+        return first_bot_msg, response_set  # 返回第一个成功发送的消息对象
 
     async def _handle_emoji(self, anchor_message: Optional[MessageRecv], response_set: List[str], send_emoji: str = ""):
         """处理表情包 (尝试锚定到 anchor_message)，使用 HeartFCSender"""
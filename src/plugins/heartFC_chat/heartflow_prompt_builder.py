@@ -5,7 +5,7 @@ from ...individuality.individuality import Individuality
 from src.plugins.utils.prompt_builder import Prompt, global_prompt_manager
 from src.plugins.utils.chat_message_builder import build_readable_messages, get_raw_msg_before_timestamp_with_chat
 from src.plugins.person_info.relationship_manager import relationship_manager
-from src.plugins.chat.utils import get_embedding
+from src.plugins.chat.utils import get_embedding, get_embeddings
 import time
 from typing import Union, Optional
 from ...common.database import db
@@ -483,18 +483,13 @@ class PromptBuilder:
 
         # 批量获取嵌入向量
         embed_start_time = time.time()
-        for text in topics_batch:
-            if not text or len(text.strip()) == 0:
-                continue
-
-            try:
-                embedding = await get_embedding(text, request_type="prompt_build")
-                if embedding:
-                    embeddings[text] = embedding
-                else:
-                    logger.warning(f"获取'{text}'的嵌入向量失败")
-            except Exception as e:
-                logger.error(f"获取'{text}'的嵌入向量时发生错误: {str(e)}")
+        topics_batch = [text for text in topics_batch if text and len(text.strip()) > 0]
+        batch_embeddings = await get_embeddings(topics_batch, request_type="prompt_build")
+        for text, embedding in zip(topics_batch, batch_embeddings, strict=True):
+            if embedding:
+                embeddings[text] = embedding
+            else:
+                logger.warning(f"获取'{text}'的嵌入向量失败")
 
         logger.info(f"批量获取嵌入向量完成，耗时: {time.time() - embed_start_time:.3f}秒")
 
@@ -585,7 +580,7 @@ class PromptBuilder:
         logger.debug(f"获取知识库内容，元消息：{message[:30]}...，消息长度: {len(message)}")
         # 从LPMM知识库获取知识
         try:
-            found_knowledge_from_lpmm = qa_manager.get_knowledge(message)
+            found_knowledge_from_lpmm = await qa_manager.get_knowledge_async(message)
 
             end_time = time.time()
             if found_knowledge_from_lpmm is not None:
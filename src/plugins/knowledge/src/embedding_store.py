@@ -1,13 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 import json
+import mmap
 import os
-from typing import Dict, List, Tuple
+import time
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
-import pandas as pd
+import pyarrow.parquet as pq
 import tqdm
 import faiss
 
+from . import faiss_index
 from .llm_client import LLMClient
 from .lpmmconfig import ENT_NAMESPACE, PG_NAMESPACE, REL_NAMESPACE, global_config
 from .utils.hash import get_sha256
@@ -32,112 +37,484 @@ class EmbeddingStoreItem:
         }
 
 
+class EmbeddingTable(Mapping):
+    """嵌入库的数据表，hash -> EmbeddingStoreItem
+
+    目录中的文件：
+    - meta.json：格式版本、行数、向量维度、hash长度
+    - embeddings.f32：float32 嵌入矩阵，每行一项
+    - hashes.bin：与矩阵各行对应的定长hash
+    - strings.bin / string_offsets.i64：各行字符串的UTF-8拼接，以及每行的起始偏移(共 行数+1 个)
+    - sorted_hashes.bin / sorted_rows.i64：按hash排序的副本和对应的行号，用于二分查找
+
+    加载时只用 mmap 映射文件，不为每一行创建Python对象，常驻内存只包括实际访问过的页面。
+    新增的行先保存在内存中，保存时追加到文件末尾；meta.json 最后写入，其中的行数之后的内容视为无效。
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, dir_path: str, dimension: int):
+        self.dir = dir_path
+        self.dimension = dimension
+        self.count = 0  # 已保存到文件的行数
+        self.hash_width = 0
+        self._map_files()
+
+        # 尚未保存的新行
+        self._new_rows: Dict[str, int] = dict()
+        self._new_hashes: List[str] = []
+        self._new_strs: List[str] = []
+        self._new_embeddings: List[np.ndarray] = []
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path("meta.json"))
+
+    def load(self) -> None:
+        """映射已保存的文件，丢弃未保存的新行"""
+        with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["version"] != self.FORMAT_VERSION:
+            raise ValueError(f"不支持的嵌入库格式版本：{meta['version']}")
+        if meta["dimension"] != self.dimension:
+            raise ValueError(f"嵌入库的向量维度({meta['dimension']})与配置({self.dimension})不一致")
+        self.count = meta["count"]
+        self.hash_width = meta["hash_width"]
+        self._clear_new_rows()
+        self._map_files()
+        if len(self._sorted_hashes) != self.count or len(self._sorted_rows) != self.count:
+            # 上次保存在写入排序索引后中断
+            logger.warning(f"{self.dir}的hash索引不完整，正在重建")
+            self._write_sorted_index(*self._sort_hashes(np.asarray(self._hashes), 0))
+            self._map_files()
+
+    def _map_files(self) -> None:
+        count, width = self.count, self.hash_width
+        self._embeddings = self._map("embeddings.f32", np.float32, (count, self.dimension))
+        self._hashes = self._map("hashes.bin", f"S{max(width, 1)}", (count,))
+        self._offsets = self._map("string_offsets.i64", np.int64, (count + 1,)) if count else np.zeros(1, np.int64)
+        self._strings = self._map("strings.bin", np.uint8, (int(self._offsets[-1]),))
+        self._sorted_hashes = self._map("sorted_hashes.bin", f"S{max(width, 1)}", None)
+        self._sorted_rows = self._map("sorted_rows.i64", np.int64, None)
+
+    def _map(self, name: str, dtype, shape) -> np.ndarray:
+        """只读映射文件的前 shape 个元素，shape 为 None 时映射整个文件"""
+        dtype = np.dtype(dtype)
+        path = self._path(name)
+        if shape is None:
+            size = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+            shape = (size,)
+        count = int(np.prod(shape))
+        if count == 0:
+            return np.empty(shape, dtype=dtype)
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_RANDOM"):
+            # 查询时随机访问，关闭预读，否则每次访问一行都会读入并映射相邻的数百KB
+            mapped.madvise(mmap.MADV_RANDOM)
+        return np.frombuffer(mapped, dtype=dtype, count=count).reshape(shape)
+
+    def row_of(self, item_hash: str) -> Optional[int]:
+        """返回hash所在的行号，不存在时返回None"""
+        row = self._new_rows.get(item_hash)
+        if row is not None or self.count == 0:
+            return row
+        key = item_hash.encode("utf-8")
+        if len(key) != self.hash_width:
+            return None
+        pos = int(np.searchsorted(self._sorted_hashes, key))
+        if pos < self.count and self._sorted_hashes[pos] == key:
+            return int(self._sorted_rows[pos])
+        return None
+
+    def hash_at(self, row: int) -> str:
+        if row >= self.count:
+            return self._new_hashes[row - self.count]
+        return self._hashes[row].decode("utf-8")
+
+    def str_at(self, row: int) -> str:
+        if row >= self.count:
+            return self._new_strs[row - self.count]
+        return self._strings[self._offsets[row] : self._offsets[row + 1]].tobytes().decode("utf-8")
+
+    def embedding_at(self, row: int) -> np.ndarray:
+        if row >= self.count:
+            return self._new_embeddings[row - self.count]
+        return self._embeddings[row]
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """第 start 到 stop 行的嵌入，只包含已保存的行时为只读映射"""
+        stop = min(stop, len(self))
+        if stop <= self.count:
+            return self._embeddings[start:stop]
+        new_rows = np.stack(self._new_embeddings[max(start - self.count, 0) : stop - self.count])
+        if start >= self.count:
+            return new_rows
+        return np.concatenate([self._embeddings[start:], new_rows])
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        """指定行(升序)的嵌入组成的矩阵(复制)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        saved = rows[rows < self.count]
+        new_rows = [self._new_embeddings[row - self.count] for row in rows[len(saved) :]]
+        taken = self._embeddings[saved] if len(saved) else np.empty((0, self.dimension), dtype=np.float32)
+        return np.concatenate([taken, np.asarray(new_rows, dtype=np.float32).reshape(-1, self.dimension)])
+
+    def matrix(self) -> np.ndarray:
+        """全部嵌入组成的矩阵(行号与 row_of 一致)，没有未保存的新行时为只读映射"""
+        return self.rows(0, len(self))
+
+    def add(self, item_hash: str, content: str, embedding) -> bool:
+        """加入一行，hash已存在时不做任何事并返回False"""
+        if self.row_of(item_hash) is not None:
+            return False
+        width = len(item_hash.encode("utf-8"))
+        if self.hash_width == 0:
+            self.hash_width = width
+        elif width != self.hash_width:
+            raise ValueError(f"hash长度({width})与嵌入库中的hash长度({self.hash_width})不一致：{item_hash}")
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if embedding.shape != (self.dimension,):
+            raise ValueError(f"嵌入维度{embedding.shape}与配置的维度({self.dimension})不一致")
+        self._new_rows[item_hash] = self.count + len(self._new_strs)
+        self._new_hashes.append(item_hash)
+        self._new_strs.append(content)
+        self._new_embeddings.append(embedding)
+        return True
+
+    def save(self) -> None:
+        """将新行追加到文件"""
+        if not self._new_strs and self.exists():
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        self._truncate_files()
+
+        new_hashes = np.array(self._new_hashes, dtype=f"S{max(self.hash_width, 1)}")
+        encoded = [s.encode("utf-8") for s in self._new_strs]
+        new_offsets = int(self._offsets[-1]) + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        with open(self._path("embeddings.f32"), "ab") as f:
+            if self._new_embeddings:
+                f.write(np.stack(self._new_embeddings).tobytes())
+        with open(self._path("hashes.bin"), "ab") as f:
+            f.write(new_hashes.tobytes())
+        with open(self._path("strings.bin"), "ab") as f:
+            f.write(b"".join(encoded))
+        with open(self._path("string_offsets.i64"), "ab") as f:
+            if self.count == 0:
+                f.write(np.zeros(1, dtype=np.int64).tobytes())
+            f.write(new_offsets.tobytes())
+
+        # 将新hash按序插入排序索引(只复制数组，不排序已有的部分)
+        new_sorted, new_rows = self._sort_hashes(new_hashes, self.count)
+        positions = np.searchsorted(self._sorted_hashes, new_sorted)
+        sorted_hashes = np.insert(np.asarray(self._sorted_hashes, dtype=new_sorted.dtype), positions, new_sorted)
+        sorted_rows = np.insert(np.asarray(self._sorted_rows), positions, new_rows)
+        self._write_sorted_index(sorted_hashes, sorted_rows)
+
+        self.count += len(self._new_strs)
+        _write_file_atomic(
+            self._path("meta.json"),
+            json.dumps(
+                {
+                    "version": self.FORMAT_VERSION,
+                    "count": self.count,
+                    "dimension": self.dimension,
+                    "hash_width": self.hash_width,
+                }
+            ).encode("utf-8"),
+        )
+        self._clear_new_rows()
+        self._map_files()
+
+    def _clear_new_rows(self) -> None:
+        self._new_rows, self._new_hashes, self._new_strs, self._new_embeddings = dict(), [], [], []
+
+    @staticmethod
+    def _sort_hashes(hashes: np.ndarray, first_row: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(hashes, kind="stable")
+        return hashes[order], (order + first_row).astype(np.int64)
+
+    def _write_sorted_index(self, sorted_hashes: np.ndarray, sorted_rows: np.ndarray) -> None:
+        # 先释放旧文件的映射(Windows 下无法替换仍被映射的文件)
+        self._sorted_hashes, self._sorted_rows = sorted_hashes, sorted_rows
+        _write_file_atomic(self._path("sorted_hashes.bin"), sorted_hashes.tobytes())
+        _write_file_atomic(self._path("sorted_rows.i64"), sorted_rows.tobytes())
+
+    def _truncate_files(self) -> None:
+        """截掉上次保存中断时在 meta.json 记录的行数之后写入的内容"""
+        sizes = {
+            "embeddings.f32": self.count * self.dimension * 4,
+            "hashes.bin": self.count * self.hash_width,
+            "strings.bin": int(self._offsets[-1]),
+            "string_offsets.i64": (self.count + 1) * 8 if self.count else 0,
+        }
+        for name, size in sizes.items():
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def __contains__(self, item_hash) -> bool:
+        return isinstance(item_hash, str) and self.row_of(item_hash) is not None
+
+    def __getitem__(self, item_hash: str) -> EmbeddingStoreItem:
+        row = self.row_of(item_hash)
+        if row is None:
+            raise KeyError(item_hash)
+        return EmbeddingStoreItem(item_hash, self.embedding_at(row), self.str_at(row))
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self.hash_at(row)
+
+    def __len__(self) -> int:
+        return self.count + len(self._new_strs)
+
+
+def _write_file_atomic(path: str, data: bytes) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
 class EmbeddingStore:
+    INDEX_ADD_CHUNK = 65536  # 构建索引时每次归一化并加入的行数，避免复制整个嵌入矩阵
+
     def __init__(self, llm_client: LLMClient, namespace: str, dir_path: str):
         self.namespace = namespace
         self.llm_client = llm_client
         self.dir = dir_path
+        # 旧版本的parquet格式嵌入库，加载时转换为 EmbeddingTable
         self.embedding_file_path = dir_path + "/" + namespace + ".parquet"
+        # 索引中的id即为嵌入库的行号，id到hash的映射就是嵌入库的hash列(hashes.bin)
         self.index_file_path = dir_path + "/" + namespace + ".index"
-        self.idx2hash_file_path = dir_path + "/" + namespace + "_i2h.json"
+        # 索引的类型(faiss.index_factory 描述串)，配置修改后据此判断是否需要重建
+        self.index_meta_path = dir_path + "/" + namespace + ".index.json"
+        self.checkpoint_vec_path = dir_path + "/" + namespace + "_checkpoint.vec"
+        self.checkpoint_meta_path = dir_path + "/" + namespace + "_checkpoint.jsonl"
 
-        self.store = dict()
+        self.store = EmbeddingTable(dir_path + "/" + namespace, global_config["embedding"]["dimension"])
 
+        self.index_config = {**faiss_index.DEFAULT_INDEX_CONFIG, **global_config.get("index", {}).get(namespace, {})}
         self.faiss_index = None
-        self.idx2hash = None
+        self.index_factory = None
+        self._index_dirty = False  # 索引有未保存的修改
 
     def _get_embedding(self, s: str) -> List[float]:
         return self.llm_client.send_embedding_request(global_config["embedding"]["model"], s)
 
+    def _get_embeddings_with_retry(self, chunk: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], List[list]]:
+        """获取一块(hash, 字符串)的嵌入，失败时按指数间隔重试"""
+        max_retries = global_config["embedding"]["max_retries"]
+        for attempt in range(max_retries + 1):
+            try:
+                embeddings = self.llm_client.send_embedding_batch_request(
+                    global_config["embedding"]["model"], [s for _, s in chunk]
+                )
+                return chunk, embeddings
+            except Exception as e:
+                if attempt >= max_retries:
+                    raise
+                wait_time = min(2**attempt, 60)
+                logger.warning(f"获取{self.namespace}嵌入失败，{wait_time}秒后重试({attempt + 1}/{max_retries})：{e}")
+                time.sleep(wait_time)
+
     def batch_insert_strs(self, strs: List[str]) -> None:
-        """向库中存入字符串"""
-        # 逐项处理
-        for s in tqdm.tqdm(strs, desc="存入嵌入库", unit="items"):
-            # 计算hash去重
-            item_hash = self.namespace + "-" + get_sha256(s)
-            if item_hash in self.store:
-                continue
+        """向库中存入字符串
 
-            # 获取embedding
-            embedding = self._get_embedding(s)
+        按 embedding.batch_size 分块，由 embedding.workers 个线程并发发送批量嵌入请求。
+        每完成一块就追加写入检查点文件，导入中断后重新导入时从检查点恢复已完成的项，不再重复请求；
+        嵌入库保存到文件后检查点被清除。
+        """
+        self._load_checkpoint()
 
-            # 存入
-            self.store[item_hash] = EmbeddingStoreItem(item_hash, embedding, s)
+        # 计算hash去重
+        pending = dict()
+        for s in strs:
+            item_hash = self.namespace + "-" + get_sha256(s)
+            if item_hash not in self.store:
+                pending[item_hash] = s
+        if not pending:
+            return
+
+        items = list(pending.items())
+        batch_size = max(1, global_config["embedding"]["batch_size"])
+        chunks = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+        executor = ThreadPoolExecutor(max_workers=max(1, global_config["embedding"]["workers"]))
+        try:
+            futures = [executor.submit(self._get_embeddings_with_retry, chunk) for chunk in chunks]
+            with tqdm.tqdm(total=len(items), desc="存入嵌入库", unit="items") as progress:
+                for future in as_completed(futures):
+                    chunk, embeddings = future.result()
+                    self._append_checkpoint(chunk, embeddings)
+                    # 存入
+                    for (item_hash, s), embedding in zip(chunk, embeddings, strict=True):
+                        self.store.add(item_hash, s, embedding)
+                    progress.update(len(chunk))
+        finally:
+            # 出错或被中断时不再发送尚未开始的请求
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _append_checkpoint(self, chunk: List[Tuple[str, str]], embeddings: List[list]) -> None:
+        """追加写入检查点：向量写入 .vec(float32)，(hash, 字符串) 按相同顺序写入 .jsonl"""
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self.checkpoint_vec_path, "ab") as f:
+            f.write(np.asarray(embeddings, dtype=np.float32).tobytes())
+        with open(self.checkpoint_meta_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps([item_hash, s], ensure_ascii=False) + "\n" for item_hash, s in chunk))
+
+    def _load_checkpoint(self) -> None:
+        """从检查点恢复上次中断的导入，并截掉写入不完整的尾部"""
+        if not os.path.exists(self.checkpoint_meta_path) or not os.path.exists(self.checkpoint_vec_path):
+            return
+        dimension = global_config["embedding"]["dimension"]
+        vectors = np.fromfile(self.checkpoint_vec_path, dtype=np.float32)
+        vectors = vectors[: len(vectors) // dimension * dimension].reshape(-1, dimension)
+        with open(self.checkpoint_meta_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+
+        count = 0
+        for line, vector in zip(lines, vectors, strict=False):
+            try:
+                item_hash, s = json.loads(line)
+            except (json.JSONDecodeError, ValueError):
+                break
+            self.store.add(item_hash, s, vector)
+            count += 1
+
+        if count != len(lines) or count != len(vectors):
+            # 两个文件的条数必须一致，否则之后追加的记录会错位
+            os.truncate(self.checkpoint_vec_path, count * dimension * 4)
+            with open(self.checkpoint_meta_path, "w", encoding="utf-8") as f:
+                f.writelines(lines[:count])
+        logger.info(f"从检查点恢复了{count}条{self.namespace}嵌入")
+
+    def _clear_checkpoint(self) -> None:
+        for path in (self.checkpoint_vec_path, self.checkpoint_meta_path):
+            if os.path.exists(path):
+                os.remove(path)
 
     def save_to_file(self) -> None:
-        """保存到文件"""
-        data = []
-        logger.info(f"正在保存{self.namespace}嵌入库到文件{self.embedding_file_path}")
-        for item in self.store.values():
-            data.append(item.to_dict())
-        data_frame = pd.DataFrame(data)
-
-        if not os.path.exists(self.dir):
-            os.makedirs(self.dir, exist_ok=True)
-        if not os.path.exists(self.embedding_file_path):
-            open(self.embedding_file_path, "w").close()
-
-        data_frame.to_parquet(self.embedding_file_path, engine="pyarrow", index=False)
+        """保存到文件：嵌入库只追加新增的项，索引只在有修改时写入"""
+        logger.info(f"正在保存{self.namespace}嵌入库到目录{self.store.dir}")
+        self.store.save()
         logger.info(f"{self.namespace}嵌入库保存成功")
+        # 检查点中的项已经全部写入嵌入库
+        self._clear_checkpoint()
 
-        if self.faiss_index is not None and self.idx2hash is not None:
+        if self.faiss_index is not None and self._index_dirty:
             logger.info(f"正在保存{self.namespace}嵌入库的FaissIndex到文件{self.index_file_path}")
-            faiss.write_index(self.faiss_index, self.index_file_path)
+            faiss.write_index(self.faiss_index, self.index_file_path + ".tmp")
+            os.replace(self.index_file_path + ".tmp", self.index_file_path)
+            _write_file_atomic(self.index_meta_path, json.dumps({"factory": self.index_factory}).encode("utf-8"))
+            self._index_dirty = False
             logger.info(f"{self.namespace}嵌入库的FaissIndex保存成功")
-            logger.info(f"正在保存{self.namespace}嵌入库的idx2hash映射到文件{self.idx2hash_file_path}")
-            with open(self.idx2hash_file_path, "w", encoding="utf-8") as f:
-                f.write(json.dumps(self.idx2hash, ensure_ascii=False, indent=4))
-            logger.info(f"{self.namespace}嵌入库的idx2hash映射保存成功")
 
     def load_from_file(self) -> None:
         """从文件中加载"""
-        if not os.path.exists(self.embedding_file_path):
-            raise Exception(f"文件{self.embedding_file_path}不存在")
+        if not self.store.exists():
+            if not os.path.exists(self.embedding_file_path):
+                raise Exception(f"目录{self.store.dir}不存在")
+            self._convert_parquet()
 
-        logger.info(f"正在从文件{self.embedding_file_path}中加载{self.namespace}嵌入库")
-        data_frame = pd.read_parquet(self.embedding_file_path, engine="pyarrow")
-        for _, row in tqdm.tqdm(data_frame.iterrows(), total=len(data_frame)):
-            self.store[row["hash"]] = EmbeddingStoreItem(row["hash"], row["embedding"], row["str"])
-        logger.info(f"{self.namespace}嵌入库加载成功")
+        logger.info(f"正在从目录{self.store.dir}中加载{self.namespace}嵌入库")
+        self.store.load()
+        logger.info(f"{self.namespace}嵌入库加载成功，共{len(self.store)}项")
 
-        try:
-            if os.path.exists(self.index_file_path):
+        self.faiss_index = None
+        if os.path.exists(self.index_file_path):
+            try:
                 logger.info(f"正在从文件{self.index_file_path}中加载{self.namespace}嵌入库的FaissIndex")
                 self.faiss_index = faiss.read_index(self.index_file_path)
+                self.index_factory = self._load_index_factory()
+                faiss_index.apply_search_params(self.faiss_index, self.index_config)
+                self._index_dirty = False
                 logger.info(f"{self.namespace}嵌入库的FaissIndex加载成功")
-            else:
-                raise Exception(f"文件{self.index_file_path}不存在")
-            if os.path.exists(self.idx2hash_file_path):
-                logger.info(f"正在从文件{self.idx2hash_file_path}中加载{self.namespace}嵌入库的idx2hash映射")
-                with open(self.idx2hash_file_path, "r") as f:
-                    self.idx2hash = json.load(f)
-                logger.info(f"{self.namespace}嵌入库的idx2hash映射加载成功")
-            else:
-                raise Exception(f"文件{self.idx2hash_file_path}不存在")
-        except Exception as e:
-            logger.error(f"加载{self.namespace}嵌入库的FaissIndex时发生错误：{e}")
-            logger.warning("正在重建Faiss索引")
-            self.build_faiss_index()
-            logger.info(f"{self.namespace}嵌入库的FaissIndex重建成功")
+            except Exception as e:
+                logger.error(f"加载{self.namespace}嵌入库的FaissIndex时发生错误：{e}")
+        if (
+            self.faiss_index is None
+            or self.faiss_index.ntotal != len(self.store)
+            or self.index_factory != self._expected_factory()
+        ):
+            logger.warning(f"{self.namespace}嵌入库的FaissIndex不存在或与嵌入库、索引配置不一致，正在更新")
+            self.update_faiss_index()
             self.save_to_file()
 
+    def _convert_parquet(self) -> None:
+        """将旧版本的parquet嵌入库转换为 EmbeddingTable 格式(只在首次加载时执行一次)"""
+        logger.info(f"正在将{self.embedding_file_path}转换为新的嵌入库格式")
+        table = pq.read_table(self.embedding_file_path)
+        hashes = table.column("hash").to_pylist()
+        strs = table.column("str").to_pylist()
+        embeddings = table.column("embedding").combine_chunks().flatten().to_numpy(zero_copy_only=False)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(hashes), -1)
+        for item_hash, s, embedding in zip(hashes, strs, embeddings, strict=True):
+            self.store.add(item_hash, s, embedding)
+        self.store.save()
+        logger.info(
+            f"{self.namespace}嵌入库转换完成，共{len(self.store)}项，确认无误后可以删除{self.embedding_file_path}"
+        )
+
+    def _load_index_factory(self) -> str:
+        """已保存索引的类型，旧版本没有记录类型的索引均为 IndexFlatIP"""
+        if not os.path.exists(self.index_meta_path):
+            return "Flat"
+        with open(self.index_meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)["factory"]
+
+    def _expected_factory(self) -> str:
+        return faiss_index.factory_string(self.index_config, self.store.dimension, len(self.store))
+
     def build_faiss_index(self) -> None:
-        """重新构建Faiss索引，以余弦相似度为度量"""
-        # 获取所有的embedding
-        array = []
-        self.idx2hash = dict()
-        for key in self.store:
-            array.append(self.store[key].embedding)
-            self.idx2hash[str(len(array) - 1)] = key
-        embeddings = np.array(array, dtype=np.float32)
-        # L2归一化
+        """按索引配置重新构建Faiss索引，以余弦相似度为度量，IVF 索引用随机抽取的已有嵌入训练"""
+        factory = self._expected_factory()
+        train_data = None
+        if factory != "Flat":
+            train_size = faiss_index.train_size(self.index_config, len(self.store))
+            if train_size:
+                rows = np.sort(np.random.default_rng(0).choice(len(self.store), train_size, replace=False))
+                train_data = self.store.take(rows)
+                faiss.normalize_L2(train_data)
+                logger.info(f"正在用{train_size}项训练{self.namespace}嵌入库的FaissIndex({factory})")
+        self.faiss_index = faiss_index.create_index(factory, self.store.dimension, self.index_config, train_data)
+        self.index_factory = factory
+        self._add_to_index(0)
+
+    def update_faiss_index(self) -> None:
+        """将索引之后新增的项加入Faiss索引，索引与嵌入库或索引配置不一致时重新构建
+
+        IVF 索引的聚类中心不会随新增的项更新，新增的数据分布变化很大时可以调用 build_faiss_index 重新训练。
+        """
+        if (
+            self.faiss_index is None
+            or self.faiss_index.d != self.store.dimension
+            or self.faiss_index.ntotal > len(self.store)
+            or self.index_factory != self._expected_factory()
+        ):
+            self.build_faiss_index()
+        elif self.faiss_index.ntotal < len(self.store):
+            self._add_to_index(self.faiss_index.ntotal)
+
+    def _add_to_index(self, start: int) -> None:
+        """将第start行及之后的嵌入归一化后分块加入索引，加入的顺序即为索引中的id"""
+        for begin in range(start, len(self.store), self.INDEX_ADD_CHUNK):
+            # 复制(归一化会原地修改)
+            embeddings = np.array(self.store.rows(begin, begin + self.INDEX_ADD_CHUNK), dtype=np.float32)
+            # L2归一化
+            faiss.normalize_L2(embeddings)
+            self.faiss_index.add(embeddings)
+        self._index_dirty = True
+
+    def _take_normalized(self, rows: np.ndarray) -> np.ndarray:
+        embeddings = self.store.take(rows)
         faiss.normalize_L2(embeddings)
-        # 构建索引
-        self.faiss_index = faiss.IndexFlatIP(global_config["embedding"]["dimension"])
-        self.faiss_index.add(embeddings)
+        return embeddings
 
     def search_top_k(self, query: List[float], k: int) -> List[Tuple[str, float]]:
-        """搜索最相似的k个项，以余弦相似度为度量
+        """搜索最相似的k个项，以余弦相似度为度量(IVF-PQ 索引的相似度为近似值)
         Args:
             query: 查询的embedding
             k: 返回的最相似的k个项
@@ -147,25 +524,26 @@ class EmbeddingStore:
         if self.faiss_index is None:
             logger.warning("FaissIndex尚未构建,返回None")
             return None
-        if self.idx2hash is None:
-            logger.warning("idx2hash尚未构建,返回None")
-            return None
+        return self.batch_search_top_k([query], k)[0]
 
-        # L2归一化
-        faiss.normalize_L2(np.array([query], dtype=np.float32))
+    def batch_search_top_k(self, queries, k: int) -> List[List[Tuple[str, float]]]:
+        """批量搜索，每个查询的结果同 search_top_k；faiss 会在多个线程中并行搜索一批查询"""
+        # 复制后L2归一化
+        queries = np.array(queries, dtype=np.float32).reshape(-1, self.store.dimension)
+        faiss.normalize_L2(queries)
         # 搜索
-        distances, indices = self.faiss_index.search(np.array([query]), k)
-        # 整理结果
-        indices = list(indices.flatten())
-        distances = list(distances.flatten())
-        result = [
-            (self.idx2hash[str(int(idx))], float(sim))
-            for (idx, sim) in zip(indices, distances)
-            if idx in range(len(self.idx2hash))
+        distances, indices = faiss_index.search(self.faiss_index, queries, k, self.index_config, self._take_normalized)
+        # 整理结果，结果不足k个时id为-1
+        count = len(self.store)
+        return [
+            [
+                (self.store.hash_at(int(idx)), float(sim))
+                for idx, sim in zip(row_ids, row_sims, strict=True)
+                if 0 <= idx < count
+            ]
+            for row_ids, row_sims in zip(indices, distances, strict=True)
         ]
 
-        return result
-
 
 class EmbeddingManager:
     def __init__(self, llm_client: LLMClient):
@@ -184,7 +562,8 @@ class EmbeddingManager:
             REL_NAMESPACE,
             global_config["persistence"]["embedding_data_dir"],
         )
-        self.stored_pg_hashes = set()
+        # 已存储的段落hash(随段落库更新)
+        self.stored_pg_hashes = self.paragraphs_embedding_store.store.keys()
 
     def _store_pg_into_embedding(self, raw_paragraphs: Dict[str, str]):
         """将段落编码存入Embedding库"""
@@ -212,8 +591,6 @@ class EmbeddingManager:
         self.paragraphs_embedding_store.load_from_file()
         self.entities_embedding_store.load_from_file()
         self.relation_embedding_store.load_from_file()
-        # 从段落库中获取已存储的hash
-        self.stored_pg_hashes = set(self.paragraphs_embedding_store.store.keys())
 
     def store_new_data_set(
         self,
@@ -224,7 +601,6 @@ class EmbeddingManager:
         self._store_pg_into_embedding(raw_paragraphs)
         self._store_ent_into_embedding(triple_list_data)
         self._store_rel_into_embedding(triple_list_data)
-        self.stored_pg_hashes.update(raw_paragraphs.keys())
 
     def save_to_file(self):
         """保存到文件"""
@@ -233,7 +609,13 @@ class EmbeddingManager:
         self.relation_embedding_store.save_to_file()
 
     def rebuild_faiss_index(self):
-        """重建Faiss索引（请在添加新数据后调用）"""
+        """重建Faiss索引"""
         self.paragraphs_embedding_store.build_faiss_index()
         self.entities_embedding_store.build_faiss_index()
         self.relation_embedding_store.build_faiss_index()
+
+    def update_faiss_index(self):
+        """将新数据加入Faiss索引（请在添加新数据后调用）"""
+        self.paragraphs_embedding_store.update_faiss_index()
+        self.entities_embedding_store.update_faiss_index()
+        self.relation_embedding_store.update_faiss_index()
@@ -0,0 +1,121 @@
+"""LPMM 嵌入库的 Faiss 索引
+
+索引类型按命名空间在 lpmm_config 的 [index.<namespace>] 中配置：
+- flat：精确搜索(IndexFlatIP)，查询耗时随项数线性增长
+- ivf_flat：倒排索引，先把向量聚成 nlist 类，查询时只搜索最近的 nprobe 类
+- ivf_pq：倒排索引 + 乘积量化，每个向量压缩为 pq_m 个 pq_nbits 位的编码，内存占用小；
+  量化后的相似度误差较大，查询时先取 k x rerank 个候选，再用嵌入库中的原始向量精确计算相似度并重排
+- hnsw：分层图索引，不需要训练，查询时的候选数为 ef_search
+
+向量都经过 L2 归一化，内积即余弦相似度。IVF 索引需要用已有的数据训练，
+数据量不足以训练时(每个聚类中心少于 MIN_POINTS_PER_CENTROID 个样本)先使用 flat，数据量足够后重新构建。
+"""
+
+from typing import Callable, Dict, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+DEFAULT_INDEX_CONFIG = {
+    "type": "flat",
+    "nlist": 256,  # IVF 聚类中心数
+    "nprobe": 16,  # IVF 查询时搜索的聚类数
+    "pq_m": 64,  # IVF-PQ 每个向量的子向量数(必须整除维度)
+    "pq_nbits": 8,  # IVF-PQ 每个子向量编码的位数
+    "rerank": 4,  # IVF-PQ 查询时候选数与 k 的倍数，0 表示不重排(直接使用量化后的相似度)
+    "hnsw_m": 32,  # HNSW 每个节点的邻居数
+    "ef_construction": 200,  # HNSW 构建时的候选数
+    "ef_search": 128,  # HNSW 查询时的候选数
+}
+
+MIN_POINTS_PER_CENTROID = 39  # 少于该数量时 faiss 的聚类结果不可靠
+TRAIN_POINTS_PER_CENTROID = 64  # 训练样本数 = 聚类中心数 x 该值(不超过总数)
+
+
+def factory_string(index_config: Dict, dimension: int, count: int) -> str:
+    """按配置和当前项数得到 faiss.index_factory 的描述串，数据量不足以训练时返回 "Flat" """
+    index_type = index_config["type"]
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型：{index_type}，可选：{', '.join(INDEX_TYPES)}")
+    if index_type == "hnsw":
+        return f"HNSW{index_config['hnsw_m']},Flat"
+    if index_type in ("ivf_flat", "ivf_pq"):
+        if count < _train_centroids(index_config) * MIN_POINTS_PER_CENTROID:
+            return "Flat"
+        if index_type == "ivf_flat":
+            return f"IVF{index_config['nlist']},Flat"
+        if dimension % index_config["pq_m"] != 0:
+            raise ValueError(f"pq_m({index_config['pq_m']})必须整除嵌入维度({dimension})")
+        return f"IVF{index_config['nlist']},PQ{index_config['pq_m']}x{index_config['pq_nbits']}"
+    return "Flat"
+
+
+def train_size(index_config: Dict, count: int) -> int:
+    """训练所需的样本数，不需要训练时为0"""
+    if index_config["type"] not in ("ivf_flat", "ivf_pq"):
+        return 0
+    return min(count, _train_centroids(index_config) * TRAIN_POINTS_PER_CENTROID)
+
+
+def create_index(factory: str, dimension: int, index_config: Dict, train_data: np.ndarray = None):
+    """创建(并训练)空索引，train_data 为已归一化的训练样本"""
+    index = faiss.index_factory(dimension, factory, faiss.METRIC_INNER_PRODUCT)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = index_config["ef_construction"]
+    if isinstance(index, faiss.IndexIVFPQ):
+        # 多义训练只用于汉明距离过滤(这里不使用)，耗时是量化器训练的数十倍
+        index.do_polysemous_training = False
+    if not index.is_trained:
+        index.train(train_data)
+    apply_search_params(index, index_config)
+    return index
+
+
+def apply_search_params(index, index_config: Dict) -> None:
+    """设置查询参数(nprobe / efSearch)，修改配置后无需重建索引"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(index_config["nprobe"], ivf.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = index_config["ef_search"]
+
+
+def search(
+    index, queries: np.ndarray, k: int, index_config: Dict, take_vectors: Callable[[np.ndarray], np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """搜索已归一化的查询，返回 (相似度, id)，结果不足k个时id为-1
+
+    IVF-PQ 索引在 rerank > 0 时先取 k x rerank 个候选，再由 take_vectors(升序的id) 取出候选的已归一化原始向量，
+    按精确的相似度重排。
+    """
+    rerank = index_config["rerank"]
+    if not isinstance(index, faiss.IndexIVFPQ) or rerank <= 0:
+        return index.search(queries, k)
+
+    distances, candidates = index.search(queries, k * rerank)
+    valid = candidates >= 0
+    if not valid.any():
+        return distances[:, :k], candidates[:, :k]
+    unique_ids = np.unique(candidates[valid])
+    vectors = take_vectors(unique_ids)
+    # 候选在 vectors 中的行号，无效的候选(-1)随便指向一行，之后再置为 -inf
+    positions = np.searchsorted(unique_ids, np.where(valid, candidates, unique_ids[0]))
+    similarities = np.empty(candidates.shape, dtype=np.float32)
+    for i, query in enumerate(queries):
+        similarities[i] = vectors[positions[i]] @ query
+    similarities[~valid] = -np.inf
+    order = np.argsort(-similarities, axis=1, kind="stable")[:, :k]
+    ids = np.take_along_axis(candidates, order, axis=1)
+    similarities = np.take_along_axis(similarities, order, axis=1)
+    similarities[ids < 0] = -1.0
+    return similarities, ids
+
+
+def _train_centroids(index_config: Dict) -> int:
+    """训练时最多的聚类中心数(IVF 的聚类中心或 PQ 每个子量化器的中心)"""
+    centroids = index_config["nlist"]
+    if index_config["type"] == "ivf_pq":
+        centroids = max(centroids, 2 ** index_config["pq_nbits"])
+    return centroids
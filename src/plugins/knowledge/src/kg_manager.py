@@ -22,6 +22,8 @@ from .lpmmconfig import (
 
 from .global_logger import logger
 
+SYNONYM_SEARCH_BATCH = 1024  # 同义词连接时每批查询的实体数
+
 
 class KGManager:
     def __init__(self):
@@ -135,38 +137,39 @@ class KGManager:
 
         synonym_result = dict()
 
+        ent_store = embedding_manager.entities_embedding_store
         # 对每个实体节点，查找其相似的实体节点，建立扩展连接
-        for ent_hash in tqdm.tqdm(ent_hash_list):
-            if ent_hash in synonym_hash_set:
-                # 避免同一批次内重复添加
-                continue
-            ent = embedding_manager.entities_embedding_store.store.get(ent_hash)
-            assert isinstance(ent, EmbeddingStoreItem)
-            if ent is None:
-                continue
-            # 查询相似实体
-            similar_ents = embedding_manager.entities_embedding_store.search_top_k(
-                ent.embedding, global_config["rag"]["params"]["synonym_search_top_k"]
+        # 相似实体按块批量查询(faiss 并行搜索一批查询)，结果与逐个查询相同
+        progress = tqdm.tqdm(total=len(ent_hash_list))
+        for begin in range(0, len(ent_hash_list), SYNONYM_SEARCH_BATCH):
+            batch = [
+                (ent_hash, ent_store.store[ent_hash])
+                for ent_hash in ent_hash_list[begin : begin + SYNONYM_SEARCH_BATCH]
+                if ent_hash in ent_store.store
+            ]
+            batch_results = ent_store.batch_search_top_k(
+                [ent.embedding for _, ent in batch], global_config["rag"]["params"]["synonym_search_top_k"]
             )
-            res_ent = []  # Debug
-            for res_ent_hash, similarity in similar_ents:
-                if res_ent_hash == ent_hash:
-                    # 避免自连接
+            progress.update(min(SYNONYM_SEARCH_BATCH, len(ent_hash_list) - begin))
+            for (ent_hash, ent), similar_ents in zip(batch, batch_results, strict=True):
+                if ent_hash in synonym_hash_set:
+                    # 避免同一批次内重复添加
                     continue
-                if similarity < global_config["rag"]["params"]["synonym_threshold"]:
-                    # 相似度阈值
-                    continue
-                node_to_node[(res_ent_hash, ent_hash)] = similarity
-                node_to_node[(ent_hash, res_ent_hash)] = similarity
-                synonym_hash_set.add(res_ent_hash)
-                new_edge_cnt += 1
-                res_ent.append(
-                    (
-                        embedding_manager.entities_embedding_store.store[res_ent_hash].str,
-                        similarity,
-                    )
-                )  # Debug
-                synonym_result[ent.str] = res_ent
+                res_ent = []  # Debug
+                for res_ent_hash, similarity in similar_ents:
+                    if res_ent_hash == ent_hash:
+                        # 避免自连接
+                        continue
+                    if similarity < global_config["rag"]["params"]["synonym_threshold"]:
+                        # 相似度阈值
+                        continue
+                    node_to_node[(res_ent_hash, ent_hash)] = similarity
+                    node_to_node[(ent_hash, res_ent_hash)] = similarity
+                    synonym_hash_set.add(res_ent_hash)
+                    new_edge_cnt += 1
+                    res_ent.append((ent_store.store[res_ent_hash].str, similarity))  # Debug
+                    synonym_result[ent.str] = res_ent
+        progress.close()
 
         for k, v in synonym_result.items():
             print(f'"{k}"的相似实体为：{v}')
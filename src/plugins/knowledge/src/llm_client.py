@@ -1,4 +1,9 @@
-from openai import OpenAI
+import os
+
+from openai import AsyncOpenAI, OpenAI
+
+from src.common.embedding_cache import get_embedding_cache
+from .lpmmconfig import global_config
 
 
 class LLMMessage:
@@ -18,6 +23,11 @@ class LLMClient:
             base_url=url,
             api_key=api_key,
         )
+        # 用于在协程中查询(连接在首次请求时建立，属于当时的事件循环)
+        self.async_client = AsyncOpenAI(
+            base_url=url,
+            api_key=api_key,
+        )
 
     def send_chat_request(self, model, messages):
         """发送对话请求，等待返回结果"""
@@ -42,4 +52,41 @@ class LLMClient:
     def send_embedding_request(self, model, text):
         """发送嵌入请求，等待返回结果"""
         text = text.replace("\n", " ")
-        return self.client.embeddings.create(input=[text], model=model).data[0].embedding
+        cache = self._embedding_cache()
+        embedding = cache.get(model, text)
+        if embedding is None:
+            embedding = self.client.embeddings.create(input=[text], model=model).data[0].embedding
+            cache.put(model, text, embedding)
+        return embedding
+
+    async def send_embedding_request_async(self, model, text):
+        """异步发送嵌入请求，不阻塞事件循环；与 send_embedding_request 共用缓存，可以被取消"""
+        text = text.replace("\n", " ")
+        cache = self._embedding_cache()
+        embedding = cache.get(model, text)
+        if embedding is None:
+            response = await self.async_client.embeddings.create(input=[text], model=model)
+            embedding = response.data[0].embedding
+            cache.put(model, text, embedding)
+        return embedding
+
+    def send_embedding_batch_request(self, model, texts):
+        """在一次请求中获取多条文本的嵌入，返回与输入顺序一致的列表(已缓存的文本不再请求)"""
+        texts = [text.replace("\n", " ") for text in texts]
+        cache = self._embedding_cache()
+        embeddings = cache.get_many(model, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            response = self.client.embeddings.create(input=[texts[i] for i in missing], model=model)
+            if len(response.data) != len(missing):
+                raise ValueError(f"嵌入请求返回了{len(response.data)}条结果，预期{len(missing)}条")
+            # 按 index 还原顺序
+            for item in sorted(response.data, key=lambda item: item.index):
+                i = missing[item.index]
+                embeddings[i] = item.embedding
+                cache.put(model, texts[i], item.embedding)
+        return embeddings
+
+    @staticmethod
+    def _embedding_cache():
+        return get_embedding_cache(os.path.join(global_config["persistence"]["data_root_path"], "embedding_cache"))
@@ -54,7 +54,12 @@ def _load_config(config, config_file_path):
         config["rdf_build"] = file_config["rdf_build"]
 
     if "embedding" in file_config:
-        config["embedding"] = file_config["embedding"]
+        # 合并默认值，旧配置文件中没有的导入参数使用默认设置
+        config["embedding"] = {**config["embedding"], **file_config["embedding"]}
+
+    if "index" in file_config:
+        # 可选，未配置的命名空间和参数使用 faiss_index.DEFAULT_INDEX_CONFIG
+        config["index"] = file_config["index"]
 
     if "rag" in file_config:
         config["rag"] = file_config["rag"]
@@ -100,6 +105,9 @@ global_config = dict(
             "provider": "localhost",
             "model": "Pro/BAAI/bge-m3",
             "dimension": 1024,
+            "batch_size": 32,
+            "workers": 4,
+            "max_retries": 5,
         },
         "rag": {
             "params": {
@@ -1,4 +1,6 @@
+import asyncio
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, List, Dict, Optional
 
 from .global_logger import logger
@@ -30,9 +32,10 @@ class QAManager:
             "filter": llm_client_filter,
             "qa": llm_client_qa,
         }
+        self._executor = None  # 异步查询的检索线程，首次使用时创建
 
     def process_query(self, question: str) -> Tuple[List[Tuple[str, float, float]], Optional[Dict[str, float]]]:
-        """处理查询"""
+        """处理查询(同步，会阻塞调用线程；在协程中请使用 process_query_async)"""
 
         # 生成问题的Embedding
         part_start_time = time.perf_counter()
@@ -42,69 +45,122 @@ class QAManager:
         part_end_time = time.perf_counter()
         logger.debug(f"Embedding用时：{part_end_time - part_start_time:.5f}s")
 
-        # 根据问题Embedding查询Relation Embedding库
+        relation_search_res = self._search_relations(question_embedding)
+        if relation_search_res is None:
+            return None
+        paragraph_search_res = self._search_paragraphs(question_embedding)
+        return self._rank_paragraphs(relation_search_res, paragraph_search_res)
+
+    async def process_query_async(
+        self, question: str
+    ) -> Tuple[List[Tuple[str, float, float]], Optional[Dict[str, float]]]:
+        """处理查询，结果与 process_query 相同
+
+        问题的Embedding通过异步客户端获取，向量检索和PageRank在查询专用线程中分步执行，不阻塞事件循环。
+        调用方被取消时，正在进行的Embedding请求随之取消，尚未开始的检索步骤不再执行
+        (已在线程中开始的一步会执行完，但结果被丢弃)。
+        """
+        part_start_time = time.perf_counter()
+        question_embedding = await self.llm_client_list["embedding"].send_embedding_request_async(
+            global_config["embedding"]["model"], question
+        )
+        part_end_time = time.perf_counter()
+        logger.debug(f"Embedding用时：{part_end_time - part_start_time:.5f}s")
+
+        relation_search_res = await self._run_in_executor(self._search_relations, question_embedding)
+        if relation_search_res is None:
+            return None
+        paragraph_search_res = await self._run_in_executor(self._search_paragraphs, question_embedding)
+        return await self._run_in_executor(self._rank_paragraphs, relation_search_res, paragraph_search_res)
+
+    async def _run_in_executor(self, func, *args):
+        """在查询专用线程中执行CPU密集的检索步骤
+
+        检索只读取嵌入库和KG，线程只有一个，多个查询的检索步骤依次执行。
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lpmm-query")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _search_relations(self, question_embedding: List[float]) -> Optional[List[Tuple[str, float]]]:
+        """根据问题Embedding查询Relation Embedding库，索引尚未构建时返回None"""
         part_start_time = time.perf_counter()
         relation_search_res = self.embed_manager.relation_embedding_store.search_top_k(
             question_embedding,
             global_config["qa"]["params"]["relation_search_top_k"],
         )
-        if relation_search_res is not None:
-            # 过滤阈值
-            # 考虑动态阈值：当存在显著数值差异的结果时，保留显著结果；否则，保留所有结果
-            relation_search_res = dyn_select_top_k(relation_search_res, 0.5, 1.0)
-            if relation_search_res[0][1] < global_config["qa"]["params"]["relation_threshold"]:
-                # 未找到相关关系
-                relation_search_res = []
+        if relation_search_res is None:
+            return None
+        # 过滤阈值
+        # 考虑动态阈值：当存在显著数值差异的结果时，保留显著结果；否则，保留所有结果
+        relation_search_res = dyn_select_top_k(relation_search_res, 0.5, 1.0)
+        if relation_search_res[0][1] < global_config["qa"]["params"]["relation_threshold"]:
+            # 未找到相关关系
+            relation_search_res = []
 
-            part_end_time = time.perf_counter()
-            logger.debug(f"关系检索用时：{part_end_time - part_start_time:.5f}s")
+        part_end_time = time.perf_counter()
+        logger.debug(f"关系检索用时：{part_end_time - part_start_time:.5f}s")
 
-            for res in relation_search_res:
-                rel_str = self.embed_manager.relation_embedding_store.store.get(res[0]).str
-                print(f"找到相关关系，相似度：{(res[1] * 100):.2f}%  -  {rel_str}")
+        for res in relation_search_res:
+            rel_str = self.embed_manager.relation_embedding_store.store.get(res[0]).str
+            print(f"找到相关关系，相似度：{(res[1] * 100):.2f}%  -  {rel_str}")
 
-            # TODO: 使用LLM过滤三元组结果
-            # logger.info(f"LLM过滤三元组用时：{time.time() - part_start_time:.2f}s")
-            # part_start_time = time.time()
+        # TODO: 使用LLM过滤三元组结果
+        # logger.info(f"LLM过滤三元组用时：{time.time() - part_start_time:.2f}s")
+        # part_start_time = time.time()
+        return relation_search_res
 
-            # 根据问题Embedding查询Paragraph Embedding库
+    def _search_paragraphs(self, question_embedding: List[float]) -> List[Tuple[str, float]]:
+        """根据问题Embedding查询Paragraph Embedding库"""
+        part_start_time = time.perf_counter()
+        paragraph_search_res = self.embed_manager.paragraphs_embedding_store.search_top_k(
+            question_embedding,
+            global_config["qa"]["params"]["paragraph_search_top_k"],
+        )
+        part_end_time = time.perf_counter()
+        logger.debug(f"文段检索用时：{part_end_time - part_start_time:.5f}s")
+        return paragraph_search_res
+
+    def _rank_paragraphs(
+        self,
+        relation_search_res: List[Tuple[str, float]],
+        paragraph_search_res: List[Tuple[str, float]],
+    ) -> Tuple[List[Tuple[str, float, float]], Optional[Dict[str, float]]]:
+        """找到相关关系时使用KG检索(PageRank)，否则直接使用文段检索结果"""
+        if len(relation_search_res) != 0:
+            logger.info("找到相关关系，将使用RAG进行检索")
+            # 使用KG检索
             part_start_time = time.perf_counter()
-            paragraph_search_res = self.embed_manager.paragraphs_embedding_store.search_top_k(
-                question_embedding,
-                global_config["qa"]["params"]["paragraph_search_top_k"],
+            result, ppr_node_weights = self.kg_manager.kg_search(
+                relation_search_res, paragraph_search_res, self.embed_manager
             )
             part_end_time = time.perf_counter()
-            logger.debug(f"文段检索用时：{part_end_time - part_start_time:.5f}s")
-
-            if len(relation_search_res) != 0:
-                logger.info("找到相关关系，将使用RAG进行检索")
-                # 使用KG检索
-                part_start_time = time.perf_counter()
-                result, ppr_node_weights = self.kg_manager.kg_search(
-                    relation_search_res, paragraph_search_res, self.embed_manager
-                )
-                part_end_time = time.perf_counter()
-                logger.info(f"RAG检索用时：{part_end_time - part_start_time:.5f}s")
-            else:
-                logger.info("未找到相关关系，将使用文段检索结果")
-                result = paragraph_search_res
-                ppr_node_weights = None
+            logger.info(f"RAG检索用时：{part_end_time - part_start_time:.5f}s")
+        else:
+            logger.info("未找到相关关系，将使用文段检索结果")
+            result = paragraph_search_res
+            ppr_node_weights = None
 
-            # 过滤阈值
-            result = dyn_select_top_k(result, 0.5, 1.0)
+        # 过滤阈值
+        result = dyn_select_top_k(result, 0.5, 1.0)
 
-            for res in result:
-                raw_paragraph = self.embed_manager.paragraphs_embedding_store.store[res[0]].str
-                print(f"找到相关文段，相关系数：{res[1]:.8f}\n{raw_paragraph}\n\n")
+        for res in result:
+            raw_paragraph = self.embed_manager.paragraphs_embedding_store.store[res[0]].str
+            print(f"找到相关文段，相关系数：{res[1]:.8f}\n{raw_paragraph}\n\n")
 
-            return result, ppr_node_weights
-        else:
-            return None
+        return result, ppr_node_weights
 
     def get_knowledge(self, question: str) -> str:
-        """获取知识"""
+        """获取知识(同步，在协程中请使用 get_knowledge_async)"""
         # 处理查询
-        processed_result = self.process_query(question)
+        return self._format_knowledge(self.process_query(question))
+
+    async def get_knowledge_async(self, question: str) -> str:
+        """获取知识，不阻塞事件循环，可以被取消(见 process_query_async)"""
+        return self._format_knowledge(await self.process_query_async(question))
+
+    def _format_knowledge(self, processed_result) -> Optional[str]:
         if processed_result is not None:
             query_res = processed_result[0]
             knowledge = [
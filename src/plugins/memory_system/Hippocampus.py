@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import bisect
 import datetime
 import math
+import os
 import random
 import time
 import re
@@ -10,16 +13,24 @@ import jieba
 import networkx as nx
 import numpy as np
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import DeleteMany, ReturnDocument, UpdateMany, UpdateOne
 from ...common.database import db
 from ...plugins.models.utils_model import LLMRequest
 from src.common.logger_manager import get_logger
 from src.plugins.memory_system.sample_distribution import MemoryBuildScheduler  # 分布生成器
 from ..utils.chat_message_builder import (
-    get_raw_msg_by_timestamp,
+    get_raw_msg_by_timestamp_ranges,
     build_readable_messages,
 )  # 导入 build_readable_messages
+from ...common.message_repository import increment_memorized_times
 from ..chat.utils import translate_timestamp_to_human_readable
 from .memory_config import MemoryConfig
+from .topic_index import TopicTokenIndex
+from .graph_snapshot import MemoryGraphSnapshot
+from .node_matcher import NodeNameMatcher
+from .item_dedup import NearDuplicateFinder, item_similarity
+from .graph_file import encode_graph_snapshot, load_graph_snapshot, read_graph_snapshot_version, write_graph_snapshot
 
 
 def calculate_information_content(text):
@@ -52,6 +63,85 @@ logger = get_logger("memory")
 class MemoryGraph:
     def __init__(self):
         self.G = nx.Graph()  # 使用 networkx 的图结构
+        self.topic_index = TopicTokenIndex()  # 话题分词倒排索引，随节点增删同步更新
+        self.node_matcher = NodeNameMatcher()  # 节点名匹配自动机，随节点增删同步更新
+        # 自上次同步数据库以来发生变化(新增/修改/删除)的节点和边，同步时按图中的当前状态写入或删除
+        self.dirty_nodes = set()
+        self.dirty_edges = set()
+        # 只读检索快照及其失效信息：结构变化需要重建，仅记忆项/强度变化可以修补
+        self.version = 0
+        self._snapshot = None
+        self._snapshot_structure_changed = True
+        self._snapshot_nodes = set()
+        self._snapshot_edges = set()
+
+    @staticmethod
+    def edge_key(concept1, concept2) -> tuple:
+        """无向边的规范化键"""
+        return (concept1, concept2) if concept1 <= concept2 else (concept2, concept1)
+
+    def mark_node_dirty(self, concept):
+        self.dirty_nodes.add(concept)
+        self._snapshot_nodes.add(concept)
+        self.version += 1
+
+    def mark_edge_dirty(self, concept1, concept2):
+        key = self.edge_key(concept1, concept2)
+        self.dirty_edges.add(key)
+        self._snapshot_edges.add(key)
+        self.version += 1
+
+    def mark_structure_changed(self):
+        """节点或边发生增删，快照需要整体重建"""
+        self._snapshot_structure_changed = True
+        self.version += 1
+
+    def get_snapshot(self) -> MemoryGraphSnapshot:
+        """获取与当前图一致的只读快照，必要时重建或修补"""
+        if self._snapshot is not None and self._snapshot.version == self.version:
+            return self._snapshot
+
+        snapshot = None
+        if self._snapshot is not None and not self._snapshot_structure_changed:
+            changed_nodes = {}
+            for concept in self._snapshot_nodes:
+                memory_items = self.G.nodes[concept].get("memory_items", [])
+                if not isinstance(memory_items, list):
+                    memory_items = [memory_items] if memory_items else []
+                changed_nodes[concept] = memory_items
+            changed_edges = {key: self.G.edges[key].get("strength", 1) for key in self._snapshot_edges}
+            snapshot = self._snapshot.patched(changed_nodes, changed_edges, self.version)
+        if snapshot is None:
+            snapshot = MemoryGraphSnapshot.from_graph(self.G, self.version)
+
+        self._snapshot = snapshot
+        self._snapshot_structure_changed = False
+        self._snapshot_nodes.clear()
+        self._snapshot_edges.clear()
+        return snapshot
+
+    def pop_changes(self) -> tuple[set, set]:
+        """取出并清空自上次同步以来的变更集合"""
+        dirty_nodes, dirty_edges = self.dirty_nodes, self.dirty_edges
+        self.dirty_nodes, self.dirty_edges = set(), set()
+        return dirty_nodes, dirty_edges
+
+    def restore_changes(self, dirty_nodes: set, dirty_edges: set):
+        """同步失败时将变更放回，等待下次同步"""
+        self.dirty_nodes |= dirty_nodes
+        self.dirty_edges |= dirty_edges
+
+    def _add_edge(self, concept1, concept2, **attr):
+        """添加或覆盖一条边，add_edge 可能隐式创建节点，同时维护索引和变更记录"""
+        for concept in (concept1, concept2):
+            if concept not in self.G:
+                self.topic_index.add(concept)
+                self.node_matcher.add(concept)
+                self.mark_node_dirty(concept)
+        if not self.G.has_edge(concept1, concept2):
+            self.mark_structure_changed()
+        self.G.add_edge(concept1, concept2, **attr)
+        self.mark_edge_dirty(concept1, concept2)
 
     def connect_dot(self, concept1, concept2):
         # 避免自连接
@@ -65,9 +155,10 @@ class MemoryGraph:
             self.G[concept1][concept2]["strength"] = self.G[concept1][concept2].get("strength", 1) + 1
             # 更新最后修改时间
             self.G[concept1][concept2]["last_modified"] = current_time
+            self.mark_edge_dirty(concept1, concept2)
         else:
             # 如果是新边,初始化 strength 为 1
-            self.G.add_edge(
+            self._add_edge(
                 concept1,
                 concept2,
                 strength=1,
@@ -75,6 +166,22 @@ class MemoryGraph:
                 last_modified=current_time,
             )  # 添加最后修改时间
 
+    def set_edge(self, concept1, concept2, strength, current_time):
+        """直接设置两个节点间的连接强度(覆盖已有的边)"""
+        self._add_edge(
+            concept1,
+            concept2,
+            strength=strength,
+            created_time=current_time,
+            last_modified=current_time,
+        )
+
+    def remove_edge(self, concept1, concept2):
+        """移除一条边，并记录变更"""
+        self.G.remove_edge(concept1, concept2)
+        self.mark_edge_dirty(concept1, concept2)
+        self.mark_structure_changed()
+
     def add_dot(self, concept, memory):
         current_time = datetime.datetime.now().timestamp()
 
@@ -99,6 +206,27 @@ class MemoryGraph:
                 created_time=current_time,  # 添加创建时间
                 last_modified=current_time,
             )  # 添加最后修改时间
+            self.topic_index.add(concept)
+            self.node_matcher.add(concept)
+            self.mark_structure_changed()
+        self.mark_node_dirty(concept)
+
+    def remove_dot(self, concept):
+        """移除节点及其所有连接，并同步更新索引和变更记录"""
+        neighbors = list(self.G.neighbors(concept)) if concept in self.G else []
+        self.G.remove_node(concept)
+        self.topic_index.remove(concept)
+        self.node_matcher.remove(concept)
+        self.mark_node_dirty(concept)
+        self.mark_structure_changed()
+        for neighbor in neighbors:
+            self.mark_edge_dirty(concept, neighbor)
+
+    def rebuild_index(self):
+        """按当前图中的节点重建话题索引和节点名匹配器并使快照失效，用于整体加载图之后"""
+        self.topic_index.rebuild(self.G.nodes())
+        self.node_matcher.rebuild(self.G.nodes())
+        self.mark_structure_changed()
 
     def get_dot(self, concept):
         # 检查节点是否存在于图中
@@ -175,9 +303,10 @@ class MemoryGraph:
                 # 更新节点的记忆项
                 if memory_items:
                     self.G.nodes[topic]["memory_items"] = memory_items
+                    self.mark_node_dirty(topic)
                 else:
                     # 如果没有记忆项了，删除整个节点
-                    self.G.remove_node(topic)
+                    self.remove_dot(topic)
 
                 return removed_item
 
@@ -193,6 +322,8 @@ class Hippocampus:
         self.entorhinal_cortex = None
         self.parahippocampal_gyrus = None
         self.config = None
+        self._retrieval_executor = None
+        self._matcher_compile = None  # 正在检索线程中编译的节点名自动机
 
     def initialize(self, global_config):
         # 使用导入的 MemoryConfig dataclass 和其 from_global_config 方法
@@ -271,32 +402,17 @@ class Hippocampus:
         if not keyword:
             return []
 
-        # 获取所有节点
-        all_nodes = list(self.memory_graph.G.nodes())
         memories = []
 
-        # 计算关键词的词集合
-        keyword_words = set(jieba.cut(keyword))
-
-        # 遍历所有节点，计算相似度
-        for node in all_nodes:
-            node_words = set(jieba.cut(node))
-            all_words = keyword_words | node_words
-            v1 = [1 if word in keyword_words else 0 for word in all_words]
-            v2 = [1 if word in node_words else 0 for word in all_words]
-            similarity = cosine_similarity(v1, v2)
-
-            # 如果相似度超过阈值，获取该节点的记忆
-            if similarity >= 0.3:  # 可以调整这个阈值
-                node_data = self.memory_graph.G.nodes[node]
-                memory_items = node_data.get("memory_items", [])
-                if not isinstance(memory_items, list):
-                    memory_items = [memory_items] if memory_items else []
+        # 通过倒排索引只计算与关键词有共同分词的节点，结果已按相似度降序排列
+        for node, similarity in self.memory_graph.topic_index.search(keyword, 0.3):  # 可以调整这个阈值
+            node_data = self.memory_graph.G.nodes[node]
+            memory_items = node_data.get("memory_items", [])
+            if not isinstance(memory_items, list):
+                memory_items = [memory_items] if memory_items else []
 
-                memories.append((node, memory_items, similarity))
+            memories.append((node, memory_items, similarity))
 
-        # 按相似度降序排序
-        memories.sort(key=lambda x: x[2], reverse=True)
         return memories
 
     async def get_memory_from_text(
@@ -309,6 +425,8 @@ class Hippocampus:
     ) -> list:
         """从文本中提取关键词并获取相关记忆。
 
+        分词和扩散检索在独立的检索线程中基于只读快照完成，不阻塞事件循环。
+
         Args:
             text (str): 输入文本
             max_memory_num (int, optional): 返回的记忆条目数量上限。默认为3，表示最多返回3条与输入文本相关度最高的记忆。
@@ -316,7 +434,8 @@ class Hippocampus:
             max_depth (int, optional): 记忆检索深度。默认为3。值越大，检索范围越广，可以获取更多间接相关的记忆，但速度会变慢。
             fast_retrieval (bool, optional): 是否使用快速检索。默认为False。
                 如果为True，使用jieba分词和TF-IDF提取关键词，速度更快但可能不够准确。
-                如果为False，使用LLM提取关键词，速度较慢但更准确。
+                如果为False，按配置 memory_keyword_mode 使用LLM提取关键词(较慢但更准确)，
+                或用节点名自动机直接找出文本中提到的所有记忆节点(不调用LLM)。
 
         Returns:
             list: 记忆列表，每个元素是一个元组 (topic, memory_items, similarity)
@@ -327,179 +446,11 @@ class Hippocampus:
         if not text:
             return []
 
-        if fast_retrieval:
-            # 使用jieba分词提取关键词
-            words = jieba.cut(text)
-            # 过滤掉停用词和单字词
-            keywords = [word for word in words if len(word) > 1]
-            # 去重
-            keywords = list(set(keywords))
-            # 限制关键词数量
-            keywords = keywords[:5]
-        else:
-            # 使用LLM提取关键词
-            topic_num = min(5, max(1, int(len(text) * 0.1)))  # 根据文本长度动态调整关键词数量
-            # logger.info(f"提取关键词数量: {topic_num}")
-            topics_response = await self.llm_topic_judge.generate_response(self.find_topic_llm(text, topic_num))
-
-            # 提取关键词
-            keywords = re.findall(r"<([^>]+)>", topics_response[0])
-            if not keywords:
-                keywords = []
-            else:
-                keywords = [
-                    keyword.strip()
-                    for keyword in ",".join(keywords).replace("，", ",").replace("、", ",").replace(" ", ",").split(",")
-                    if keyword.strip()
-                ]
-
-        # logger.info(f"提取的关键词: {', '.join(keywords)}")
-
-        # 过滤掉不存在于记忆图中的关键词
-        valid_keywords = [keyword for keyword in keywords if keyword in self.memory_graph.G]
-        if not valid_keywords:
-            # logger.info("没有找到有效的关键词节点")
-            return []
-
-        logger.debug(f"有效的关键词: {', '.join(valid_keywords)}")
-
-        # 从每个关键词获取记忆
-        all_memories = []
-        activate_map = {}  # 存储每个词的累计激活值
-
-        # 对每个关键词进行扩散式检索
-        for keyword in valid_keywords:
-            logger.debug(f"开始以关键词 '{keyword}' 为中心进行扩散检索 (最大深度: {max_depth}):")
-            # 初始化激活值
-            activation_values = {keyword: 1.0}
-            # 记录已访问的节点
-            visited_nodes = {keyword}
-            # 待处理的节点队列，每个元素是(节点, 激活值, 当前深度)
-            nodes_to_process = [(keyword, 1.0, 0)]
-
-            while nodes_to_process:
-                current_node, current_activation, current_depth = nodes_to_process.pop(0)
-
-                # 如果激活值小于0或超过最大深度，停止扩散
-                if current_activation <= 0 or current_depth >= max_depth:
-                    continue
-
-                # 获取当前节点的所有邻居
-                neighbors = list(self.memory_graph.G.neighbors(current_node))
-
-                for neighbor in neighbors:
-                    if neighbor in visited_nodes:
-                        continue
-
-                    # 获取连接强度
-                    edge_data = self.memory_graph.G[current_node][neighbor]
-                    strength = edge_data.get("strength", 1)
-
-                    # 计算新的激活值
-                    new_activation = current_activation - (1 / strength)
-
-                    if new_activation > 0:
-                        activation_values[neighbor] = new_activation
-                        visited_nodes.add(neighbor)
-                        nodes_to_process.append((neighbor, new_activation, current_depth + 1))
-                        logger.trace(
-                            f"节点 '{neighbor}' 被激活，激活值: {new_activation:.2f} (通过 '{current_node}' 连接，强度: {strength}, 深度: {current_depth + 1})"
-                        )  # noqa: E501
-
-            # 更新激活映射
-            for node, activation_value in activation_values.items():
-                if activation_value > 0:
-                    if node in activate_map:
-                        activate_map[node] += activation_value
-                    else:
-                        activate_map[node] = activation_value
-
-        # 输出激活映射
-        # logger.info("激活映射统计:")
-        # for node, total_activation in sorted(activate_map.items(), key=lambda x: x[1], reverse=True):
-        #     logger.info(f"节点 '{node}': 累计激活值 = {total_activation:.2f}")
-
-        # 基于激活值平方的独立概率选择
-        remember_map = {}
-        # logger.info("基于激活值平方的归一化选择:")
-
-        # 计算所有激活值的平方和
-        total_squared_activation = sum(activation**2 for activation in activate_map.values())
-        if total_squared_activation > 0:
-            # 计算归一化的激活值
-            normalized_activations = {
-                node: (activation**2) / total_squared_activation for node, activation in activate_map.items()
-            }
-
-            # 按归一化激活值排序并选择前max_memory_num个
-            sorted_nodes = sorted(normalized_activations.items(), key=lambda x: x[1], reverse=True)[:max_memory_num]
-
-            # 将选中的节点添加到remember_map
-            for node, normalized_activation in sorted_nodes:
-                remember_map[node] = activate_map[node]  # 使用原始激活值
-                logger.debug(
-                    f"节点 '{node}' (归一化激活值: {normalized_activation:.2f}, 激活值: {activate_map[node]:.2f})"
-                )
-        else:
-            logger.info("没有有效的激活值")
-
-        # 从选中的节点中提取记忆
-        all_memories = []
-        # logger.info("开始从选中的节点中提取记忆:")
-        for node, activation in remember_map.items():
-            logger.debug(f"处理节点 '{node}' (激活值: {activation:.2f}):")
-            node_data = self.memory_graph.G.nodes[node]
-            memory_items = node_data.get("memory_items", [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-
-            if memory_items:
-                logger.debug(f"节点包含 {len(memory_items)} 条记忆")
-                # 计算每条记忆与输入文本的相似度
-                memory_similarities = []
-                for memory in memory_items:
-                    # 计算与输入文本的相似度
-                    memory_words = set(jieba.cut(memory))
-                    text_words = set(jieba.cut(text))
-                    all_words = memory_words | text_words
-                    v1 = [1 if word in memory_words else 0 for word in all_words]
-                    v2 = [1 if word in text_words else 0 for word in all_words]
-                    similarity = cosine_similarity(v1, v2)
-                    memory_similarities.append((memory, similarity))
-
-                # 按相似度排序
-                memory_similarities.sort(key=lambda x: x[1], reverse=True)
-                # 获取最匹配的记忆
-                top_memories = memory_similarities[:max_memory_length]
-
-                # 添加到结果中
-                for memory, similarity in top_memories:
-                    all_memories.append((node, [memory], similarity))
-                    # logger.info(f"选中记忆: {memory} (相似度: {similarity:.2f})")
-            else:
-                logger.info("节点没有记忆")
-
-        # 去重（基于记忆内容）
-        logger.debug("开始记忆去重:")
-        seen_memories = set()
-        unique_memories = []
-        for topic, memory_items, activation_value in all_memories:
-            memory = memory_items[0]  # 因为每个topic只有一条记忆
-            if memory not in seen_memories:
-                seen_memories.add(memory)
-                unique_memories.append((topic, memory_items, activation_value))
-                logger.debug(f"保留记忆: {memory} (来自节点: {topic}, 激活值: {activation_value:.2f})")
-            else:
-                logger.debug(f"跳过重复记忆: {memory} (来自节点: {topic})")
-
-        # 转换为(关键词, 记忆)格式
-        result = []
-        for topic, memory_items, _ in unique_memories:
-            memory = memory_items[0]  # 因为每个topic只有一条记忆
-            result.append((topic, memory))
-            logger.info(f"选中记忆: {memory} (来自节点: {topic})")
-
-        return result
+        keywords = await self._prepare_keywords(text, fast_retrieval)
+        snapshot = self.memory_graph.get_snapshot()
+        return await self._run_retrieval(
+            self._memory_from_text, snapshot, text, keywords, max_memory_num, max_memory_length, max_depth
+        )
 
     async def get_memory_from_topic(
         self,
@@ -525,66 +476,190 @@ class Hippocampus:
         if not keywords:
             return []
 
+        snapshot = self.memory_graph.get_snapshot()
+        return await self._run_retrieval(
+            self._select_memories, snapshot, keywords, set(keywords), max_memory_num, max_memory_length, max_depth
+        )
+
+    async def get_activate_from_text(self, text: str, max_depth: int = 3, fast_retrieval: bool = False) -> float:
+        """从文本中提取关键词并获取相关记忆。
+
+        分词和扩散激活在独立的检索线程中基于只读快照完成，不阻塞事件循环。
+
+        Args:
+            text (str): 输入文本
+            max_depth (int, optional): 记忆检索深度。默认为2。
+            fast_retrieval (bool, optional): 是否使用快速检索。默认为False。
+                如果为True，使用jieba分词和TF-IDF提取关键词，速度更快但可能不够准确。
+                如果为False，按配置 memory_keyword_mode 使用LLM提取关键词(较慢但更准确)，
+                或用节点名自动机直接找出文本中提到的所有记忆节点(不调用LLM)。
+
+        Returns:
+            float: 激活节点数与总节点数的比值
+        """
+        if not text:
+            return 0
+
+        keywords = await self._prepare_keywords(text, fast_retrieval)
+        snapshot = self.memory_graph.get_snapshot()
+        return await self._run_retrieval(self._activate_from_text, snapshot, text, keywords, max_depth)
+
+    async def _run_retrieval(self, func, *args):
+        """在检索专用线程中执行只读快照上的计算
+
+        快照在事件循环线程中取得，之后不会被修改，检索线程无需加锁。
+        检索线程只有一个，CPU 密集的检索依次执行，事件循环线程在其间仍能按 GIL 切换间隔获得执行机会。
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_retrieval_executor(), func, *args)
+
+    def _get_retrieval_executor(self) -> ThreadPoolExecutor:
+        if self._retrieval_executor is None:
+            self._retrieval_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-retrieval")
+        return self._retrieval_executor
+
+    async def _prepare_keywords(self, text: str, fast_retrieval: bool):
+        """确定关键词来源
+
+        LLM 模式在这里直接得到关键词列表；jieba 分词和节点名匹配返回提取函数，留到检索线程中执行。
+        匹配用的自动机在事件循环线程中取得，之后不会被修改。
+        """
+        if fast_retrieval:
+            return self._extract_keywords_fast
+        if self.config.memory_keyword_mode == "match":
+            return (await self._get_node_automaton()).find_all
+        return await self._extract_keywords_llm(text)
+
+    async def _get_node_automaton(self):
+        """节点名自动机
+
+        图结构变化后在检索线程中重新编译(10 万节点约需 1 秒)，编译完成前继续使用上一个自动机，
+        只有从未编译过时才等待编译结果。编译使用取出的节点名，不访问事件循环线程中仍在修改的字典树。
+        """
+        matcher = self.memory_graph.node_matcher
+        if not matcher.is_compiled() and self._matcher_compile is None:
+            version = matcher.version
+            loop = asyncio.get_running_loop()
+            self._matcher_compile = loop.run_in_executor(
+                self._get_retrieval_executor(), NodeNameMatcher.compile_names, matcher.names()
+            )
+            self._matcher_compile.add_done_callback(lambda future: self._on_matcher_compiled(version, future))
+
+        automaton = matcher.latest_automaton()
+        if automaton is None:
+            # 调用方被取消时不取消编译，之后的检索仍需要结果
+            automaton = await asyncio.shield(self._matcher_compile)
+        return automaton
+
+    def _on_matcher_compiled(self, version: int, future: asyncio.Future):
+        """在事件循环线程中执行(asyncio.Future 的回调)"""
+        self._matcher_compile = None
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error(f"编译节点名自动机失败: {future.exception()}")
+            return
+        self.memory_graph.node_matcher.set_automaton(version, future.result())
+
+    async def _extract_keywords_llm(self, text: str) -> list:
+        """使用LLM提取关键词"""
+        topic_num = min(5, max(1, int(len(text) * 0.1)))  # 根据文本长度动态调整关键词数量
+        # logger.info(f"提取关键词数量: {topic_num}")
+        topics_response = await self.llm_topic_judge.generate_response(self.find_topic_llm(text, topic_num))
+
+        # 提取关键词
+        keywords = re.findall(r"<([^>]+)>", topics_response[0])
+        if not keywords:
+            return []
+        return [
+            keyword.strip()
+            for keyword in ",".join(keywords).replace("，", ",").replace("、", ",").replace(" ", ",").split(",")
+            if keyword.strip()
+        ]
+
+    @staticmethod
+    def _extract_keywords_fast(text: str) -> list:
+        """使用jieba分词提取关键词"""
+        words = jieba.cut(text)
+        # 过滤掉停用词和单字词
+        keywords = [word for word in words if len(word) > 1]
+        # 去重
+        keywords = list(set(keywords))
+        # 限制关键词数量
+        return keywords[:5]
+
+    def _memory_from_text(
+        self,
+        snapshot: MemoryGraphSnapshot,
+        text: str,
+        keywords,
+        max_memory_num: int,
+        max_memory_length: int,
+        max_depth: int,
+    ) -> list:
+        """get_memory_from_text 在检索线程中执行的部分"""
+        if callable(keywords):
+            keywords = keywords(text)
+        # logger.info(f"提取的关键词: {', '.join(keywords)}")
+        return self._select_memories(
+            snapshot, keywords, set(jieba.cut(text)), max_memory_num, max_memory_length, max_depth
+        )
+
+    def _activate_from_text(self, snapshot: MemoryGraphSnapshot, text: str, keywords, max_depth: int) -> float:
+        """get_activate_from_text 在检索线程中执行的部分"""
+        if callable(keywords):
+            keywords = keywords(text)
         # logger.info(f"提取的关键词: {', '.join(keywords)}")
 
         # 过滤掉不存在于记忆图中的关键词
-        valid_keywords = [keyword for keyword in keywords if keyword in self.memory_graph.G]
+        valid_keywords = [keyword for keyword in keywords if keyword in snapshot]
+        if not valid_keywords:
+            # logger.info("没有找到有效的关键词节点")
+            return 0
+
+        logger.debug(f"有效的关键词: {', '.join(valid_keywords)}")
+
+        # 对每个关键词在只读快照上进行扩散式检索，得到每个词的累计激活值
+        logger.trace(f"开始以关键词 {valid_keywords} 为中心进行扩散检索 (最大深度: {max_depth})")
+        activate_map = snapshot.activate(valid_keywords, max_depth)
+
+        # 输出激活映射
+        # logger.info("激活映射统计:")
+        # for node, total_activation in sorted(activate_map.items(), key=lambda x: x[1], reverse=True):
+        #     logger.info(f"节点 '{node}': 累计激活值 = {total_activation:.2f}")
+
+        # 计算激活节点数与总节点数的比值
+        total_activation = sum(activate_map.values())
+        logger.trace(f"总激活值: {total_activation:.2f}")
+        total_nodes = len(snapshot)
+        # activated_nodes = len(activate_map)
+        activation_ratio = total_activation / total_nodes if total_nodes > 0 else 0
+        activation_ratio = activation_ratio * 60
+        logger.info(f"总激活值: {total_activation:.2f}, 总节点数: {total_nodes}, 激活: {activation_ratio}")
+
+        return activation_ratio
+
+    def _select_memories(
+        self,
+        snapshot: MemoryGraphSnapshot,
+        keywords: list,
+        text_words: set,
+        max_memory_num: int,
+        max_memory_length: int,
+        max_depth: int,
+    ) -> list:
+        """以关键词为中心在快照上扩散检索，按激活值选出节点，再按与 text_words 的相似度挑选记忆"""
+        # 过滤掉不存在于记忆图中的关键词
+        valid_keywords = [keyword for keyword in keywords if keyword in snapshot]
         if not valid_keywords:
             # logger.info("没有找到有效的关键词节点")
             return []
 
         logger.debug(f"有效的关键词: {', '.join(valid_keywords)}")
 
-        # 从每个关键词获取记忆
-        all_memories = []
-        activate_map = {}  # 存储每个词的累计激活值
-
-        # 对每个关键词进行扩散式检索
-        for keyword in valid_keywords:
-            logger.debug(f"开始以关键词 '{keyword}' 为中心进行扩散检索 (最大深度: {max_depth}):")
-            # 初始化激活值
-            activation_values = {keyword: 1.0}
-            # 记录已访问的节点
-            visited_nodes = {keyword}
-            # 待处理的节点队列，每个元素是(节点, 激活值, 当前深度)
-            nodes_to_process = [(keyword, 1.0, 0)]
-
-            while nodes_to_process:
-                current_node, current_activation, current_depth = nodes_to_process.pop(0)
-
-                # 如果激活值小于0或超过最大深度，停止扩散
-                if current_activation <= 0 or current_depth >= max_depth:
-                    continue
-
-                # 获取当前节点的所有邻居
-                neighbors = list(self.memory_graph.G.neighbors(current_node))
-
-                for neighbor in neighbors:
-                    if neighbor in visited_nodes:
-                        continue
-
-                    # 获取连接强度
-                    edge_data = self.memory_graph.G[current_node][neighbor]
-                    strength = edge_data.get("strength", 1)
-
-                    # 计算新的激活值
-                    new_activation = current_activation - (1 / strength)
-
-                    if new_activation > 0:
-                        activation_values[neighbor] = new_activation
-                        visited_nodes.add(neighbor)
-                        nodes_to_process.append((neighbor, new_activation, current_depth + 1))
-                        logger.trace(
-                            f"节点 '{neighbor}' 被激活，激活值: {new_activation:.2f} (通过 '{current_node}' 连接，强度: {strength}, 深度: {current_depth + 1})"
-                        )  # noqa: E501
-
-            # 更新激活映射
-            for node, activation_value in activation_values.items():
-                if activation_value > 0:
-                    if node in activate_map:
-                        activate_map[node] += activation_value
-                    else:
-                        activate_map[node] = activation_value
+        # 对每个关键词在只读快照上进行扩散式检索，得到每个词的累计激活值
+        logger.debug(f"开始以关键词 {valid_keywords} 为中心进行扩散检索 (最大深度: {max_depth})")
+        activate_map = snapshot.activate(valid_keywords, max_depth)
 
         # 基于激活值平方的独立概率选择
         remember_map = {}
@@ -615,10 +690,7 @@ class Hippocampus:
         # logger.info("开始从选中的节点中提取记忆:")
         for node, activation in remember_map.items():
             logger.debug(f"处理节点 '{node}' (激活值: {activation:.2f}):")
-            node_data = self.memory_graph.G.nodes[node]
-            memory_items = node_data.get("memory_items", [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
+            memory_items = snapshot.get_memory_items(node)
 
             if memory_items:
                 logger.debug(f"节点包含 {len(memory_items)} 条记忆")
@@ -627,7 +699,6 @@ class Hippocampus:
                 for memory in memory_items:
                     # 计算与输入文本的相似度
                     memory_words = set(jieba.cut(memory))
-                    text_words = set(keywords)
                     all_words = memory_words | text_words
                     v1 = [1 if word in memory_words else 0 for word in all_words]
                     v2 = [1 if word in text_words else 0 for word in all_words]
@@ -668,130 +739,16 @@ class Hippocampus:
 
         return result
 
-    async def get_activate_from_text(self, text: str, max_depth: int = 3, fast_retrieval: bool = False) -> float:
-        """从文本中提取关键词并获取相关记忆。
-
-        Args:
-            text (str): 输入文本
-            max_depth (int, optional): 记忆检索深度。默认为2。
-            fast_retrieval (bool, optional): 是否使用快速检索。默认为False。
-                如果为True，使用jieba分词和TF-IDF提取关键词，速度更快但可能不够准确。
-                如果为False，使用LLM提取关键词，速度较慢但更准确。
-
-        Returns:
-            float: 激活节点数与总节点数的比值
-        """
-        if not text:
-            return 0
-
-        if fast_retrieval:
-            # 使用jieba分词提取关键词
-            words = jieba.cut(text)
-            # 过滤掉停用词和单字词
-            keywords = [word for word in words if len(word) > 1]
-            # 去重
-            keywords = list(set(keywords))
-            # 限制关键词数量
-            keywords = keywords[:5]
-        else:
-            # 使用LLM提取关键词
-            topic_num = min(5, max(1, int(len(text) * 0.1)))  # 根据文本长度动态调整关键词数量
-            # logger.info(f"提取关键词数量: {topic_num}")
-            topics_response = await self.llm_topic_judge.generate_response(self.find_topic_llm(text, topic_num))
-
-            # 提取关键词
-            keywords = re.findall(r"<([^>]+)>", topics_response[0])
-            if not keywords:
-                keywords = []
-            else:
-                keywords = [
-                    keyword.strip()
-                    for keyword in ",".join(keywords).replace("，", ",").replace("、", ",").replace(" ", ",").split(",")
-                    if keyword.strip()
-                ]
-
-        # logger.info(f"提取的关键词: {', '.join(keywords)}")
-
-        # 过滤掉不存在于记忆图中的关键词
-        valid_keywords = [keyword for keyword in keywords if keyword in self.memory_graph.G]
-        if not valid_keywords:
-            # logger.info("没有找到有效的关键词节点")
-            return 0
-
-        logger.debug(f"有效的关键词: {', '.join(valid_keywords)}")
-
-        # 从每个关键词获取记忆
-        activate_map = {}  # 存储每个词的累计激活值
-
-        # 对每个关键词进行扩散式检索
-        for keyword in valid_keywords:
-            logger.trace(f"开始以关键词 '{keyword}' 为中心进行扩散检索 (最大深度: {max_depth}):")
-            # 初始化激活值
-            activation_values = {keyword: 1.0}
-            # 记录已访问的节点
-            visited_nodes = {keyword}
-            # 待处理的节点队列，每个元素是(节点, 激活值, 当前深度)
-            nodes_to_process = [(keyword, 1.0, 0)]
-
-            while nodes_to_process:
-                current_node, current_activation, current_depth = nodes_to_process.pop(0)
-
-                # 如果激活值小于0或超过最大深度，停止扩散
-                if current_activation <= 0 or current_depth >= max_depth:
-                    continue
-
-                # 获取当前节点的所有邻居
-                neighbors = list(self.memory_graph.G.neighbors(current_node))
-
-                for neighbor in neighbors:
-                    if neighbor in visited_nodes:
-                        continue
-
-                    # 获取连接强度
-                    edge_data = self.memory_graph.G[current_node][neighbor]
-                    strength = edge_data.get("strength", 1)
-
-                    # 计算新的激活值
-                    new_activation = current_activation - (1 / strength)
-
-                    if new_activation > 0:
-                        activation_values[neighbor] = new_activation
-                        visited_nodes.add(neighbor)
-                        nodes_to_process.append((neighbor, new_activation, current_depth + 1))
-                        # logger.debug(
-                        # f"节点 '{neighbor}' 被激活，激活值: {new_activation:.2f} (通过 '{current_node}' 连接，强度: {strength}, 深度: {current_depth + 1})")  # noqa: E501
-
-            # 更新激活映射
-            for node, activation_value in activation_values.items():
-                if activation_value > 0:
-                    if node in activate_map:
-                        activate_map[node] += activation_value
-                    else:
-                        activate_map[node] = activation_value
-
-        # 输出激活映射
-        # logger.info("激活映射统计:")
-        # for node, total_activation in sorted(activate_map.items(), key=lambda x: x[1], reverse=True):
-        #     logger.info(f"节点 '{node}': 累计激活值 = {total_activation:.2f}")
-
-        # 计算激活节点数与总节点数的比值
-        total_activation = sum(activate_map.values())
-        logger.trace(f"总激活值: {total_activation:.2f}")
-        total_nodes = len(self.memory_graph.G.nodes())
-        # activated_nodes = len(activate_map)
-        activation_ratio = total_activation / total_nodes if total_nodes > 0 else 0
-        activation_ratio = activation_ratio * 60
-        logger.info(f"总激活值: {total_activation:.2f}, 总节点数: {total_nodes}, 激活: {activation_ratio}")
-
-        return activation_ratio
-
 
 # 负责海马体与其他部分的交互
 class EntorhinalCortex:
+    SNAPSHOT_PATH = os.path.join("data", "memory_graph.snapshot")
+
     def __init__(self, hippocampus: Hippocampus):
         self.hippocampus = hippocampus
         self.memory_graph = hippocampus.memory_graph
         self.config = hippocampus.config
+        self.db_version = None
 
     def get_memory_sample(self):
         """从数据库获取记忆样本"""
@@ -814,11 +771,10 @@ class EntorhinalCortex:
         readable_timestamps = [translate_timestamp_to_human_readable(ts, mode="normal") for ts in timestamps]
         logger.info(f"回忆往事: {readable_timestamps}")
         chat_samples = []
-        for timestamp in timestamps:
-            # 调用修改后的 random_get_msg_snippet
-            messages = self.random_get_msg_snippet(
-                timestamp, self.config.build_memory_sample_length, max_memorized_time_per_msg
-            )
+        snippets = self.batch_get_msg_snippets(
+            timestamps, self.config.build_memory_sample_length, max_memorized_time_per_msg
+        )
+        for timestamp, messages in zip(timestamps, snippets, strict=True):
             if messages:
                 time_diff = (datetime.datetime.now().timestamp() - timestamp) / 3600
                 logger.debug(f"成功抽取 {time_diff:.1f} 小时前的消息样本，共{len(messages)}条")
@@ -829,149 +785,157 @@ class EntorhinalCortex:
         return chat_samples
 
     @staticmethod
-    def random_get_msg_snippet(target_timestamp: float, chat_size: int, max_memorized_time_per_msg: int) -> list:
-        """从数据库中随机获取指定时间戳附近的消息片段 (使用 chat_message_builder)"""
-        try_count = 0
-        time_window_seconds = random.randint(300, 1800)  # 随机时间窗口，5到30分钟
-
-        while try_count < 3:
-            # 定义时间范围：从目标时间戳开始，向后推移 time_window_seconds
-            timestamp_start = target_timestamp
-            timestamp_end = target_timestamp + time_window_seconds
-
-            # 使用 chat_message_builder 的函数获取消息
-            # limit_mode='earliest' 获取这个时间窗口内最早的 chat_size 条消息
-            messages = get_raw_msg_by_timestamp(
-                timestamp_start=timestamp_start, timestamp_end=timestamp_end, limit=chat_size, limit_mode="earliest"
-            )
+    def batch_get_msg_snippets(timestamps, chat_size: int, max_memorized_time_per_msg: int) -> list:
+        """一次性获取多个时间戳附近的消息片段
 
-            if messages:
-                # 检查获取到的所有消息是否都未达到最大记忆次数
-                all_valid = True
-                for message in messages:
-                    if message.get("memorized_times", 0) >= max_memorized_time_per_msg:
-                        all_valid = False
-                        break
-
-                # 如果所有消息都有效
-                if all_valid:
-                    # 更新数据库中的记忆次数
-                    for message in messages:
-                        # 确保在更新前获取最新的 memorized_times，以防万一
-                        current_memorized_times = message.get("memorized_times", 0)
-                        db.messages.update_one(
-                            {"_id": message["_id"]}, {"$set": {"memorized_times": current_memorized_times + 1}}
-                        )
-                    return messages  # 直接返回原始的消息列表
-
-            # 如果获取失败或消息无效，增加尝试次数
-            try_count += 1
-            target_timestamp -= 120  # 如果第一次尝试失败，稍微向前调整时间戳再试
-
-        # 三次尝试都失败，返回 None
-        return None
+        每个时间戳的抽取规则与逐个查询时相同：取随机时间窗口(5到30分钟)内最早的 chat_size 条消息，
+        若其中有消息已达到最大记忆次数，则将时间戳向前调整2分钟重试，最多尝试3次。
+        所有候选窗口只查询一次数据库，资格检查在内存中完成(已被本批次选中的消息同样计入次数)，
+        最后用一次批量写入更新所有被选中消息的记忆次数。
 
-    async def sync_memory_to_db(self):
-        """将记忆图同步到数据库"""
-        # 获取数据库中所有节点和内存中所有节点
-        db_nodes = list(db.graph_data.nodes.find())
-        memory_nodes = list(self.memory_graph.G.nodes(data=True))
+        Returns:
+            list: 与 timestamps 一一对应的消息列表，抽取失败的位置为 None
+        """
+        max_tries = 3
+        retry_step = 120
+
+        # 每个时间戳使用一个随机时间窗口，重试时窗口整体向前平移
+        windows = [(timestamp, random.randint(300, 1800)) for timestamp in timestamps]
+        ranges = [(timestamp - retry_step * (max_tries - 1), timestamp + window) for timestamp, window in windows]
+        messages = get_raw_msg_by_timestamp_ranges(ranges)
+        message_times = [message["time"] for message in messages]
+
+        memorized_times = {}  # 消息 _id -> 当前记忆次数(包含本批次的增加)
+        increments = Counter()  # 消息 _id -> 本批次增加的次数
+        snippets = []
+        for target_timestamp, window in windows:
+            snippet = None
+            for _ in range(max_tries):
+                # 开区间 (target_timestamp, target_timestamp + window) 内最早的 chat_size 条消息
+                start = bisect.bisect_right(message_times, target_timestamp)
+                end = bisect.bisect_left(message_times, target_timestamp + window, lo=start)
+                candidates = messages[start : min(end, start + chat_size)]
+
+                if candidates and all(
+                    memorized_times.get(message["_id"], message.get("memorized_times", 0)) < max_memorized_time_per_msg
+                    for message in candidates
+                ):
+                    snippet = candidates
+                    break
+                target_timestamp -= retry_step  # 如果本次尝试失败，稍微向前调整时间戳再试
+
+            if snippet:
+                for message in snippet:
+                    message_id = message["_id"]
+                    memorized_times[message_id] = memorized_times.get(message_id, message.get("memorized_times", 0)) + 1
+                    increments[message_id] += 1
+            snippets.append(snippet)
+
+        increment_memorized_times(increments)
+        return snippets
+
+    def _node_document(self, concept, data) -> dict:
+        """将内存中的节点转换为数据库文档"""
+        memory_items = data.get("memory_items", [])
+        if not isinstance(memory_items, list):
+            memory_items = [memory_items] if memory_items else []
+        return {
+            "concept": concept,
+            "memory_items": memory_items,
+            "hash": self.hippocampus.calculate_node_hash(concept, memory_items),
+            "created_time": data.get("created_time", datetime.datetime.now().timestamp()),
+            "last_modified": data.get("last_modified", datetime.datetime.now().timestamp()),
+        }
 
-        # 转换数据库节点为字典格式,方便查找
-        db_nodes_dict = {node["concept"]: node for node in db_nodes}
+    def _edge_document(self, source, target, data) -> dict:
+        """将内存中的边转换为数据库文档"""
+        return {
+            "source": source,
+            "target": target,
+            "strength": data.get("strength", 1),
+            "hash": self.hippocampus.calculate_edge_hash(source, target),
+            "created_time": data.get("created_time", datetime.datetime.now().timestamp()),
+            "last_modified": data.get("last_modified", datetime.datetime.now().timestamp()),
+        }
 
-        # 检查并更新节点
-        for concept, data in memory_nodes:
-            memory_items = data.get("memory_items", [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
+    @staticmethod
+    def _edge_filter(source, target) -> dict:
+        """无向边在数据库中可能以任意方向存储"""
+        return {"$or": [{"source": source, "target": target}, {"source": target, "target": source}]}
+
+    async def sync_memory_to_db(self):
+        """将自上次同步以来变化的节点和边增量同步到数据库
 
-            # 计算内存中节点的特征值
-            memory_hash = self.hippocampus.calculate_node_hash(concept, memory_items)
-
-            # 获取时间信息
-            created_time = data.get("created_time", datetime.datetime.now().timestamp())
-            last_modified = data.get("last_modified", datetime.datetime.now().timestamp())
-
-            if concept not in db_nodes_dict:
-                # 数据库中缺少的节点,添加
-                node_data = {
-                    "concept": concept,
-                    "memory_items": memory_items,
-                    "hash": memory_hash,
-                    "created_time": created_time,
-                    "last_modified": last_modified,
-                }
-                db.graph_data.nodes.insert_one(node_data)
+        每个集合只发送一次 bulk_write：仍在图中的节点/边按当前状态 upsert，已从图中移除的删除。
+        """
+        dirty_nodes, dirty_edges = self.memory_graph.pop_changes()
+        if not dirty_nodes and not dirty_edges:
+            return
+
+        node_ops = []
+        for concept in dirty_nodes:
+            if concept in self.memory_graph.G:
+                node_doc = self._node_document(concept, self.memory_graph.G.nodes[concept])
+                node_ops.append(UpdateOne({"concept": concept}, {"$set": node_doc}, upsert=True))
             else:
-                # 获取数据库中节点的特征值
-                db_node = db_nodes_dict[concept]
-                db_hash = db_node.get("hash", None)
-
-                # 如果特征值不同,则更新节点
-                if db_hash != memory_hash:
-                    db.graph_data.nodes.update_one(
-                        {"concept": concept},
-                        {
-                            "$set": {
-                                "memory_items": memory_items,
-                                "hash": memory_hash,
-                                "created_time": created_time,
-                                "last_modified": last_modified,
-                            }
-                        },
-                    )
-
-        # 处理边的信息
-        db_edges = list(db.graph_data.edges.find())
-        memory_edges = list(self.memory_graph.G.edges(data=True))
+                node_ops.append(DeleteMany({"concept": concept}))
 
-        # 创建边的哈希值字典
-        db_edge_dict = {}
-        for edge in db_edges:
-            edge_hash = self.hippocampus.calculate_edge_hash(edge["source"], edge["target"])
-            db_edge_dict[(edge["source"], edge["target"])] = {"hash": edge_hash, "strength": edge.get("strength", 1)}
-
-        # 检查并更新边
-        for source, target, data in memory_edges:
-            edge_hash = self.hippocampus.calculate_edge_hash(source, target)
-            edge_key = (source, target)
-            strength = data.get("strength", 1)
-
-            # 获取边的时间信息
-            created_time = data.get("created_time", datetime.datetime.now().timestamp())
-            last_modified = data.get("last_modified", datetime.datetime.now().timestamp())
-
-            if edge_key not in db_edge_dict:
-                # 添加新边
-                edge_data = {
-                    "source": source,
-                    "target": target,
-                    "strength": strength,
-                    "hash": edge_hash,
-                    "created_time": created_time,
-                    "last_modified": last_modified,
-                }
-                db.graph_data.edges.insert_one(edge_data)
+        edge_ops = []
+        for source, target in dirty_edges:
+            if self.memory_graph.G.has_edge(source, target):
+                edge_doc = self._edge_document(source, target, self.memory_graph.G[source][target])
+                edge_ops.append(UpdateOne(self._edge_filter(source, target), {"$set": edge_doc}, upsert=True))
             else:
-                # 检查边的特征值是否变化
-                if db_edge_dict[edge_key]["hash"] != edge_hash:
-                    db.graph_data.edges.update_one(
-                        {"source": source, "target": target},
-                        {
-                            "$set": {
-                                "hash": edge_hash,
-                                "strength": strength,
-                                "created_time": created_time,
-                                "last_modified": last_modified,
-                            }
-                        },
-                    )
+                edge_ops.append(DeleteMany(self._edge_filter(source, target)))
+
+        try:
+            self.db_version = self._bump_db_version()
+            if node_ops:
+                db.graph_data.nodes.bulk_write(node_ops, ordered=False)
+            if edge_ops:
+                db.graph_data.edges.bulk_write(edge_ops, ordered=False)
+        except Exception:
+            # 写入失败时保留变更记录，下次同步时重试(upsert/删除均为幂等操作)
+            self.memory_graph.restore_changes(dirty_nodes, dirty_edges)
+            raise
+
+        logger.debug(f"[数据库] 增量同步 {len(node_ops)} 个节点和 {len(edge_ops)} 条边")
 
     def sync_memory_from_db(self):
-        """从数据库同步数据到内存中的图结构"""
+        """从数据库同步数据到内存中的图结构
+
+        优先加载本地快照文件，只有快照缺失或与数据库变更计数不一致时才从数据库全量加载。
+        """
+        self.db_version = self._get_db_version()
+        if self.db_version is not None and read_graph_snapshot_version(self.SNAPSHOT_PATH) == self.db_version:
+            loaded = load_graph_snapshot(self.SNAPSHOT_PATH)
+            if loaded is not None:
+                self.memory_graph.G = loaded[0]
+                # 整体加载后重建话题索引，此时内存与数据库一致，清空变更记录
+                self.memory_graph.rebuild_index()
+                self.memory_graph.pop_changes()
+                logger.info(
+                    f"[数据库] 从快照加载 {self.memory_graph.G.number_of_nodes()} 个节点和 "
+                    f"{self.memory_graph.G.number_of_edges()} 条边"
+                )
+                return
+
         current_time = datetime.datetime.now().timestamp()
+
+        # 时间字段补充也是一次数据库变更，写入前先递增计数
+        self.db_version = self._bump_db_version()
+
+        # 一次性为缺失时间字段的文档补充时间
         need_update = False
+        for collection in (db.graph_data.nodes, db.graph_data.edges):
+            result = collection.bulk_write(
+                [
+                    UpdateMany({"created_time": {"$exists": False}}, {"$set": {"created_time": current_time}}),
+                    UpdateMany({"last_modified": {"$exists": False}}, {"$set": {"last_modified": current_time}}),
+                ],
+                ordered=False,
+            )
+            need_update = need_update or result.modified_count > 0
 
         # 清空当前图
         self.memory_graph.G.clear()
@@ -984,19 +948,6 @@ class EntorhinalCortex:
             if not isinstance(memory_items, list):
                 memory_items = [memory_items] if memory_items else []
 
-            # 检查时间字段是否存在
-            if "created_time" not in node or "last_modified" not in node:
-                need_update = True
-                # 更新数据库中的节点
-                update_data = {}
-                if "created_time" not in node:
-                    update_data["created_time"] = current_time
-                if "last_modified" not in node:
-                    update_data["last_modified"] = current_time
-
-                db.graph_data.nodes.update_one({"concept": concept}, {"$set": update_data})
-                logger.info(f"[时间更新] 节点 {concept} 添加缺失的时间字段")
-
             # 获取时间信息(如果不存在则使用当前时间)
             created_time = node.get("created_time", current_time)
             last_modified = node.get("last_modified", current_time)
@@ -1013,19 +964,6 @@ class EntorhinalCortex:
             target = edge["target"]
             strength = edge.get("strength", 1)
 
-            # 检查时间字段是否存在
-            if "created_time" not in edge or "last_modified" not in edge:
-                need_update = True
-                # 更新数据库中的边
-                update_data = {}
-                if "created_time" not in edge:
-                    update_data["created_time"] = current_time
-                if "last_modified" not in edge:
-                    update_data["last_modified"] = current_time
-
-                db.graph_data.edges.update_one({"source": source, "target": target}, {"$set": update_data})
-                logger.info(f"[时间更新] 边 {source} - {target} 添加缺失的时间字段")
-
             # 获取时间信息(如果不存在则使用当前时间)
             created_time = edge.get("created_time", current_time)
             last_modified = edge.get("last_modified", current_time)
@@ -1036,55 +974,108 @@ class EntorhinalCortex:
                     source, target, strength=strength, created_time=created_time, last_modified=last_modified
                 )
 
+        # 整体加载后重建话题索引，此时内存与数据库一致，清空变更记录
+        self.memory_graph.rebuild_index()
+        self.memory_graph.pop_changes()
+
         if need_update:
             logger.success("[数据库] 已为缺失的时间字段进行补充")
 
+    def _get_db_version(self) -> int | None:
+        """读取数据库中记忆图的变更计数，尚未记录时返回 None"""
+        doc = db.graph_data.meta.find_one({"_id": "version"})
+        return doc["value"] if doc else None
+
+    def _bump_db_version(self) -> int:
+        """记忆图每次写入数据库前递增变更计数，用于判断本地快照是否过期
+
+        必须在写入之前递增：写入后、递增前进程崩溃时，旧快照的计数仍与数据库一致，
+        下次启动会加载旧快照，已写入的变更随之丢失，之后的增量同步还会用旧数据覆盖它们。
+        """
+        doc = db.graph_data.meta.find_one_and_update(
+            {"_id": "version"}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["value"]
+
+    async def close(self):
+        """关闭时同步尚未写入的变更，再保存快照供下次启动时直接加载
+
+        快照只在这里写入：编码和写入整个图是 O(图规模) 的操作，不能在每次增量同步后执行。
+        运行期间数据库变更计数随每次同步递增，磁盘上的旧快照因此失效，未正常关闭时下次启动会从数据库全量加载。
+        """
+        try:
+            await self.sync_memory_to_db()
+        except Exception as e:
+            logger.error(f"[数据库] 关闭时同步记忆图失败，不保存快照: {e}")
+            return
+        if self.db_version is None:
+            return
+        # 其他任务已停止，图不会再被修改，可以在线程中编码
+        await asyncio.to_thread(self._save_snapshot)
+        logger.info("[数据库] 已保存记忆图快照")
+
+    def _save_snapshot(self):
+        """将当前记忆图连同数据库变更计数写入快照文件，失败时只影响下次启动速度"""
+        try:
+            write_graph_snapshot(self.SNAPSHOT_PATH, encode_graph_snapshot(self.memory_graph.G, self.db_version))
+        except OSError as e:
+            logger.warning(f"[数据库] 写入记忆图快照失败: {e}")
+
     async def resync_memory_to_db(self):
-        """清空数据库并重新同步所有记忆数据"""
+        """将整个记忆图全量同步到数据库
+
+        以 upsert 覆盖写入所有节点和边，再删除数据库中已不存在于图中的文档，
+        同步期间数据库不会出现被清空的中间状态。
+        """
         start_time = time.time()
         logger.info("[数据库] 开始重新同步所有记忆数据...")
 
-        # 清空数据库
-        clear_start = time.time()
-        db.graph_data.nodes.delete_many({})
-        db.graph_data.edges.delete_many({})
-        clear_end = time.time()
-        logger.info(f"[数据库] 清空数据库耗时: {clear_end - clear_start:.2f}秒")
+        # 全量写入后，之前记录的增量变更已无意义
+        self.memory_graph.pop_changes()
+        self.db_version = self._bump_db_version()
 
         # 获取所有节点和边
         memory_nodes = list(self.memory_graph.G.nodes(data=True))
         memory_edges = list(self.memory_graph.G.edges(data=True))
 
-        # 重新写入节点
+        # 重新写入节点，并删除数据库中已不在图中的节点
         node_start = time.time()
-        for concept, data in memory_nodes:
-            memory_items = data.get("memory_items", [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-
-            node_data = {
-                "concept": concept,
-                "memory_items": memory_items,
-                "hash": self.hippocampus.calculate_node_hash(concept, memory_items),
-                "created_time": data.get("created_time", datetime.datetime.now().timestamp()),
-                "last_modified": data.get("last_modified", datetime.datetime.now().timestamp()),
-            }
-            db.graph_data.nodes.insert_one(node_data)
+        node_ops = [
+            UpdateOne({"concept": concept}, {"$set": self._node_document(concept, data)}, upsert=True)
+            for concept, data in memory_nodes
+        ]
+        stale_node_ids = [
+            node["_id"]
+            for node in db.graph_data.nodes.find({}, {"concept": 1})
+            if node["concept"] not in self.memory_graph.G
+        ]
+        if stale_node_ids:
+            node_ops.append(DeleteMany({"_id": {"$in": stale_node_ids}}))
+        if node_ops:
+            db.graph_data.nodes.bulk_write(node_ops, ordered=False)
         node_end = time.time()
         logger.info(f"[数据库] 写入 {len(memory_nodes)} 个节点耗时: {node_end - node_start:.2f}秒")
 
-        # 重新写入边
+        # 重新写入边，并删除数据库中已不在图中(或存储方向与图中不一致)的边
         edge_start = time.time()
-        for source, target, data in memory_edges:
-            edge_data = {
-                "source": source,
-                "target": target,
-                "strength": data.get("strength", 1),
-                "hash": self.hippocampus.calculate_edge_hash(source, target),
-                "created_time": data.get("created_time", datetime.datetime.now().timestamp()),
-                "last_modified": data.get("last_modified", datetime.datetime.now().timestamp()),
-            }
-            db.graph_data.edges.insert_one(edge_data)
+        memory_edge_keys = {(source, target) for source, target, _ in memory_edges}
+        edge_ops = [
+            UpdateOne(
+                {"source": source, "target": target},
+                {"$set": self._edge_document(source, target, data)},
+                upsert=True,
+            )
+            for source, target, data in memory_edges
+        ]
+        stale_edge_ids = [
+            edge["_id"]
+            for edge in db.graph_data.edges.find({}, {"source": 1, "target": 1})
+            if (edge["source"], edge["target"]) not in memory_edge_keys
+        ]
+        if stale_edge_ids:
+            edge_ops.append(DeleteMany({"_id": {"$in": stale_edge_ids}}))
+        if edge_ops:
+            db.graph_data.edges.bulk_write(edge_ops, ordered=False)
         edge_end = time.time()
         logger.info(f"[数据库] 写入 {len(memory_edges)} 条边耗时: {edge_end - edge_start:.2f}秒")
 
@@ -1100,27 +1091,23 @@ class ParahippocampalGyrus:
         self.memory_graph = hippocampus.memory_graph
         self.config = hippocampus.config
 
-    async def memory_compress(self, messages: list, compress_rate=0.1):
-        """压缩和总结消息内容，生成记忆主题和摘要。
+        self.last_build_timings = {}  # 最近一次记忆构建各阶段的耗时(秒)
+        self.duplicate_finder = None  # 记忆整合使用的相似项查找器，按阈值懒加载，分词和签名缓存跨轮次复用
 
-        Args:
-            messages (list): 消息列表，每个消息是一个字典，包含数据库消息结构。
-            compress_rate (float, optional): 压缩率，用于控制生成的主题数量。默认为0.1。
-
-        Returns:
-            tuple: (compressed_memory, similar_topics_dict)
-                - compressed_memory: set, 压缩后的记忆集合，每个元素是一个元组 (topic, summary)
-                - similar_topics_dict: dict, 相似主题字典
+    async def compress_messages(self, messages: list, compress_rate=0.1) -> list:
+        """对一段消息提取主题并生成摘要，不读取也不修改记忆图，可以并发执行。
 
         Process:
             1. 使用 build_readable_messages 生成包含时间、人物信息的格式化文本。
             2. 使用LLM提取关键主题。
             3. 过滤掉包含禁用关键词的主题。
             4. 为每个主题生成摘要。
-            5. 查找与现有记忆中的相似主题。
+
+        Returns:
+            list: 压缩后的记忆列表(已去重，保持话题顺序)，每个元素是一个元组 (topic, summary)
         """
         if not messages:
-            return set(), {}
+            return []
 
         # 1. 使用 build_readable_messages 生成格式化文本
         # build_readable_messages 只返回一个字符串，不需要解包
@@ -1134,7 +1121,7 @@ class ParahippocampalGyrus:
         # 如果生成的可读文本为空（例如所有消息都无效），则直接返回
         if not input_text:
             logger.warning("无法从提供的消息生成可读文本，跳过记忆压缩。")
-            return set(), {}
+            return []
 
         logger.debug(f"用于压缩的格式化文本:\n{input_text}")
 
@@ -1163,70 +1150,69 @@ class ParahippocampalGyrus:
 
         logger.debug(f"过滤后话题: {filtered_topics}")
 
-        # 4. 创建所有话题的摘要生成任务
-        tasks = []
-        for topic in filtered_topics:
-            # 调用修改后的 topic_what，不再需要 time_info
-            topic_what_prompt = self.hippocampus.topic_what(input_text, topic)
-            try:
-                task = self.hippocampus.llm_summary.generate_response_async(topic_what_prompt)
-                tasks.append((topic.strip(), task))
-            except Exception as e:
-                logger.error(f"生成话题 '{topic}' 的摘要时发生错误: {e}")
-                continue
-
-        # 等待所有任务完成
-        compressed_memory = set()
-        similar_topics_dict = {}
-
-        for topic, task in tasks:
-            response = await task
-            if response:
-                compressed_memory.add((topic, response[0]))
+        # 4. 并发生成所有话题的摘要
+        responses = await asyncio.gather(
+            *(
+                self.hippocampus.llm_summary.generate_response_async(self.hippocampus.topic_what(input_text, topic))
+                for topic in filtered_topics
+            )
+        )
 
-                existing_topics = list(self.memory_graph.G.nodes())
-                similar_topics = []
+        compressed_memory = [
+            (topic.strip(), response[0]) for topic, response in zip(filtered_topics, responses, strict=True) if response
+        ]
+        return list(dict.fromkeys(compressed_memory))
 
-                for existing_topic in existing_topics:
-                    topic_words = set(jieba.cut(topic))
-                    existing_words = set(jieba.cut(existing_topic))
+    def find_similar_topics(self, compressed_memory: list) -> dict:
+        """在当前记忆图中查找与压缩结果中各话题相似的已有话题
 
-                    all_words = topic_words | existing_words
-                    v1 = [1 if word in topic_words else 0 for word in all_words]
-                    v2 = [1 if word in existing_words else 0 for word in all_words]
+        Returns:
+            dict: {topic: [(similar_topic, similarity), ...]}，每个话题最多3个
+        """
+        # 通过倒排索引查找相似的已有话题
+        return {topic: self.memory_graph.topic_index.search(topic, 0.7)[:3] for topic, _ in compressed_memory}
+
+    async def _compress_samples(self, memory_samples: list) -> list:
+        """以有限并发压缩所有样本，返回结果与样本一一对应(失败的样本为空列表)"""
+        compress_rate = self.config.memory_compress_rate
+        semaphore = asyncio.Semaphore(max(1, self.config.build_memory_concurrency))
+        completed = 0
+
+        async def compress(messages):
+            nonlocal completed
+            async with semaphore:
+                try:
+                    compressed_memory = await self.compress_messages(messages, compress_rate)
+                except Exception as e:
+                    logger.error(f"压缩记忆时发生错误: {e}")
+                    compressed_memory = []
 
-                    similarity = cosine_similarity(v1, v2)
+            completed += 1
+            progress = (completed / len(memory_samples)) * 100
+            bar_length = 30
+            filled_length = int(bar_length * completed // len(memory_samples))
+            bar = "█" * filled_length + "-" * (bar_length - filled_length)
+            logger.debug(f"进度: [{bar}] {progress:.1f}% ({completed}/{len(memory_samples)})")
+            return compressed_memory
 
-                    if similarity >= 0.7:
-                        similar_topics.append((existing_topic, similarity))
+        return await asyncio.gather(*(compress(messages) for messages in memory_samples))
 
-                similar_topics.sort(key=lambda x: x[1], reverse=True)
-                similar_topics = similar_topics[:3]
-                similar_topics_dict[topic] = similar_topics
+    def _merge_compressed_memory(self, compressed_samples: list) -> tuple[list, list, list]:
+        """按样本顺序将压缩结果写入记忆图
 
-        return compressed_memory, similar_topics_dict
+        相似话题在合并每个样本前才查找，因此结果与逐个样本串行构建完全一致，不受压缩完成顺序影响。
 
-    async def operation_build_memory(self):
-        logger.debug("------------------------------------开始构建记忆--------------------------------------")
-        start_time = time.time()
-        memory_samples = self.hippocampus.entorhinal_cortex.get_memory_sample()
+        Returns:
+            tuple: (添加的节点, 连接的相似节点, 添加的边)
+        """
         all_added_nodes = []
         all_connected_nodes = []
         all_added_edges = []
-        for i, messages in enumerate(memory_samples, 1):
-            all_topics = []
-            progress = (i / len(memory_samples)) * 100
-            bar_length = 30
-            filled_length = int(bar_length * i // len(memory_samples))
-            bar = "█" * filled_length + "-" * (bar_length - filled_length)
-            logger.debug(f"进度: [{bar}] {progress:.1f}% ({i}/{len(memory_samples)})")
-
-            compress_rate = self.config.memory_compress_rate
-            try:
-                compressed_memory, similar_topics_dict = await self.memory_compress(messages, compress_rate)
-            except Exception as e:
-                logger.error(f"压缩记忆时发生错误: {e}")
+        for compressed_memory in compressed_samples:
+            if not compressed_memory:
                 continue
+            all_topics = []
+            similar_topics_dict = self.find_similar_topics(compressed_memory)
             logger.debug(f"压缩后记忆数量: {compressed_memory}，似曾相识的话题: {similar_topics_dict}")
 
             current_time = datetime.datetime.now().timestamp()
@@ -1249,27 +1235,55 @@ class ParahippocampalGyrus:
                             all_connected_nodes.append(topic)
                             all_connected_nodes.append(similar_topic)
 
-                            self.memory_graph.G.add_edge(
-                                topic,
-                                similar_topic,
-                                strength=strength,
-                                created_time=current_time,
-                                last_modified=current_time,
-                            )
+                            self.memory_graph.set_edge(topic, similar_topic, strength, current_time)
 
             for topic1, topic2 in combinations(all_topics, 2):
                 logger.debug(f"连接同批次节点: {topic1} 和 {topic2}")
                 all_added_edges.append(f"{topic1}-{topic2}")
                 self.memory_graph.connect_dot(topic1, topic2)
 
+        return all_added_nodes, all_connected_nodes, all_added_edges
+
+    async def operation_build_memory(self) -> dict:
+        """构建记忆：采样 -> 并发压缩 -> 按样本顺序合并 -> 同步数据库
+
+        Returns:
+            dict: 各阶段耗时(秒)，同时保存在 last_build_timings 中
+        """
+        logger.debug("------------------------------------开始构建记忆--------------------------------------")
+        start_time = time.time()
+        timings = {}
+
+        stage_start = time.time()
+        memory_samples = self.hippocampus.entorhinal_cortex.get_memory_sample()
+        timings["sample"] = time.time() - stage_start
+
+        stage_start = time.time()
+        compressed_samples = await self._compress_samples(memory_samples)
+        timings["compress"] = time.time() - stage_start
+
+        stage_start = time.time()
+        all_added_nodes, all_connected_nodes, all_added_edges = self._merge_compressed_memory(compressed_samples)
+        timings["merge"] = time.time() - stage_start
+
         logger.success(f"更新记忆: {', '.join(all_added_nodes)}")
         logger.debug(f"强化连接: {', '.join(all_added_edges)}")
         logger.info(f"强化连接节点: {', '.join(all_connected_nodes)}")
 
+        stage_start = time.time()
         await self.hippocampus.entorhinal_cortex.sync_memory_to_db()
+        timings["sync"] = time.time() - stage_start
 
         end_time = time.time()
+        timings["total"] = end_time - start_time
+        self.last_build_timings = timings
+        logger.info(
+            f"[构建] 采样: {timings['sample']:.2f}秒, 压缩: {timings['compress']:.2f}秒 "
+            f"(样本数: {len(memory_samples)}, 并发: {self.config.build_memory_concurrency}), "
+            f"合并: {timings['merge']:.2f}秒, 同步: {timings['sync']:.2f}秒"
+        )
         logger.success(f"---------------------记忆构建耗时: {end_time - start_time:.2f} 秒---------------------")
+        return timings
 
     async def operation_forget_topic(self, percentage=0.005):
         start_time = time.time()
@@ -1326,11 +1340,12 @@ class ParahippocampalGyrus:
                 new_strength = current_strength - 1
 
                 if new_strength <= 0:
-                    self.memory_graph.G.remove_edge(source, target)
+                    self.memory_graph.remove_edge(source, target)
                     edge_changes["removed"].append(f"{source} -> {target}")
                 else:
                     edge_data["strength"] = new_strength
                     edge_data["last_modified"] = current_time
+                    self.memory_graph.mark_edge_dirty(source, target)
                     edge_changes["weakened"].append(f"{source}-{target} (强度: {current_strength} -> {new_strength})")
         edge_check_end = time.time()
         logger.info(f"[遗忘] 连接检查耗时: {edge_check_end - edge_check_start:.2f}秒")
@@ -1352,7 +1367,7 @@ class ParahippocampalGyrus:
             # 新增：检查节点是否为空
             if not memory_items:
                 try:
-                    self.memory_graph.G.remove_node(node)
+                    self.memory_graph.remove_dot(node)
                     node_changes["removed"].append(f"{node}(空节点)")  # 标记为空节点移除
                     logger.debug(f"[遗忘] 移除了空的节点: {node}")
                 except nx.NetworkXError as e:
@@ -1376,11 +1391,12 @@ class ParahippocampalGyrus:
                             if memory_items:  # 如果移除后列表不为空
                                 # self.memory_graph.G.nodes[node]["memory_items"] = memory_items # 直接修改列表即可
                                 self.memory_graph.G.nodes[node]["last_modified"] = current_time  # 更新修改时间
+                                self.memory_graph.mark_node_dirty(node)
                                 node_changes["reduced"].append(f"{node} (数量: {current_count} -> {len(memory_items)})")
                             else:  # 如果移除后列表为空
                                 # 尝试移除节点，处理可能的错误
                                 try:
-                                    self.memory_graph.G.remove_node(node)
+                                    self.memory_graph.remove_dot(node)
                                     node_changes["removed"].append(f"{node}(遗忘清空)")  # 标记为遗忘清空
                                     logger.debug(f"[遗忘] 节点 {node} 因移除最后一项而被清空。")
                                 except nx.NetworkXError as e:
@@ -1394,7 +1410,7 @@ class ParahippocampalGyrus:
         if any(edge_changes.values()) or any(node_changes.values()):
             sync_start = time.time()
 
-            await self.hippocampus.entorhinal_cortex.resync_memory_to_db()
+            await self.hippocampus.entorhinal_cortex.sync_memory_to_db()
 
             sync_end = time.time()
             logger.info(f"[遗忘] 数据库同步耗时: {sync_end - sync_start:.2f}秒")
@@ -1427,11 +1443,19 @@ class ParahippocampalGyrus:
         logger.info(f"[遗忘] 总耗时: {end_time - start_time:.2f}秒")
 
     async def operation_consolidate_memory(self):
-        """整合记忆：合并节点内相似的记忆项"""
+        """整合记忆：合并节点内相似的记忆项
+
+        consolidate_memory_mode 为 "sample" 时按 consolidate_memory_percentage 随机抽查节点，
+        为 "all" 时检查全部节点。节点内的相似项通过 LSH 候选对 + 精确复核查找，整体开销接近线性。
+        """
         start_time = time.time()
         percentage = self.config.consolidate_memory_percentage
         similarity_threshold = self.config.consolidation_similarity_threshold
-        logger.info(f"[整合] 开始检查记忆节点... 检查比例: {percentage:.2%}, 合并阈值: {similarity_threshold}")
+        check_all = self.config.consolidate_memory_mode == "all"
+        logger.info(
+            f"[整合] 开始检查记忆节点... 检查比例: {'全部' if check_all else f'{percentage:.2%}'}, "
+            f"合并阈值: {similarity_threshold}"
+        )
 
         # 获取所有至少有2条记忆项的节点
         eligible_nodes = []
@@ -1444,18 +1468,24 @@ class ParahippocampalGyrus:
             logger.info("[整合] 没有找到包含多个记忆项的节点，无需整合。")
             return
 
-        # 计算需要检查的节点数量
-        check_nodes_count = max(1, min(len(eligible_nodes), int(len(eligible_nodes) * percentage)))
+        if check_all:
+            nodes_to_check = eligible_nodes
+        else:
+            # 计算需要检查的节点数量
+            check_nodes_count = max(1, min(len(eligible_nodes), int(len(eligible_nodes) * percentage)))
 
-        # 随机抽取节点进行检查
-        try:
-            nodes_to_check = random.sample(eligible_nodes, check_nodes_count)
-        except ValueError as e:
-            logger.error(f"[整合] 抽样节点时出错: {e}")
-            return
+            # 随机抽取节点进行检查
+            try:
+                nodes_to_check = random.sample(eligible_nodes, check_nodes_count)
+            except ValueError as e:
+                logger.error(f"[整合] 抽样节点时出错: {e}")
+                return
 
         logger.info(f"[整合] 将检查 {len(nodes_to_check)} / {len(eligible_nodes)} 个符合条件的节点。")
 
+        if self.duplicate_finder is None or self.duplicate_finder.threshold != similarity_threshold:
+            self.duplicate_finder = NearDuplicateFinder(similarity_threshold)
+
         merged_count = 0
         nodes_modified = set()
         current_timestamp = datetime.datetime.now().timestamp()
@@ -1466,59 +1496,40 @@ class ParahippocampalGyrus:
             if not isinstance(memory_items, list) or len(memory_items) < 2:
                 continue  # 双重检查，理论上不会进入
 
-            items_copy = list(memory_items)  # 创建副本以安全迭代和修改
-
-            # 遍历所有记忆项组合
-            for item1, item2 in combinations(items_copy, 2):
-                # 确保 item1 和 item2 仍然存在于原始列表中（可能已被之前的合并移除）
-                if item1 not in memory_items or item2 not in memory_items:
-                    continue
-
-                similarity = self._calculate_item_similarity(item1, item2)
-
-                if similarity >= similarity_threshold:
-                    logger.debug(f"[整合] 节点 '{node}' 中发现相似项 (相似度: {similarity:.2f}):")
-                    logger.trace(f"  - '{item1}'")
-                    logger.trace(f"  - '{item2}'")
-
-                    # 比较信息量
-                    info1 = calculate_information_content(item1)
-                    info2 = calculate_information_content(item2)
-
-                    if info1 >= info2:
-                        item_to_keep = item1
-                        item_to_remove = item2
-                    else:
-                        item_to_keep = item2
-                        item_to_remove = item1
-
-                    # 从原始列表中移除信息量较低的项
-                    try:
-                        memory_items.remove(item_to_remove)
-                        logger.info(
-                            f"[整合] 已合并节点 '{node}' 中的记忆，保留: '{item_to_keep[:60]}...', 移除: '{item_to_remove[:60]}...'"
-                        )
-                        merged_count += 1
-                        nodes_modified.add(node)
-                        node_data["last_modified"] = current_timestamp  # 更新修改时间
-                        _merged_in_this_node = True
-                        break  # 每个节点每次检查只合并一对
-                    except ValueError:
-                        # 如果项已经被移除（例如，在之前的迭代中作为 item_to_keep），则跳过
-                        logger.warning(
-                            f"[整合] 尝试移除节点 '{node}' 中不存在的项 '{item_to_remove[:30]}...'，可能已被合并。"
-                        )
-                        continue
-            # # 如果节点内发生了合并，更新节点数据 (这种方式不安全，会丢失其他属性)
-            # if merged_in_this_node:
-            #      self.memory_graph.G.nodes[node]["memory_items"] = memory_items
+            # 每个节点每次检查只合并一对
+            pair = self.duplicate_finder.first_pair(memory_items)
+            if pair is None:
+                continue
+
+            i, j, similarity = pair
+            item1, item2 = memory_items[i], memory_items[j]
+            logger.debug(f"[整合] 节点 '{node}' 中发现相似项 (相似度: {similarity:.2f}):")
+            logger.trace(f"  - '{item1}'")
+            logger.trace(f"  - '{item2}'")
+
+            # 比较信息量，移除信息量较低的项
+            info1 = calculate_information_content(item1)
+            info2 = calculate_information_content(item2)
+            if info1 >= info2:
+                item_to_keep, remove_index = item1, j
+            else:
+                item_to_keep, remove_index = item2, i
+
+            item_to_remove = memory_items.pop(remove_index)
+            logger.info(
+                f"[整合] 已合并节点 '{node}' 中的记忆，保留: '{item_to_keep[:60]}...', 移除: '{item_to_remove[:60]}...'"
+            )
+            merged_count += 1
+            nodes_modified.add(node)
+            node_data["last_modified"] = current_timestamp  # 更新修改时间
+            self.memory_graph.mark_node_dirty(node)
 
         if merged_count > 0:
             logger.info(f"[整合] 共合并了 {merged_count} 对相似记忆项，分布在 {len(nodes_modified)} 个节点中。")
             sync_start = time.time()
             logger.info("[整合] 开始将变更同步到数据库...")
-            # 使用 resync 更安全地处理删除和添加
-            await self.hippocampus.entorhinal_cortex.resync_memory_to_db()
+            # 只同步发生合并的节点
+            await self.hippocampus.entorhinal_cortex.sync_memory_to_db()
             sync_end = time.time()
             logger.info(f"[整合] 数据库同步耗时: {sync_end - sync_start:.2f}秒")
         else:
@@ -1530,14 +1541,7 @@ class ParahippocampalGyrus:
     @staticmethod
     def _calculate_item_similarity(item1: str, item2: str) -> float:
         """计算两条记忆项文本的余弦相似度"""
-        words1 = set(jieba.cut(item1))
-        words2 = set(jieba.cut(item2))
-        all_words = words1 | words2
-        if not all_words:
-            return 0.0
-        v1 = [1 if word in words1 else 0 for word in all_words]
-        v2 = [1 if word in words2 else 0 for word in all_words]
-        return cosine_similarity(v1, v2)
+        return item_similarity(item1, item2)
 
 
 class HippocampusManager:
@@ -1586,6 +1590,12 @@ class HippocampusManager:
 
         return self._hippocampus
 
+    async def close(self):
+        """关闭时写入尚未同步的记忆变更并保存记忆图快照"""
+        if not self._initialized:
+            return
+        await self._hippocampus.entorhinal_cortex.close()
+
     async def build_memory(self):
         """构建记忆的公共接口"""
         if not self._initialized:
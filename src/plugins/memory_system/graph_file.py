@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import marshal
+import os
+import struct
+import time
+from array import array
+
+import networkx as nx
+
+# 文件头: 魔数, 格式版本, 数据库变更计数, Python marshal 魔数(marshal 格式随 Python 版本变化)
+_MAGIC = b"MMGS"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHq4s")
+
+
+def encode_graph_snapshot(G: nx.Graph, version: int) -> bytes:
+    """将记忆图编码为紧凑的二进制快照
+
+    节点名和记忆项以 marshal 编码的元组保存，时间、强度、边的端点下标以定长数组保存。
+    """
+    now = time.time()  # 缺失的时间字段与写入数据库时一样使用当前时间
+    concepts = []
+    memory_items = []
+    node_times = array("d")
+    node_ids = {}
+    for i, (concept, data) in enumerate(G.nodes(data=True)):
+        node_ids[concept] = i
+        concepts.append(concept)
+        items = data.get("memory_items", [])
+        if not isinstance(items, list):
+            items = [items] if items else []
+        memory_items.append(tuple(items))
+        node_times.append(data.get("created_time", now))
+        node_times.append(data.get("last_modified", now))
+
+    edge_ends = array("I")
+    edge_values = array("d")
+    for source, target, data in G.edges(data=True):
+        edge_ends.append(node_ids[source])
+        edge_ends.append(node_ids[target])
+        edge_values.append(data.get("strength", 1))
+        edge_values.append(data.get("created_time", now))
+        edge_values.append(data.get("last_modified", now))
+
+    payload = marshal.dumps(
+        (
+            tuple(concepts),
+            tuple(memory_items),
+            node_times.tobytes(),
+            edge_ends.tobytes(),
+            edge_values.tobytes(),
+        )
+    )
+    header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, version, importlib.util.MAGIC_NUMBER)
+    return header + payload
+
+
+def write_graph_snapshot(path: str, data: bytes):
+    """原子地写入快照文件(先写临时文件再替换)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_graph_snapshot_version(path: str) -> int | None:
+    """只读取快照文件头中的数据库变更计数，文件不存在或不兼容时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+    except OSError:
+        return None
+    return _parse_header(header)
+
+
+def load_graph_snapshot(path: str) -> tuple[nx.Graph, int] | None:
+    """读取快照文件并重建记忆图
+
+    Returns:
+        (记忆图, 数据库变更计数)，文件不存在、损坏或不兼容时返回 None
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    version = _parse_header(data[: _HEADER.size])
+    if version is None:
+        return None
+
+    try:
+        concepts, memory_items, node_times_bytes, edge_ends_bytes, edge_values_bytes = marshal.loads(
+            data[_HEADER.size :]
+        )
+        node_times = array("d")
+        node_times.frombytes(node_times_bytes)
+        edge_ends = array("I")
+        edge_ends.frombytes(edge_ends_bytes)
+        edge_values = array("d")
+        edge_values.frombytes(edge_values_bytes)
+    except (EOFError, ValueError, TypeError):
+        return None
+
+    G = nx.Graph()
+    G.add_nodes_from(
+        (
+            concept,
+            {
+                "memory_items": list(items),
+                "created_time": node_times[2 * i],
+                "last_modified": node_times[2 * i + 1],
+            },
+        )
+        for i, (concept, items) in enumerate(zip(concepts, memory_items, strict=True))
+    )
+    G.add_edges_from(
+        (
+            concepts[edge_ends[2 * i]],
+            concepts[edge_ends[2 * i + 1]],
+            {
+                "strength": _as_int(edge_values[3 * i]),
+                "created_time": edge_values[3 * i + 1],
+                "last_modified": edge_values[3 * i + 2],
+            },
+        )
+        for i in range(len(edge_ends) // 2)
+    )
+    return G, version
+
+
+def _parse_header(header: bytes) -> int | None:
+    if len(header) < _HEADER.size:
+        return None
+    magic, format_version, version, python_magic = _HEADER.unpack(header)
+    if magic != _MAGIC or format_version != _FORMAT_VERSION or python_magic != importlib.util.MAGIC_NUMBER:
+        return None
+    return version
+
+
+def _as_int(value: float):
+    """强度在图中通常为整数，保持与从数据库加载时相同的类型"""
+    return int(value) if value.is_integer() else value
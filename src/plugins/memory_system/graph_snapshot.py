@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import networkx as nx
+import numpy as np
+
+
+class MemoryGraphSnapshot:
+    """记忆图的只读快照，用于检索和激活计算
+
+    - 节点名被映射为连续的整数 id
+    - 邻接关系以 CSR 格式保存(indptr/indices)，边强度预先转换为 1/strength
+    - 每个节点的记忆项按节点 id 存放
+
+    networkx 图仍然是可修改的原始结构，快照由 MemoryGraph 在图变化后重建或修补。
+    快照一旦创建即不再修改(修补会生成新的快照对象)，因此可以安全地在其他线程中读取。
+    """
+
+    def __init__(
+        self,
+        node_names: list,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        inv_strength: np.ndarray,
+        memory_items: list,
+        version: int = 0,
+    ):
+        self.node_names = node_names
+        self.node_ids = {name: i for i, name in enumerate(node_names)}
+        self.indptr = indptr
+        self.indices = indices
+        self.inv_strength = inv_strength
+        self.memory_items = memory_items
+        self.version = version
+
+    @classmethod
+    def from_graph(cls, G: nx.Graph, version: int = 0) -> "MemoryGraphSnapshot":
+        """从 networkx 图构建快照，邻居顺序与 G.neighbors 保持一致"""
+        node_names = list(G.nodes())
+        node_ids = {name: i for i, name in enumerate(node_names)}
+        n = len(node_names)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indices = np.empty(2 * G.number_of_edges(), dtype=np.int32)
+        inv_strength = np.empty(2 * G.number_of_edges(), dtype=np.float64)
+        memory_items = []
+
+        pos = 0
+        for i, (name, data) in enumerate(G.nodes(data=True)):
+            for neighbor, edge_data in G.adj[name].items():
+                indices[pos] = node_ids[neighbor]
+                inv_strength[pos] = 1 / edge_data.get("strength", 1)
+                pos += 1
+            indptr[i + 1] = pos
+
+            items = data.get("memory_items", [])
+            if not isinstance(items, list):
+                items = [items] if items else []
+            memory_items.append(tuple(items))
+
+        return cls(node_names, indptr, indices[:pos], inv_strength[:pos], memory_items, version)
+
+    def __len__(self) -> int:
+        return len(self.node_names)
+
+    def __contains__(self, name) -> bool:
+        return name in self.node_ids
+
+    def get_memory_items(self, name) -> tuple:
+        node_id = self.node_ids.get(name)
+        if node_id is None:
+            return ()
+        return self.memory_items[node_id]
+
+    def patched(self, changed_nodes: dict, changed_edges: dict, version: int) -> "MemoryGraphSnapshot | None":
+        """在不改变图结构的前提下生成修补后的新快照
+
+        Args:
+            changed_nodes: {节点名: 新的记忆项列表}
+            changed_edges: {(节点1, 节点2): 新的强度}
+            version: 新快照对应的图版本
+
+        Returns:
+            新快照；如果变更涉及快照中不存在的节点或边则返回 None，需要整体重建
+        """
+        memory_items = self.memory_items
+        if changed_nodes:
+            memory_items = list(memory_items)
+            for name, items in changed_nodes.items():
+                node_id = self.node_ids.get(name)
+                if node_id is None:
+                    return None
+                memory_items[node_id] = tuple(items)
+
+        inv_strength = self.inv_strength
+        if changed_edges:
+            inv_strength = inv_strength.copy()
+            for (name1, name2), strength in changed_edges.items():
+                id1 = self.node_ids.get(name1)
+                id2 = self.node_ids.get(name2)
+                if id1 is None or id2 is None:
+                    return None
+                for u, v in ((id1, id2), (id2, id1)):
+                    row = self.indices[self.indptr[u] : self.indptr[u + 1]]
+                    hit = np.flatnonzero(row == v)
+                    if hit.size == 0:
+                        return None
+                    inv_strength[self.indptr[u] + hit[0]] = 1 / strength
+
+        snapshot = object.__new__(MemoryGraphSnapshot)
+        snapshot.node_names = self.node_names
+        snapshot.node_ids = self.node_ids
+        snapshot.indptr = self.indptr
+        snapshot.indices = self.indices
+        snapshot.inv_strength = inv_strength
+        snapshot.memory_items = memory_items
+        snapshot.version = version
+        return snapshot
+
+    def spread(self, source: int, max_depth: int) -> tuple[np.ndarray, np.ndarray]:
+        """从单个节点开始按层扩散激活
+
+        每经过一条边激活值减少 1/strength，只有激活值为正的节点会被激活并继续扩散。
+        每一层的所有前沿节点一次性向量化展开；同一层内多个父节点指向同一节点时取
+        第一个(按前沿顺序)，与逐个出队的广度优先实现结果完全一致。
+
+        Returns:
+            (节点 id 数组, 激活值数组)，按激活的先后顺序排列，包含起始节点
+        """
+        visited = np.zeros(len(self.node_names), dtype=bool)
+        visited[source] = True
+        frontier = np.array([source], dtype=np.int64)
+        frontier_activation = np.array([1.0])
+        all_ids = [frontier]
+        all_activations = [frontier_activation]
+
+        for _ in range(max_depth):
+            starts = self.indptr[frontier]
+            counts = self.indptr[frontier + 1] - starts
+            total = int(counts.sum())
+            if total == 0:
+                break
+
+            # 展开所有前沿节点的邻接区间，得到每条出边在 CSR 中的位置
+            offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            edge_pos = offsets + np.arange(total)
+            neighbors = self.indices[edge_pos]
+            new_activation = np.repeat(frontier_activation, counts) - self.inv_strength[edge_pos]
+
+            mask = (new_activation > 0) & ~visited[neighbors]
+            neighbors = neighbors[mask]
+            new_activation = new_activation[mask]
+            if neighbors.size == 0:
+                break
+
+            # 同一节点只保留第一次出现，并保持出现顺序
+            _, first = np.unique(neighbors, return_index=True)
+            first.sort()
+            frontier = neighbors[first].astype(np.int64)
+            frontier_activation = new_activation[first]
+            visited[frontier] = True
+            all_ids.append(frontier)
+            all_activations.append(frontier_activation)
+
+        return np.concatenate(all_ids), np.concatenate(all_activations)
+
+    def activate(self, keywords: list, max_depth: int) -> dict:
+        """以多个关键词为中心扩散激活，并累加每个节点的激活值
+
+        Returns:
+            dict: {节点名: 累计激活值}，按首次被激活的顺序排列
+        """
+        activate_map = {}
+        for keyword in keywords:
+            source = self.node_ids.get(keyword)
+            if source is None:
+                continue
+            ids, activations = self.spread(source, max_depth)
+            for node_id, activation in zip(ids.tolist(), activations.tolist(), strict=True):
+                name = self.node_names[node_id]
+                activate_map[name] = activate_map.get(name, 0) + activation
+        return activate_map
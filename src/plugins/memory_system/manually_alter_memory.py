@@ -93,6 +93,8 @@ def add_mem_node(hippocampus: Hippocampus):
         hippocampus.memory_graph.G.add_node(
             concept, memory_items=memory_items, created_time=current_time, last_modified=current_time
         )
+        hippocampus.memory_graph.topic_index.add(concept)
+        hippocampus.memory_graph.node_matcher.add(concept)
 
 
 # 删除概念节点（及连接到它的边）
@@ -111,7 +113,7 @@ def remove_mem_node(hippocampus: Hippocampus):
     console.print(f"[yellow]确定要移除名为“{concept}”的节点以及其相关边吗[/yellow]")
     destory = console.input(f"[red]请输入“{concept}”以删除节点 其他输入将被视为取消操作[/red]\n")
     if destory == concept:
-        hippocampus.memory_graph.G.remove_node(concept)
+        hippocampus.memory_graph.remove_dot(concept)
     else:
         logger.info("[green]删除操作已取消[/green]")
 
@@ -172,7 +174,7 @@ def remove_mem_edge(hippocampus: Hippocampus):
         else:
             accept = console.input("[orange]请输入“确认”以确认删除操作（其他输入视为取消）[/orange]\n")
             if accept.lower() == "确认":
-                hippocampus.memory_graph.G.remove_edge(source, target)
+                hippocampus.memory_graph.remove_edge(source, target)
                 console.print(f"[green]边“{source} <-> {target}”已删除。[green]")
 
 
@@ -353,7 +355,8 @@ async def main():
             print("已结束操作")
             break
 
-        hippocampus.entorhinal_cortex.sync_memory_to_db()
+        # 手动编辑会直接修改节点数据，使用全量同步
+        await hippocampus.entorhinal_cortex.resync_memory_to_db()
 
 
 if __name__ == "__main__":
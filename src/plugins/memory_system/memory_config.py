@@ -11,6 +11,7 @@ class MemoryConfig:
     build_memory_sample_num: int  # 每次构建记忆的样本数量
     build_memory_sample_length: int  # 每个样本的消息长度
     memory_compress_rate: float  # 记忆压缩率
+    build_memory_concurrency: int  # 同时压缩的样本数量上限
 
     # 记忆遗忘相关配置
     memory_forget_time: int  # 记忆遗忘时间（小时）
@@ -22,6 +23,9 @@ class MemoryConfig:
     consolidation_similarity_threshold: float  # 相似度阈值
     consolidate_memory_percentage: float  # 检查节点比例
     consolidate_memory_interval: int  # 记忆整合间隔
+    consolidate_memory_mode: str  # 整合范围: "sample" 按比例抽查节点, "all" 检查全部节点
+
+    memory_keyword_mode: str  # 检索记忆的关键词来源: "llm" 由LLM提取, "match" 匹配文本中出现的节点名
 
     llm_topic_judge: str  # 话题判断模型
     llm_summary: str  # 话题总结模型
@@ -37,12 +41,15 @@ class MemoryConfig:
             build_memory_sample_num=getattr(global_config, "build_memory_sample_num", 5),
             build_memory_sample_length=getattr(global_config, "build_memory_sample_length", 30),
             memory_compress_rate=getattr(global_config, "memory_compress_rate", 0.1),
+            build_memory_concurrency=getattr(global_config, "build_memory_concurrency", 4),
             memory_forget_time=getattr(global_config, "memory_forget_time", 24 * 7),
             memory_ban_words=getattr(global_config, "memory_ban_words", []),
             # 新增加载整合配置，并提供默认值
             consolidation_similarity_threshold=getattr(global_config, "consolidation_similarity_threshold", 0.7),
             consolidate_memory_percentage=getattr(global_config, "consolidate_memory_percentage", 0.01),
             consolidate_memory_interval=getattr(global_config, "consolidate_memory_interval", 1000),
+            consolidate_memory_mode=getattr(global_config, "consolidate_memory_mode", "sample"),
+            memory_keyword_mode=getattr(global_config, "memory_keyword_mode", "llm"),
             llm_topic_judge=getattr(global_config, "llm_topic_judge", "default_judge_model"),  # 添加默认模型名
             llm_summary=getattr(global_config, "llm_summary", "default_summary_model"),  # 添加默认模型名
         )
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+
+class NodeNameAutomaton:
+    """由 NodeNameMatcher 编译出的 Aho–Corasick 自动机，创建后不再修改，可以安全地在其他线程中使用"""
+
+    __slots__ = ("_goto", "_fail", "_outputs")
+
+    def __init__(self, goto: list, fail: list, outputs: list):
+        self._goto = goto  # 状态 -> {字符: 下一状态}
+        self._fail = fail  # 状态 -> 失配时跳转的状态
+        self._outputs = outputs  # 状态 -> 在此结束的所有节点名(含沿失配链可达的)
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find_all(self, text: str, drop_nested: bool = True) -> list:
+        """单次线性扫描找出文本中出现的所有节点名
+
+        Args:
+            text: 待匹配文本
+            drop_nested: 是否丢弃被另一个更长匹配完全包含的匹配(如同时命中"猫猫"和"猫"时只保留"猫猫")
+
+        Returns:
+            list: 去重后的节点名，按在文本中首次出现的位置排列
+        """
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        matches = []  # (起始位置, 结束位置, 节点名)
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for name in outputs[state]:
+                matches.append((end - len(name), end, name))
+
+        # 按起始位置升序、长度降序排列，被之前匹配覆盖的即为嵌套匹配
+        matches.sort(key=lambda match: (match[0], -match[1]))
+        found = {}
+        covered_end = 0
+        for start, end, name in matches:
+            if drop_nested and end <= covered_end:
+                continue
+            covered_end = max(covered_end, end)
+            found.setdefault(name, start)
+        return list(found)
+
+
+class NodeNameMatcher:
+    """记忆图节点名的字典树，随节点增删增量更新，按需编译为 Aho–Corasick 自动机
+
+    增删节点名只修改字典树中对应的路径；失配指针在下次 compile 时一次性计算，
+    编译结果在下次增删前一直被缓存，因此两次图结构变化之间的所有检索共用同一个自动机。
+    字典树只能在一个线程中修改和编译；需要在其他线程中编译时，用 names() 取出节点名交给 compile_names。
+    """
+
+    def __init__(self):
+        self._children: list[dict] = [{}]  # 字典树状态 -> {字符: 子状态}，0 为根
+        self._word: list = [None]  # 以该状态结尾的节点名
+        self._pass: list[int] = [0]  # 经过该状态的节点名数量，为 0 时路径可以回收
+        self._free: list[int] = []  # 可复用的状态编号
+        self._names: set = set()
+        self._version = 0  # 每次增删递增
+        self._automaton: NodeNameAutomaton | None = None  # 最近一次编译的自动机，可能已过期
+        self._automaton_version = -1
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str):
+        """加入节点名，已存在或为空时忽略"""
+        if not name or name in self._names:
+            return
+        self._names.add(name)
+        state = 0
+        self._pass[0] += 1
+        for char in name:
+            child = self._children[state].get(char)
+            if child is None:
+                child = self._new_state()
+                self._children[state][char] = child
+            state = child
+            self._pass[state] += 1
+        self._word[state] = name
+        self._version += 1
+
+    def remove(self, name: str):
+        """移除节点名，不存在时忽略"""
+        if name not in self._names:
+            return
+        self._names.discard(name)
+        state = 0
+        self._pass[0] -= 1
+        for char in name:
+            child = self._children[state][char]
+            self._pass[child] -= 1
+            if self._pass[child] == 0:
+                # 之后的路径只属于这个节点名，整段回收
+                del self._children[state][char]
+                self._release(child)
+                break
+            state = child
+        else:
+            self._word[state] = None
+        self._version += 1
+
+    def rebuild(self, names):
+        """按给定的节点名整体重建"""
+        self.clear()
+        for name in names:
+            self.add(name)
+
+    def clear(self):
+        self._children = [{}]
+        self._word = [None]
+        self._pass = [0]
+        self._free = []
+        self._names = set()
+        self._version += 1
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def names(self) -> tuple:
+        return tuple(self._names)
+
+    def is_compiled(self) -> bool:
+        """最近一次编译的自动机是否与当前节点名一致"""
+        return self._automaton_version == self._version
+
+    def latest_automaton(self) -> NodeNameAutomaton | None:
+        """最近一次编译的自动机，之后可能已有节点名增删，从未编译过时为 None"""
+        return self._automaton
+
+    def set_automaton(self, version: int, automaton: NodeNameAutomaton):
+        """保存在其他线程中由 version 时的 names() 编译出的自动机，比已有的旧时忽略"""
+        if version > self._automaton_version:
+            self._automaton = automaton
+            self._automaton_version = version
+
+    @staticmethod
+    def compile_names(names) -> NodeNameAutomaton:
+        """由节点名构建新的自动机，不访问任何已有实例，可以在其他线程中执行"""
+        matcher = NodeNameMatcher()
+        for name in names:
+            matcher.add(name)
+        return matcher.compile()
+
+    def compile(self) -> NodeNameAutomaton:
+        """返回当前节点名对应的自动机(无变化时直接返回缓存)"""
+        if self.is_compiled():
+            return self._automaton
+
+        # 按层遍历字典树，状态重新编号为连续整数，同时计算失配指针和输出
+        goto = [{}]
+        fail = [0]
+        outputs = [()]
+        queue = [(0, 0)]  # (字典树状态, 自动机状态)
+        for trie_state, state in queue:
+            for char, trie_child in self._children[trie_state].items():
+                child = len(goto)
+                goto[state][char] = child
+                goto.append({})
+
+                if state == 0:
+                    child_fail = 0
+                else:
+                    f = fail[state]
+                    while f and char not in goto[f]:
+                        f = fail[f]
+                    child_fail = goto[f].get(char, 0)
+                fail.append(child_fail)
+
+                word = self._word[trie_child]
+                outputs.append((word, *outputs[child_fail]) if word else outputs[child_fail])
+                queue.append((trie_child, child))
+
+        self.set_automaton(self._version, NodeNameAutomaton(goto, fail, outputs))
+        return self._automaton
+
+    def _new_state(self) -> int:
+        if self._free:
+            state = self._free.pop()
+            self._children[state] = {}
+            self._word[state] = None
+            self._pass[state] = 0
+            return state
+        self._children.append({})
+        self._word.append(None)
+        self._pass.append(0)
+        return len(self._children) - 1
+
+    def _release(self, state: int):
+        """回收以 state 为根的整条路径"""
+        stack = [state]
+        while stack:
+            current = stack.pop()
+            stack.extend(self._children[current].values())
+            self._children[current] = {}
+            self._word[current] = None
+            self._pass[current] = 0
+            self._free.append(current)
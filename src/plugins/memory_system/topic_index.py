@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import math
+from collections import Counter
+
+import jieba
+
+
+def tokenize_topic(text: str) -> frozenset:
+    """使用与记忆检索相同的方式(jieba全量分词后取集合)对话题进行分词"""
+    return frozenset(jieba.cut(text))
+
+
+class TopicTokenIndex:
+    """记忆图话题的倒排索引: 分词 -> 包含该分词的话题集合
+
+    检索时只需遍历查询分词对应的倒排表即可得到所有与查询存在共同分词的候选话题，
+    再用候选话题与查询的共同分词数直接算出二值向量的余弦相似度，
+    无需对图中每个节点重新分词，检索开销只与命中的倒排表长度相关。
+    """
+
+    def __init__(self):
+        self._postings: dict[str, set[str]] = {}  # 分词 -> 话题集合
+        self._topic_tokens: dict[str, frozenset] = {}  # 话题 -> 分词集合(缓存)
+        self._topic_order: dict[str, int] = {}  # 话题 -> 插入序号，与图中节点顺序一致
+        self._next_order = 0
+
+    def __contains__(self, topic) -> bool:
+        return topic in self._topic_tokens
+
+    def __len__(self) -> int:
+        return len(self._topic_tokens)
+
+    def add(self, topic: str):
+        """将话题加入索引，已存在时忽略"""
+        if topic in self._topic_tokens:
+            return
+        tokens = tokenize_topic(topic)
+        self._topic_tokens[topic] = tokens
+        self._topic_order[topic] = self._next_order
+        self._next_order += 1
+        for token in tokens:
+            self._postings.setdefault(token, set()).add(topic)
+
+    def remove(self, topic: str):
+        """将话题从索引中移除，不存在时忽略"""
+        tokens = self._topic_tokens.pop(topic, None)
+        if tokens is None:
+            return
+        del self._topic_order[topic]
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(topic)
+            if not posting:
+                del self._postings[token]
+
+    def rebuild(self, topics):
+        """按给定顺序重建整个索引"""
+        self.clear()
+        for topic in topics:
+            self.add(topic)
+
+    def clear(self):
+        self._postings.clear()
+        self._topic_tokens.clear()
+        self._topic_order.clear()
+        self._next_order = 0
+
+    def get_tokens(self, topic: str) -> frozenset:
+        """获取话题的分词集合，优先使用缓存"""
+        tokens = self._topic_tokens.get(topic)
+        if tokens is None:
+            tokens = tokenize_topic(topic)
+        return tokens
+
+    def search(self, text: str, threshold: float) -> list[tuple[str, float]]:
+        """查找与文本分词余弦相似度不低于阈值的话题
+
+        Args:
+            text (str): 查询文本
+            threshold (float): 相似度阈值
+
+        Returns:
+            list: [(话题, 相似度)]，按相似度降序排列，相似度相同时按话题加入顺序排列
+        """
+        query_tokens = tokenize_topic(text)
+        if not query_tokens:
+            return []
+
+        # 倒排表合并：统计每个候选话题与查询共有的分词数
+        overlaps = Counter()
+        for token in query_tokens:
+            posting = self._postings.get(token)
+            if posting:
+                overlaps.update(posting)
+
+        query_norm = math.sqrt(len(query_tokens))
+        results = []
+        for topic, overlap in overlaps.items():
+            # 二值向量的余弦相似度 = 交集大小 / (|A|^0.5 * |B|^0.5)
+            similarity = overlap / (query_norm * math.sqrt(len(self._topic_tokens[topic])))
+            if similarity >= threshold:
+                results.append((topic, similarity))
+
+        results.sort(key=lambda x: (-x[1], self._topic_order[x[0]]))
+        return results
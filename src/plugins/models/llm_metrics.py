@@ -0,0 +1,136 @@
+"""LLM 请求的进程内指标
+
+按 (模型, request_type) 记录请求延迟、token 用量和费用的直方图，以及重试、模型路由器补发请求次数和错误类型的计数，
+由 src/api/metrics.py 以 Prometheus 文本格式输出。只在内存中累加，不进行任何 IO，
+每次记录只是几次字典查找和二分查找(微秒级)。进程重启后指标清零，历史用量仍以 db.llm_usage 为准。
+"""
+
+import bisect
+import threading
+import weakref
+from typing import Dict, Iterable, List, Tuple
+
+# 直方图的桶上界，最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+COST_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)
+
+
+class Histogram:
+    """累积直方图，桶计数在输出时再累加"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterable[Tuple[str, int]]:
+        """(le, 累计数量)，le 为 Prometheus 的桶上界标签"""
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts, strict=True):
+            total += count
+            yield (bound if isinstance(bound, str) else repr(float(bound))), total
+
+
+class LLMMetrics:
+    """LLMRequest 的请求指标，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (模型, request_type) -> 直方图
+        self.latency: Dict[tuple, Histogram] = {}
+        self.tokens: Dict[tuple, Histogram] = {}
+        self.cost: Dict[tuple, Histogram] = {}
+        # (模型, request_type, 类别) -> 计数
+        self.requests: Dict[tuple, int] = {}  # 类别为 success / error
+        self.token_totals: Dict[tuple, int] = {}  # 类别为 prompt / completion
+        self.errors: Dict[tuple, int] = {}  # 类别为异常类名，每次失败的尝试都计数
+        # (模型, request_type) -> 计数
+        self.retries: Dict[tuple, int] = {}
+        self.hedged: Dict[tuple, int] = {}  # 模型路由器补发请求的次数，模型为路由器的首选模型
+        self.hedge_wins: Dict[tuple, int] = {}  # 补发的请求先返回的次数
+        self._routers = weakref.WeakSet()
+
+    def observe_request(self, model: str, request_type: str, seconds: float, success: bool):
+        """记录一次完整请求(包括重试)的耗时和结果"""
+        key = (model, request_type)
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            outcome = (model, request_type, "success" if success else "error")
+            self.requests[outcome] = self.requests.get(outcome, 0) + 1
+
+    def observe_error(self, model: str, request_type: str, error: BaseException):
+        """记录一次失败的尝试(之后可能还会重试)"""
+        key = (model, request_type, type(error).__name__)
+        with self._lock:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe_retry(self, model: str, request_type: str):
+        key = (model, request_type)
+        with self._lock:
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def observe_hedge(self, model: str, request_type: str, won: bool):
+        """记录模型路由器的一次补发请求，won 表示补发的请求先返回"""
+        key = (model, request_type)
+        with self._lock:
+            counters = self.hedge_wins if won else self.hedged
+            counters[key] = counters.get(key, 0) + 1
+
+    def observe_usage(self, model: str, request_type: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        """记录一次请求的 token 用量和费用"""
+        key = (model, request_type)
+        with self._lock:
+            tokens = self.tokens.get(key)
+            if tokens is None:
+                tokens = self.tokens[key] = Histogram(TOKEN_BUCKETS)
+                self.cost[key] = Histogram(COST_BUCKETS)
+            tokens.observe(prompt_tokens + completion_tokens)
+            self.cost[key].observe(cost)
+            for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+                total_key = (model, request_type, kind)
+                self.token_totals[total_key] = self.token_totals.get(total_key, 0) + count
+
+    def register_router(self, router):
+        """登记模型路由器，输出指标时附带各端点的近期延迟和健康状态"""
+        self._routers.add(router)
+
+    def routers(self) -> List:
+        return list(self._routers)
+
+    def snapshot(self) -> dict:
+        """复制当前指标，输出时不持有锁"""
+        with self._lock:
+            return {
+                "latency": {key: _copy(histogram) for key, histogram in self.latency.items()},
+                "tokens": {key: _copy(histogram) for key, histogram in self.tokens.items()},
+                "cost": {key: _copy(histogram) for key, histogram in self.cost.items()},
+                "requests": dict(self.requests),
+                "token_totals": dict(self.token_totals),
+                "errors": dict(self.errors),
+                "retries": dict(self.retries),
+                "hedged": dict(self.hedged),
+                "hedge_wins": dict(self.hedge_wins),
+            }
+
+
+def _copy(histogram: Histogram) -> Histogram:
+    copied = Histogram(histogram.buckets)
+    copied.counts = list(histogram.counts)
+    copied.sum = histogram.sum
+    copied.count = histogram.count
+    return copied
+
+
+llm_metrics = LLMMetrics()
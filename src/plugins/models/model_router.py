@@ -0,0 +1,190 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.common.logger import get_module_logger
+from ...config.config import global_config
+from .llm_metrics import llm_metrics
+
+logger = get_module_logger("model_router")
+
+
+class EndpointStats:
+    """单个模型端点的近期延迟和错误率，只统计最近 WINDOW 秒内的结果"""
+
+    WINDOW = 300
+    MAX_SAMPLES = 100
+    MIN_SAMPLES = 5  # 样本少于该数量时视为延迟未知，会被优先尝试以获得数据
+    FAILURE_COOLDOWN = 30  # 连续失败后暂停使用的秒数
+    MAX_CONSECUTIVE_FAILURES = 3
+
+    def __init__(self):
+        self.latencies: deque = deque(maxlen=self.MAX_SAMPLES)  # (时间, 延迟)
+        self.outcomes: deque = deque(maxlen=self.MAX_SAMPLES)  # (时间, 是否成功)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency: float):
+        now = time.monotonic()
+        self.latencies.append((now, latency))
+        self.outcomes.append((now, True))
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        now = time.monotonic()
+        self.outcomes.append((now, False))
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.MAX_CONSECUTIVE_FAILURES:
+            self.cooldown_until = now + self.FAILURE_COOLDOWN
+
+    def percentile(self, q: float) -> Optional[float]:
+        """近期延迟的百分位数，样本不足时返回 None"""
+        since = time.monotonic() - self.WINDOW
+        values = sorted(latency for at, latency in self.latencies if at >= since)
+        if len(values) < self.MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+    def error_rate(self) -> float:
+        since = time.monotonic() - self.WINDOW
+        recent = [ok for at, ok in self.outcomes if at >= since]
+        if len(recent) < self.MIN_SAMPLES:
+            return 0.0
+        return 1 - sum(recent) / len(recent)
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until and self.error_rate() <= 0.5
+
+
+class EndpointStatsPool:
+    """按 (base_url, 模型名) 共享端点统计，同一模型的所有 LLMRequest / ModelRouter 实例共用延迟和错误数据"""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], EndpointStats] = {}
+
+    def get(self, base_url: str, model: str) -> EndpointStats:
+        stats = self._stats.get((base_url, model))
+        if stats is None:
+            stats = EndpointStats()
+            self._stats[(base_url, model)] = stats
+        return stats
+
+
+endpoint_stats_pool = EndpointStatsPool()
+
+
+class ModelRouter:
+    """在多个等价的模型端点之间选择
+
+    - 按近期 p50 延迟从低到高选择健康的端点，延迟未知的端点按配置顺序优先尝试
+    - 请求失败时依次换用下一个端点
+    - hedge 为 True 时，主请求超过该端点近期延迟的 hedge_percentile 百分位仍未返回，
+      就向下一个端点补发一次请求，先成功的结果生效，另一个请求被取消
+    """
+
+    def __init__(self, endpoints: list, request_type: str):
+        self.endpoints = endpoints
+        self.request_type = request_type
+        self.stats = [endpoint_stats_pool.get(endpoint.base_url, endpoint.model_name) for endpoint in endpoints]
+        self.hedge = request_type in global_config.llm_hedge_request_types
+        self.hedged_total = 0
+        self.hedge_wins = 0
+        llm_metrics.register_router(self)
+
+    def ranked(self) -> List[int]:
+        """按优先顺序返回端点下标，不健康的端点排在最后"""
+        healthy, unhealthy = [], []
+        for index, stats in enumerate(self.stats):
+            (healthy if stats.healthy() else unhealthy).append(index)
+        healthy.sort(key=lambda index: (self.stats[index].percentile(50) or 0.0, index))
+        return healthy + unhealthy
+
+    async def run(
+        self, call: Callable[[Any], Awaitable], hedge: bool = True, can_failover: Callable[[], bool] = None
+    ) -> Any:
+        """call 接收一个端点(LLMRequest)并发起请求
+
+        hedge 为 False 时不补发请求；can_failover 返回 False 时请求失败后不再换用下一个端点(如已经输出了部分流式内容)
+        """
+        order = self.ranked()
+        if hedge and self.hedge and len(order) > 1:
+            delay = self.stats[order[0]].percentile(global_config.llm_hedge_percentile)
+            if delay is not None:
+                return await self._run_hedged(call, order, delay)
+        return await self._run_failover(call, order, can_failover)
+
+    def get_stats(self) -> list:
+        return [
+            {
+                "model": endpoint.model_name,
+                "provider": endpoint.provider,
+                "p50": stats.percentile(50),
+                "p95": stats.percentile(95),
+                "error_rate": round(stats.error_rate(), 3),
+                "healthy": stats.healthy(),
+            }
+            for endpoint, stats in zip(self.endpoints, self.stats, strict=True)
+        ]
+
+    async def _call(self, index: int, call: Callable[[Any], Awaitable]) -> Any:
+        start = time.monotonic()
+        try:
+            result = await call(self.endpoints[index])
+        except asyncio.CancelledError:
+            raise  # 被取消的请求(hedge 落败)不计入统计
+        except Exception:
+            self.stats[index].record_failure()
+            raise
+        self.stats[index].record_success(time.monotonic() - start)
+        return result
+
+    async def _run_failover(
+        self, call: Callable[[Any], Awaitable], order: List[int], can_failover: Callable[[], bool] = None
+    ) -> Any:
+        last_error = None
+        for index in order:
+            try:
+                return await self._call(index, call)
+            except Exception as e:
+                if can_failover is not None and not can_failover():
+                    raise
+                last_error = e
+                logger.warning(f"模型 {self.endpoints[index].model_name} 请求失败，尝试下一个模型: {str(e)}")
+        raise last_error
+
+    async def _run_hedged(self, call: Callable[[Any], Awaitable], order: List[int], delay: float) -> Any:
+        primary = asyncio.create_task(self._call(order[0], call))
+        tasks = {primary: order[0]}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done:
+                # 主请求慢于近期的大部分请求，向下一个端点补发
+                self.hedged_total += 1
+                llm_metrics.observe_hedge(self.endpoints[0].model_name, self.request_type, won=False)
+                logger.debug(
+                    f"模型 {self.endpoints[order[0]].model_name} 超过 {delay:.2f} 秒未返回，"
+                    f"向 {self.endpoints[order[1]].model_name} 补发请求"
+                )
+                tasks[asyncio.create_task(self._call(order[1], call))] = order[1]
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                            llm_metrics.observe_hedge(self.endpoints[0].model_name, self.request_type, won=True)
+                        return task.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # 已尝试的端点都失败了，按顺序尝试剩下的
+        remaining = [index for index in order if index not in tasks.values()]
+        if remaining:
+            return await self._run_failover(call, remaining)
+        raise primary.exception()
@@ -0,0 +1,261 @@
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from src.common.logger import get_module_logger
+from ...config.config import global_config
+
+logger = get_module_logger("provider_scheduler")
+
+# 不直接影响回复的后台请求类型，排队时让位于回复相关的请求
+BACKGROUND_REQUEST_TYPES = {"memory", "topic", "schedule", "relation", "qv_name", "emoji"}
+
+
+def request_priority(request_type: str) -> int:
+    """数值越小越优先"""
+    return 1 if request_type in BACKGROUND_REQUEST_TYPES else 0
+
+
+class TokenBucket:
+    """按每分钟额度匀速补充的令牌桶，额度为 0 表示不限制
+
+    容量只有半秒的额度，请求被均匀地分散开，避免在一分钟开头集中发出而触发服务商的短时限制。
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * 0.5) if per_minute > 0 else 0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """距离桶内有 amount 个令牌还需等待的秒数"""
+        if self.capacity <= 0:
+            return 0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def consume(self, amount: float, now: float):
+        """扣除令牌，允许透支，透支后的请求需等待补足"""
+        if self.capacity <= 0:
+            return
+        self._refill(now)
+        self.level -= amount
+
+
+class SlotOutcome:
+    """一次请求的结果，由调用方在请求过程中标记"""
+
+    def __init__(self):
+        self.limited = False
+        self.retry_after = None
+        self.backoff = 0.0
+        self.failed = False
+
+    def rate_limited(self, retry_after: float = None, backoff: float = 0.0):
+        """标记请求受限(429)，backoff 为请求自身重试策略的退避时间，没有 Retry-After 时暂停时间不短于它"""
+        self.limited = True
+        self.retry_after = retry_after
+        self.backoff = backoff
+
+
+class ProviderScheduler:
+    """单个服务商的请求调度器
+
+    同一服务商的所有 LLMRequest 共用，负责：
+    - 请求数(rpm)和token数(tpm)令牌桶
+    - 并发上限按 AIMD 自适应：成功时缓慢增加，收到 429 时减半，延迟明显升高时小幅降低
+    - 收到 429 后整个服务商暂停一段时间(优先使用 Retry-After，否则不短于请求重试策略的退避时间)，
+      而不是每个协程各自退避
+    - 排队的请求按优先级放行，同一优先级先到先得
+    """
+
+    MIN_PAUSE = 1.0
+    MAX_PAUSE = 60.0
+    DECREASE_COOLDOWN = 1.0  # 同一批并发请求的多个 429 只降低一次并发上限
+    LATENCY_MIN_SAMPLES = 10
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, max_concurrency: int = 16, latency_factor: float = 3):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.latency_factor = latency_factor
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._pause = self.MIN_PAUSE
+        self._last_decrease = 0.0
+        self._latency: dict[str, list] = {}  # 模型 -> [短期均值, 长期均值, 样本数]
+        self._waiters: list = []  # (优先级, 序号, future, 预估token数)
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+        # 统计
+        self.granted_total = 0
+        self.rate_limited_total = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0, tokens: int = 0, model: str = ""):
+        """排队获取一个请求名额，退出上下文时归还并根据结果调整并发上限"""
+        await self._acquire(priority, tokens)
+        outcome = SlotOutcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        except BaseException:
+            outcome.failed = True
+            raise
+        finally:
+            self._release(outcome, model, time.monotonic() - start)
+
+    def consume_tokens(self, amount: int):
+        """记录请求实际使用的token数"""
+        self.tokens.consume(amount, time.monotonic())
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": sum(1 for waiter in self._waiters if not waiter[2].done()),
+            "concurrency_limit": round(self.concurrency, 2),
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            "granted_total": self.granted_total,
+            "rate_limited_total": self.rate_limited_total,
+        }
+
+    async def _acquire(self, priority: int, tokens: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, tokens))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已经分配到名额但任务被取消，归还名额
+                self.in_flight -= 1
+                self._dispatch()
+            raise
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self._waiters:
+            _, _, future, tokens = self._waiters[0]
+            if future.done():  # 等待中被取消
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.concurrency):
+                return  # 有请求结束时会再次调度
+            wait = max(
+                self.paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now),
+            )
+            if wait > 0:
+                self._schedule(wait)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.consume(1, now)
+            self.in_flight += 1
+            self.granted_total += 1
+            future.set_result(None)
+
+    def _schedule(self, delay: float):
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._timer is not None and not self._timer.cancelled() and self._timer.when() <= when:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, outcome: SlotOutcome, model: str, latency: float):
+        self.in_flight -= 1
+        now = time.monotonic()
+        if outcome.limited:
+            self.rate_limited_total += 1
+            self._decrease(now, 0.5)
+            pause = outcome.retry_after if outcome.retry_after else max(self._pause, outcome.backoff)
+            if now + pause > self.paused_until:
+                self.paused_until = now + pause
+                logger.warning(
+                    f"服务商 {self.name} 请求受限(429)，暂停 {pause:.1f} 秒，并发上限降为 {int(self.concurrency)}"
+                )
+            self._pause = min(self.MAX_PAUSE, self._pause * 2)
+        elif not outcome.failed:
+            self._pause = self.MIN_PAUSE
+            if self._latency_too_high(model, latency):
+                self._decrease(now, 0.9)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        self._dispatch()
+
+    def _decrease(self, now: float, factor: float):
+        if now - self._last_decrease < self.DECREASE_COOLDOWN:
+            return
+        self.concurrency = max(1.0, self.concurrency * factor)
+        self._last_decrease = now
+
+    def _latency_too_high(self, model: str, latency: float) -> bool:
+        """短期平均延迟超过长期平均的 latency_factor 倍时视为服务商过载，按模型分别统计"""
+        if self.latency_factor <= 0:
+            return False
+        stats = self._latency.get(model)
+        if stats is None:
+            self._latency[model] = [latency, latency, 1]
+            return False
+        stats[0] = 0.3 * latency + 0.7 * stats[0]
+        stats[1] = 0.02 * latency + 0.98 * stats[1]
+        stats[2] += 1
+        return stats[2] >= self.LATENCY_MIN_SAMPLES and stats[0] > self.latency_factor * stats[1]
+
+
+class SchedulerPool:
+    """按 base_url 共享调度器，调度器内部的 future 和定时器绑定事件循环，因此按事件循环分别保存"""
+
+    def __init__(self):
+        self._schedulers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def get(self, base_url: str, provider: str) -> ProviderScheduler:
+        loop = asyncio.get_running_loop()
+        schedulers = self._schedulers.setdefault(loop, {})
+        scheduler = schedulers.get(base_url)
+        if scheduler is None:
+            limits = global_config.llm_provider_rate_limits.get(provider, {})
+            # 服务商的连接数上限由这里的并发数保证(所有服务商共用一个连接池，见 session_pool)
+            connection_limit = global_config.llm_provider_connection_limits.get(
+                provider, global_config.llm_connection_limit_per_host
+            )
+            max_concurrency = min(limits.get("concurrency", connection_limit), connection_limit)
+            scheduler = ProviderScheduler(
+                provider,
+                rpm=limits.get("rpm", 0),
+                tpm=limits.get("tpm", 0),
+                max_concurrency=max_concurrency,
+                latency_factor=global_config.llm_latency_backoff_factor,
+            )
+            schedulers[base_url] = scheduler
+        return scheduler
+
+    def get_stats(self) -> dict:
+        """当前事件循环中各服务商调度器的状态"""
+        try:
+            schedulers = self._schedulers.get(asyncio.get_running_loop(), {})
+        except RuntimeError:
+            return {}
+        return {scheduler.name: scheduler.get_stats() for scheduler in schedulers.values()}
+
+
+scheduler_pool = SchedulerPool()
@@ -0,0 +1,73 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from src.common.logger import get_module_logger
+from ...config.config import global_config
+
+logger = get_module_logger("session_pool")
+
+
+class ProviderSessionPool:
+    """按服务商共享的长连接 aiohttp 会话池
+
+    每个服务商一个 ClientSession，连接在请求之间保持(keep-alive)，避免每次请求都重新进行 DNS 解析、
+    TCP 握手和 TLS 协商。所有服务商的会话共用一个 TCPConnector，因此 connection_limit 是总连接数上限；
+    连接器的单主机上限取各服务商上限中的最大值，每个服务商自己的上限由其调度器的并发数保证
+    (请求都在 scheduler.slot 内发出)。aiohttp 会话和连接器绑定创建它的事件循环，因此按事件循环分别保存。
+    """
+
+    def __init__(self):
+        # 事件循环 -> {服务商: 会话}，事件循环被回收后对应的会话一并丢弃
+        self._sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # 事件循环 -> 共享的连接器
+        self._connectors: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @asynccontextmanager
+    async def session(self, provider: str):
+        """获取服务商对应的共享会话，退出上下文时不关闭会话"""
+        yield self.get_session(provider)
+
+    def get_session(self, provider: str) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        sessions = self._sessions.setdefault(loop, {})
+        session = sessions.get(provider)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=self._get_connector(loop), connector_owner=False)
+            sessions[provider] = session
+            logger.debug(f"为服务商 {provider} 创建会话")
+        return session
+
+    def _get_connector(self, loop: asyncio.AbstractEventLoop) -> aiohttp.TCPConnector:
+        connector = self._connectors.get(loop)
+        if connector is None or connector.closed:
+            limit_per_host = max(
+                [global_config.llm_connection_limit_per_host, *global_config.llm_provider_connection_limits.values()]
+            )
+            connector = aiohttp.TCPConnector(
+                limit=global_config.llm_connection_limit,
+                limit_per_host=limit_per_host,
+                keepalive_timeout=global_config.llm_keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._connectors[loop] = connector
+            logger.debug("创建共享连接池")
+        return connector
+
+    async def close(self):
+        """关闭当前事件循环中的所有会话和共享连接池，在程序退出前调用"""
+        loop = asyncio.get_running_loop()
+        sessions = self._sessions.pop(loop, {})
+        for provider, session in sessions.items():
+            if not session.closed:
+                await session.close()
+                logger.debug(f"已关闭服务商 {provider} 的会话")
+        connector = self._connectors.pop(loop, None)
+        if connector is not None and not connector.closed:
+            await connector.close()
+            logger.debug("已关闭共享连接池")
+
+
+session_pool = ProviderSessionPool()
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+from src.common.logger import get_module_logger
+from ...common.database import db
+from ...config.config import global_config
+
+logger = get_module_logger("usage_recorder")
+
+
+class UsageRecorder:
+    """LLM 用量记录缓冲区
+
+    记录先放入进程内缓冲区，由后台任务用 insert_many 批量写入 llm_usage 集合，
+    缓冲条数达到 flush_size 或距上次写入超过 flush_interval 秒时触发写入。
+    数据库写入在线程中执行，不阻塞事件循环；写入失败的记录会放回缓冲区等待下次重试。
+    """
+
+    def __init__(self, flush_size: int = None, flush_interval: float = None, max_buffer: int = 10000):
+        self.flush_size = flush_size or global_config.llm_usage_flush_size
+        self.flush_interval = flush_interval or global_config.llm_usage_flush_interval
+        self.max_buffer = max_buffer  # 数据库长时间不可用时最多保留的记录数，超出后丢弃最旧的记录
+
+        self._buffer: list[dict] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_lock: asyncio.Lock | None = None
+
+        # 指标
+        self.recorded_total = 0
+        self.flushed_total = 0
+        self.dropped_total = 0
+        self.flush_count = 0
+        self.flush_failures = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def record(self, usage_data: dict):
+        """加入一条用量记录，不进行任何 IO"""
+        self._buffer.append(usage_data)
+        self.recorded_total += 1
+        self._trim()
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中(如同步脚本)，直接写入
+            self.flush_sync()
+            return
+
+        self._ensure_task()
+        if len(self._buffer) >= self.flush_size:
+            self._wakeup.set()
+
+    def get_metrics(self) -> dict:
+        return {
+            "buffer_depth": len(self._buffer),
+            "recorded_total": self.recorded_total,
+            "flushed_total": self.flushed_total,
+            "dropped_total": self.dropped_total,
+            "flushes_total": self.flush_count,
+            "flush_failures_total": self.flush_failures,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+        }
+
+    async def flush(self):
+        """将缓冲区中的记录写入数据库"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(db.llm_usage.insert_many, batch, ordered=False)
+            except Exception as e:
+                self._requeue(batch)
+                self.flush_failures += 1
+                logger.error(f"批量写入token使用情况失败({len(batch)} 条)，稍后重试: {str(e)}")
+                return
+            self._flushed(batch, time.perf_counter() - start)
+
+    def flush_sync(self):
+        """同步写入缓冲区中的记录，用于没有事件循环的场景"""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        start = time.perf_counter()
+        try:
+            db.llm_usage.insert_many(batch, ordered=False)
+        except Exception as e:
+            self._requeue(batch)
+            self.flush_failures += 1
+            logger.error(f"写入token使用情况失败({len(batch)} 条): {str(e)}")
+            return
+        self._flushed(batch, time.perf_counter() - start)
+
+    async def close(self):
+        """停止后台任务并写入剩余记录，在程序退出前调用"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._wakeup = None
+        await self.flush()
+        self._flush_lock = None
+        if self._buffer:
+            logger.warning(f"程序退出时仍有 {len(self._buffer)} 条token使用记录未能写入")
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        # 首次使用或事件循环已更换时创建后台任务
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _flushed(self, batch: list, latency: float):
+        self.flushed_total += len(batch)
+        self.flush_count += 1
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        logger.trace(f"写入 {len(batch)} 条token使用记录，耗时 {latency * 1000:.1f}ms")
+
+    def _requeue(self, batch: list):
+        self._buffer[:0] = batch
+        self._trim()
+
+    def _trim(self):
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped_total += overflow
+
+
+usage_recorder = UsageRecorder()
@@ -1,8 +1,9 @@
 import asyncio
 import json
 import re
+import time
 from datetime import datetime
-from typing import Tuple, Union, Dict, Any
+from typing import Awaitable, Callable, Tuple, Union, Dict, Any
 
 import aiohttp
 from aiohttp.client import ClientResponse
@@ -13,7 +14,14 @@ from PIL import Image
 import io
 import os
 from ...common.database import db
+from ...common.embedding_cache import EmbeddingCache, get_embedding_cache
+from ...common.image_executor import image_executor
 from ...config.config import global_config
+from .llm_metrics import llm_metrics
+from .model_router import ModelRouter
+from .provider_scheduler import request_priority, scheduler_pool
+from .session_pool import session_pool
+from .usage_recorder import usage_recorder
 
 logger = get_module_logger("model_utils")
 
@@ -41,6 +49,17 @@ class RequestAbortException(Exception):
         return self.message
 
 
+class RateLimitException(Exception):
+    """自定义异常类，用于处理服务商请求限制(429)"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
 class PermissionDeniedException(Exception):
     """自定义异常类，用于处理访问拒绝的异常"""
 
@@ -83,11 +102,21 @@ class LLMRequest:
         "o4-mini-2025-04-16",
     ]
 
+    # 默认重试策略，单次请求可通过 retry_policy 覆盖部分字段
+    DEFAULT_RETRY_POLICY = {
+        "max_retries": 3,
+        "base_wait": 10,
+        "retry_codes": [429, 413, 500, 503],
+        "abort_codes": [400, 401, 402, 403],
+    }
+
     def __init__(self, model: dict, **kwargs):
         # 将大写的配置键转换为小写并从config中获取实际值
         try:
             self.api_key = os.environ[model["key"]]
             self.base_url = os.environ[model["base_url"]]
+            # 服务商名称，如 SILICONFLOW，用于选择共享连接池
+            self.provider = model["base_url"].removesuffix("_BASE_URL")
         except AttributeError as e:
             logger.error(f"原始 model dict 信息：{model}")
             logger.error(f"配置错误：找不到对应的配置项 - {str(e)}")
@@ -105,6 +134,15 @@ class LLMRequest:
         # 从 kwargs 中提取 request_type，如果没有提供则默认为 "default"
         self.request_type = kwargs.pop("request_type", "default")
 
+        # 配置了等价的备选模型时，对话请求由路由器在各模型之间选择
+        self._router = None
+        if model.get("alternatives"):
+            endpoints = [
+                LLMRequest(endpoint, request_type=self.request_type, **self.params)
+                for endpoint in [{**model, "alternatives": []}, *model["alternatives"]]
+            ]
+            self._router = ModelRouter(endpoints, self.request_type)
+
     @staticmethod
     def _init_database():
         """初始化数据库集合"""
@@ -126,7 +164,7 @@ class LLMRequest:
         request_type: str = None,
         endpoint: str = "/chat/completions",
     ):
-        """记录模型使用情况到数据库
+        """记录模型使用情况，由 usage_recorder 缓冲后批量写入数据库
         Args:
             prompt_tokens: 输入token数
             completion_tokens: 输出token数
@@ -140,6 +178,8 @@ class LLMRequest:
             request_type = self.request_type
 
         try:
+            cost = self._calculate_cost(prompt_tokens, completion_tokens)
+            llm_metrics.observe_usage(self.model_name, request_type, prompt_tokens, completion_tokens, cost)
             usage_data = {
                 "model_name": self.model_name,
                 "user_id": user_id,
@@ -148,11 +188,12 @@ class LLMRequest:
                 "prompt_tokens": prompt_tokens,
                 "completion_tokens": completion_tokens,
                 "total_tokens": total_tokens,
-                "cost": self._calculate_cost(prompt_tokens, completion_tokens),
+                "cost": cost,
                 "status": "success",
                 "timestamp": datetime.now(),
             }
-            db.llm_usage.insert_one(usage_data)
+            usage_recorder.record(usage_data)
+            self._consume_rate_tokens(total_tokens)
             logger.trace(
                 f"Token使用情况 - 模型: {self.model_name}, "
                 f"用户: {user_id}, 类型: {request_type}, "
@@ -162,6 +203,13 @@ class LLMRequest:
         except Exception as e:
             logger.error(f"记录token使用情况失败: {str(e)}")
 
+    def _consume_rate_tokens(self, total_tokens: int):
+        """从服务商的token额度中扣除实际用量"""
+        try:
+            scheduler_pool.get(self.base_url, self.provider).consume_tokens(total_tokens)
+        except RuntimeError:
+            pass  # 不在事件循环中
+
     def _calculate_cost(self, prompt_tokens: int, completion_tokens: int) -> float:
         """计算API调用成本
         使用模型的pri_in和pri_out价格计算输入和输出的成本
@@ -186,6 +234,7 @@ class LLMRequest:
         image_format: str = None,
         payload: dict = None,
         retry_policy: dict = None,
+        stream: bool = False,
     ) -> Dict[str, Any]:
         """配置请求参数
         Args:
@@ -195,21 +244,15 @@ class LLMRequest:
             image_format: 图片格式
             payload: 请求体数据
             retry_policy: 自定义重试策略
-            request_type: 请求类型
+            stream: 是否强制使用流式输出(模型未配置 stream 时)
         """
 
         # 合并重试策略
-        default_retry = {
-            "max_retries": 3,
-            "base_wait": 10,
-            "retry_codes": [429, 413, 500, 503],
-            "abort_codes": [400, 401, 402, 403],
-        }
-        policy = {**default_retry, **(retry_policy or {})}
+        policy = {**self.DEFAULT_RETRY_POLICY, **(retry_policy or {})}
 
         api_url = f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
 
-        stream_mode = self.stream
+        stream_mode = self.stream or stream
 
         # 构建请求体
         if image_base64:
@@ -241,6 +284,7 @@ class LLMRequest:
         response_handler: callable = None,
         user_id: str = "system",
         request_type: str = None,
+        stream_callback: callable = None,
     ):
         """统一请求执行入口
         Args:
@@ -253,39 +297,111 @@ class LLMRequest:
             response_handler: 自定义响应处理器
             user_id: 用户ID
             request_type: 请求类型
+            stream_callback: 流式输出回调，每收到一段文本就以该段文本调用一次，设置后强制使用流式输出
         """
         # 获取请求配置
         request_content = await self._prepare_request(
-            endpoint, prompt, image_base64, image_format, payload, retry_policy
+            endpoint, prompt, image_base64, image_format, payload, retry_policy, stream=stream_callback is not None
         )
         if request_type is None:
             request_type = self.request_type
-        for retry in range(request_content["policy"]["max_retries"]):
+        on_delta = None
+        if stream_callback is not None:
+
+            async def on_delta(delta: str):
+                request_content["streamed"] = True
+                await stream_callback(delta)
+
+        start = time.perf_counter()
+        try:
+            result = await self._send_with_retries(
+                endpoint, request_content, response_handler, user_id, request_type, on_delta
+            )
+        except Exception:
+            llm_metrics.observe_request(self.model_name, request_type, time.perf_counter() - start, success=False)
+            raise
+        llm_metrics.observe_request(self.model_name, request_type, time.perf_counter() - start, success=True)
+        return result
+
+    async def _send_with_retries(
+        self,
+        endpoint: str,
+        request_content: Dict[str, Any],
+        response_handler: callable,
+        user_id: str,
+        request_type: str,
+        on_delta: callable,
+    ):
+        """按重试策略发送请求，返回响应处理器的结果"""
+        scheduler = scheduler_pool.get(self.base_url, self.provider)
+        max_retries = request_content["policy"]["max_retries"]
+        for retry in range(max_retries):
             try:
-                # 使用上下文管理器处理会话
+                # 使用服务商共享的长连接会话，连接在请求之间复用
                 headers = await self._build_headers()
                 # 似乎是openai流式必须要的东西,不过阿里云的qwq-plus加了这个没有影响
                 if request_content["stream_mode"]:
                     headers["Accept"] = "text/event-stream"
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        request_content["api_url"], headers=headers, json=request_content["payload"]
-                    ) as response:
-                        handled_result = await self._handle_response(
-                            response, request_content, retry, response_handler, user_id, request_type, endpoint
-                        )
-                        return handled_result
+                # 由服务商调度器控制请求速率和并发数
+                async with scheduler.slot(
+                    request_priority(request_type), self._estimate_tokens(request_content), self.model_name
+                ) as slot:
+                    async with session_pool.session(self.provider) as session:
+                        async with session.post(
+                            request_content["api_url"], headers=headers, json=request_content["payload"]
+                        ) as response:
+                            if response.status == 429:
+                                # 没有 Retry-After 时按重试策略退避(base_wait * 2^retry)
+                                slot.rate_limited(
+                                    self._parse_retry_after(response),
+                                    request_content["policy"]["base_wait"] * (2**retry),
+                                )
+                            handled_result = await self._handle_response(
+                                response,
+                                request_content,
+                                retry,
+                                response_handler,
+                                user_id,
+                                request_type,
+                                endpoint,
+                                on_delta,
+                            )
+                            return handled_result
             except Exception as e:
+                llm_metrics.observe_error(self.model_name, request_type, e)
+                if request_content.get("streamed"):
+                    # 部分内容已经交给调用方，重试会让调用方收到重复的内容
+                    logger.error(f"模型 {self.model_name} 流式输出中断: {str(e)}")
+                    raise RuntimeError(f"模型 {self.model_name} 流式输出中断: {str(e)}") from e
                 handled_payload, count_delta = await self._handle_exception(e, retry, request_content)
                 retry += count_delta  # 降级不计入重试次数
                 if handled_payload:
                     # 如果降级成功，重新构建请求体
                     request_content["payload"] = handled_payload
+                if retry < max_retries - 1:
+                    llm_metrics.observe_retry(self.model_name, request_type)
                 continue
 
         logger.error(f"模型 {self.model_name} 达到最大重试次数，请求仍然失败")
         raise RuntimeError(f"模型 {self.model_name} 达到最大重试次数，API请求仍然失败")
 
+    @staticmethod
+    def _estimate_tokens(request_content: Dict[str, Any]) -> int:
+        """粗略估计请求的输入token数(按字符数计)，用于token额度的排队判断"""
+        payload = request_content["payload"] or {}
+        if "input" in payload:
+            inputs = payload["input"]
+            return sum(len(text) for text in inputs) if isinstance(inputs, list) else len(inputs)
+        messages = payload.get("messages") or []
+        return sum(len(message["content"]) for message in messages if isinstance(message.get("content"), str))
+
+    @staticmethod
+    def _parse_retry_after(response: ClientResponse) -> Union[float, None]:
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
+
     async def _handle_response(
         self,
         response: ClientResponse,
@@ -295,6 +411,7 @@ class LLMRequest:
         user_id,
         request_type,
         endpoint,
+        stream_callback: callable = None,
     ) -> Union[Dict[str, Any], None]:
         policy = request_content["policy"]
         stream_mode = request_content["stream_mode"]
@@ -306,7 +423,7 @@ class LLMRequest:
         result = {}
         if stream_mode:
             # 将流式输出转化为非流式输出
-            result = await self._handle_stream_output(response)
+            result = await self._handle_stream_output(response, stream_callback)
         else:
             result = await response.json()
         return (
@@ -315,7 +432,7 @@ class LLMRequest:
             else self._default_response_handler(result, user_id, request_type, endpoint)
         )
 
-    async def _handle_stream_output(self, response: ClientResponse) -> Dict[str, Any]:
+    async def _handle_stream_output(self, response: ClientResponse, stream_callback: callable = None) -> Dict[str, Any]:
         flag_delta_content_finished = False
         accumulated_content = ""
         usage = None  # 初始化usage变量，避免未定义错误
@@ -344,6 +461,8 @@ class LLMRequest:
                             if delta_content is None:
                                 delta_content = ""
                             accumulated_content += delta_content
+                            if delta_content and stream_callback is not None:
+                                await stream_callback(delta_content)
 
                             # 提取工具调用信息
                             if "tool_calls" in delta:
@@ -405,7 +524,12 @@ class LLMRequest:
     async def _handle_error_response(
         self, response: ClientResponse, retry_count: int, policy: Dict[str, Any]
     ) -> Union[Dict[str, any]]:
-        if response.status in policy["retry_codes"]:
+        if response.status == 429:
+            # 服务商调度器暂停整个服务商，本请求另外按重试策略退避(见 _handle_exception)
+            wait_time = policy["base_wait"] * (2**retry_count)
+            logger.warning(f"模型 {self.model_name} 请求限制(429)，至少等待{wait_time}秒后重试...")
+            raise RateLimitException("请求限制(429)")
+        elif response.status in policy["retry_codes"]:
             wait_time = policy["base_wait"] * (2**retry_count)
             logger.warning(f"模型 {self.model_name} 错误码: {response.status}, 等待 {wait_time}秒后重试")
             if response.status == 413:
@@ -416,9 +540,6 @@ class LLMRequest:
                     f"模型 {self.model_name} 错误码: {response.status} - {error_code_mapping.get(response.status)}"
                 )
                 raise RuntimeError("服务器负载过高，模型恢复失败QAQ")
-            else:
-                logger.warning(f"模型 {self.model_name} 请求限制(429)，等待{wait_time}秒后重试...")
-                raise RuntimeError("请求限制(429)")
         elif response.status in policy["abort_codes"]:
             if response.status != 403:
                 raise RequestAbortException("请求出现错误，中断处理", response)
@@ -489,10 +610,19 @@ class LLMRequest:
                 return payload, -1
             raise RuntimeError(f"请求被拒绝: {error_code_mapping.get(403)}")
 
+        elif isinstance(exception, RateLimitException):
+            if keep_request:
+                # 服务商的 Retry-After 可能很短，本请求的重试不早于重试策略的退避时间，避免很快用完重试次数
+                await asyncio.sleep(wait_time)
+                return None, 0
+            logger.critical(f"模型 {self.model_name} 请求限制(429)达到最大重试次数")
+            raise RuntimeError(f"模型 {self.model_name} API请求失败: 请求限制(429)")
+
         elif isinstance(exception, PayLoadTooLargeError):
             if keep_request:
                 image_base64 = request_content["image_base64"]
-                compressed_image_base64 = compress_base64_image_by_scale(image_base64)
+                # 压缩在线程池中执行，重试时同一张图片直接使用缓存的压缩结果
+                compressed_image_base64 = await image_executor.run(compress_base64_image_by_scale, image_base64)
                 new_payload = await self._build_payload(
                     request_content["prompt"], compressed_image_base64, request_content["image_format"]
                 )
@@ -700,6 +830,8 @@ class LLMRequest:
 
     async def generate_response(self, prompt: str) -> Tuple:
         """根据输入的提示生成模型的异步响应"""
+        if self._router is not None:
+            return await self._router.run(lambda llm: llm.generate_response(prompt))
 
         response = await self._execute_request(endpoint="/chat/completions", prompt=prompt)
         # 根据返回值的长度决定怎么处理
@@ -710,8 +842,44 @@ class LLMRequest:
             content, reasoning_content = response
             return content, reasoning_content, self.model_name
 
+    async def generate_response_stream(self, prompt: str, stream_callback: Callable[[str], Awaitable]) -> Tuple:
+        """与 generate_response 相同，但以流式请求模型，生成过程中每收到一段文本就调用一次 stream_callback
+
+        stream_callback 收到的是未经处理的原始文本(可能包含 <think> 标签)，返回值与 generate_response 相同：
+        (content, reasoning_content, model_name)，模型返回工具调用时末尾再加上 tool_calls。
+        已经输出部分内容后请求失败时不会重试，直接抛出异常。
+        """
+        if self._router is not None:
+            # 流式输出无法撤回，不补发请求；已经输出内容后也不再换用其他模型
+            started = False
+
+            async def forward(delta: str):
+                nonlocal started
+                started = True
+                await stream_callback(delta)
+
+            return await self._router.run(
+                lambda llm: llm.generate_response_stream(prompt, forward),
+                hedge=False,
+                can_failover=lambda: not started,
+            )
+
+        response = await self._execute_request(
+            endpoint="/chat/completions", prompt=prompt, stream_callback=stream_callback
+        )
+        if len(response) == 3:
+            content, reasoning_content, tool_calls = response
+            return content, reasoning_content, self.model_name, tool_calls
+        else:
+            content, reasoning_content = response
+            return content, reasoning_content, self.model_name
+
     async def generate_response_for_image(self, prompt: str, image_base64: str, image_format: str) -> Tuple:
         """根据输入的提示和图片生成模型的异步响应"""
+        if self._router is not None:
+            return await self._router.run(
+                lambda llm: llm.generate_response_for_image(prompt, image_base64, image_format)
+            )
 
         response = await self._execute_request(
             endpoint="/chat/completions", prompt=prompt, image_base64=image_base64, image_format=image_format
@@ -726,6 +894,9 @@ class LLMRequest:
 
     async def generate_response_async(self, prompt: str, **kwargs) -> Union[str, Tuple]:
         """异步方式根据输入的提示生成模型的响应"""
+        if self._router is not None:
+            return await self._router.run(lambda llm: llm.generate_response_async(prompt, **kwargs))
+
         # 构建请求体，不硬编码max_tokens
         data = {
             "model": self.model_name,
@@ -741,6 +912,9 @@ class LLMRequest:
 
     async def generate_response_tool_async(self, prompt: str, tools: list, **kwargs) -> tuple[str, str, list]:
         """异步方式根据输入的提示生成模型的响应"""
+        if self._router is not None:
+            return await self._router.run(lambda llm: llm.generate_response_tool_async(prompt, tools, **kwargs))
+
         # 构建请求体，不硬编码max_tokens
         data = {
             "model": self.model_name,
@@ -776,6 +950,12 @@ class LLMRequest:
             logger.debug("该消息没有长度，不再发送获取embedding向量的请求")
             return None
 
+        cache = self._get_embedding_cache()
+        if cache is not None:
+            cached = cache.get(self.model_name, text)
+            if cached is not None:
+                return cached
+
         def embedding_handler(result):
             """处理响应"""
             if "data" in result and len(result["data"]) > 0:
@@ -806,8 +986,119 @@ class LLMRequest:
             retry_policy={"max_retries": 2, "base_wait": 6},
             response_handler=embedding_handler,
         )
+        if cache is not None and embedding:
+            cache.put(self.model_name, text, embedding)
         return embedding
 
+    async def get_embeddings(self, texts: list[str]) -> list[Union[list, None]]:
+        """异步方法：批量获取文本的embedding向量
+
+        将文本按 embedding_batch_size(条数)和 embedding_batch_max_chars(总字符数)分批，每批发送一次
+        /embeddings 请求，每批记录一次token使用情况。某一批请求失败时拆成两半分别重试，
+        只有单独请求仍然失败的文本才会得到 None。相同的文本只请求一次，已缓存的文本不再请求。
+
+        Args:
+            texts: 需要获取embedding的文本列表
+
+        Returns:
+            list: 与输入顺序一致的embedding向量列表，空文本或获取失败的位置为 None
+        """
+        # 去重，空文本不发送请求
+        unique_texts = list(dict.fromkeys(text for text in texts if text))
+        embeddings: Dict[str, list] = {}
+        cache = self._get_embedding_cache()
+        if cache is not None:
+            for text, cached in zip(unique_texts, cache.get_many(self.model_name, unique_texts), strict=True):
+                if cached is not None:
+                    embeddings[text] = cached
+            unique_texts = [text for text in unique_texts if text not in embeddings]
+
+        for batch in self._split_embedding_batches(unique_texts):
+            vectors = await self._embed_batch(batch)
+            if cache is not None:
+                for text, vector in vectors.items():
+                    cache.put(self.model_name, text, vector)
+            embeddings.update(vectors)
+        return [embeddings.get(text) if text else None for text in texts]
+
+    @staticmethod
+    def _get_embedding_cache() -> Union[EmbeddingCache, None]:
+        """获取embedding缓存，内存和磁盘容量都设为 0 时不使用缓存"""
+        if global_config.embedding_cache_memory_size <= 0 and global_config.embedding_cache_disk_size <= 0:
+            return None
+        return get_embedding_cache(
+            os.path.join("data", "embedding_cache"),
+            memory_size=global_config.embedding_cache_memory_size,
+            disk_size=global_config.embedding_cache_disk_size,
+        )
+
+    @staticmethod
+    def _split_embedding_batches(texts: list[str]) -> list[list[str]]:
+        """按服务商限制将文本分批"""
+        batch_size = max(1, global_config.embedding_batch_size)
+        max_chars = global_config.embedding_batch_max_chars
+        batches = []
+        batch, batch_chars = [], 0
+        for text in texts:
+            if batch and (len(batch) >= batch_size or batch_chars + len(text) > max_chars):
+                batches.append(batch)
+                batch, batch_chars = [], 0
+            batch.append(text)
+            batch_chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _embed_batch(self, batch: list[str]) -> Dict[str, list]:
+        """请求一批文本的embedding，返回 文本 -> 向量，失败时二分重试"""
+
+        def embedding_handler(result):
+            """处理响应，按 index 还原顺序"""
+            usage = result.get("usage", {})
+            if usage:
+                self._record_usage(
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    completion_tokens=usage.get("completion_tokens", 0),
+                    total_tokens=usage.get("total_tokens", 0),
+                    user_id="system",
+                    request_type=self.request_type,
+                    endpoint="/embeddings",
+                )
+            vectors = {}
+            for position, item in enumerate(result.get("data") or []):
+                index = item.get("index", position)
+                if 0 <= index < len(batch) and item.get("embedding"):
+                    vectors[batch[index]] = item["embedding"]
+            return vectors
+
+        try:
+            vectors = await self._execute_request(
+                endpoint="/embeddings",
+                prompt=batch[0],
+                payload={"model": self.model_name, "input": batch, "encoding_format": "float"},
+                retry_policy={"max_retries": 2, "base_wait": 6},
+                response_handler=embedding_handler,
+            )
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"模型 {self.model_name} 获取embedding失败: {str(e)}")
+                return {}
+            logger.warning(f"模型 {self.model_name} 批量获取 {len(batch)} 条embedding失败，拆分后重试: {str(e)}")
+            vectors = {}
+        vectors = vectors or {}
+
+        # 返回结果缺失的文本(整批失败或部分缺失)拆成两半重试
+        missing = [text for text in batch if text not in vectors]
+        if not missing or len(batch) == 1:
+            return vectors
+        if len(missing) == 1:
+            vectors.update(await self._embed_batch(missing))
+        else:
+            middle = len(missing) // 2
+            vectors.update(await self._embed_batch(missing[:middle]))
+            vectors.update(await self._embed_batch(missing[middle:]))
+        return vectors
+
 
 def compress_base64_image_by_scale(base64_data: str, target_size: int = 0.8 * 1024 * 1024) -> str:
     """压缩base64格式的图片到指定大小
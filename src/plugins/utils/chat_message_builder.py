@@ -33,6 +33,23 @@ def get_raw_msg_by_timestamp(
     return find_messages(filter=filter_query, sort=sort_order, limit=limit, limit_mode=limit_mode)
 
 
+def get_raw_msg_by_timestamp_ranges(ranges: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+    """
+    用一次查询获取落在多个时间段(开区间)内的所有消息，按时间升序排序，返回消息列表
+    重叠的时间段会先合并，每条消息只返回一次
+    """
+    merged: List[List[float]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    if not merged:
+        return []
+    filter_query = {"$or": [{"time": {"$gt": start, "$lt": end}} for start, end in merged]}
+    return find_messages(filter=filter_query, sort=[("time", 1)])
+
+
 def get_raw_msg_by_timestamp_with_chat(
     chat_id: str, timestamp_start: float, timestamp_end: float, limit: int = 0, limit_mode: str = "latest"
 ) -> List[Dict[str, Any]]: